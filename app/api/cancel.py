@@ -0,0 +1,64 @@
+"""
+リクエストの協調的キャンセル
+"""
+
+import http.client
+import socket
+import threading
+
+
+class RequestCancelled(Exception):
+    """リクエストがキャンセルされたことを示す例外"""
+
+
+class CancelToken:
+    """
+    リクエストの協調的キャンセル用トークン
+
+    cancel() を呼ぶと実行中の接続のソケットを閉じ、転送を途中で打ち切る。
+    ローカルソケットが閉じるとトンネル側のSSHチャネルも閉じられる。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._conn: http.client.HTTPConnection | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """キャンセルを要求し、転送中の接続があれば即座に切断する"""
+        self._event.set()
+        with self._lock:
+            conn = self._conn
+        if conn is not None:
+            _abort_connection(conn)
+
+    def raise_if_cancelled(self):
+        """キャンセル済みなら RequestCancelled を送出する"""
+        if self._event.is_set():
+            raise RequestCancelled()
+
+    def _attach(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            self._conn = conn
+        # attach前にキャンセルされていた場合
+        if self._event.is_set():
+            _abort_connection(conn)
+
+    def _detach(self):
+        with self._lock:
+            self._conn = None
+
+
+def _abort_connection(conn: http.client.HTTPConnection):
+    """ブロック中のrecvを解除するためソケットをshutdownしてから閉じる"""
+    sock = conn.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    conn.close()
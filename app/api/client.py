@@ -4,11 +4,45 @@ SFTPClientWrapper互換のHTTPクライアント
 ローカルポート9000経由でリモートのsiview-serverと通信
 """
 
+import http.client
 import posixpath
 import urllib.parse
-import urllib.request
 import json
-from typing import List, Tuple
+from contextlib import nullcontext
+from typing import Callable, Iterator, List, NamedTuple, Tuple
+
+from api.cancel import CancelToken, RequestCancelled
+from api.scheduler import Priority, RequestScheduler
+from util.trace import tracer
+
+
+class Validator(NamedTuple):
+    """キャッシュの鮮度確認に使う検証子（取得時のレスポンスの ETag / Last-Modified）"""
+    etag: str | None
+    last_modified: str | None
+
+    @classmethod
+    def from_headers(cls, headers: http.client.HTTPMessage) -> "Validator | None":
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            return None
+        return cls(etag, last_modified)
+
+    def conditional_headers(self) -> dict[str, str]:
+        """条件付きリクエストのヘッダー（サーバーは ETag を優先して判定する）"""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class FetchResult(NamedTuple):
+    """fetch_file の結果"""
+    data: bytes | None            # 変更が無かった（304）場合は None
+    filename: str
+    validator: Validator | None
 
 
 class HTTPClient:
@@ -17,12 +51,32 @@ class HTTPClient:
     SFTPClientWrapperと互換のインターフェースを提供
     """
 
-    def __init__(self, base_url: str = "http://127.0.0.1:9000", home_dir: str = "/"):
+    CHUNK_SIZE = 64 * 1024
+    # 変更通知の接続でこの時間何も届かなければ切断されたとみなす（サーバーは15秒ごとにハートビートを送る）
+    WATCH_TIMEOUT = 45.0
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:9000",
+        home_dir: str = "/",
+        scheduler: RequestScheduler | None = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self._cwd = home_dir
         self._home_dir = home_dir
+        # トンネルを共有する全要求を優先度順に捌く
+        self.scheduler = scheduler or RequestScheduler()
+
+        parsed = urllib.parse.urlsplit(self.base_url)
+        self._host = parsed.hostname or "127.0.0.1"
+        self._port = parsed.port or 80
 
-    def ls(self, path: str = ".") -> List[dict]:
+    def ls(
+        self,
+        path: str = ".",
+        token: CancelToken | None = None,
+        priority: Priority = Priority.LISTING,
+    ) -> List[dict]:
         """
         指定ディレクトリのファイル一覧を返す
 
@@ -44,28 +98,242 @@ class HTTPClient:
         # ホームディレクトリからの相対パスに変換
         rel_path = self._to_relative_path(abs_path)
 
-        url = f"{self.base_url}/api/list?path={urllib.parse.quote(rel_path)}"
-        with urllib.request.urlopen(url) as response:
-            data = json.loads(response.read().decode())
-            return data
+        with tracer.span("list", path=abs_path) as span:
+            body = self._get(f"/api/list?path={urllib.parse.quote(rel_path)}", token, priority)
+            entries = json.loads(body.decode())
+            span.set("entries", len(entries))
+        return entries
 
-    def get_file(self, remote_path: str) -> Tuple[bytes, str]:
+    def get_file(
+        self,
+        remote_path: str,
+        token: CancelToken | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> Tuple[bytes, str]:
         """
         ファイルをメモリに取得
 
+        token がキャンセルされると転送を中断して RequestCancelled を送出する
+
         Returns:
             data (bytes): ファイルの中身
             filename (str): ファイル名のみ
         """
+        result = self.fetch_file(remote_path, token=token, priority=priority)
+        if result.data is None:
+            raise RuntimeError(f"Unconditional request returned no body: {remote_path}")
+        return result.data, result.filename
+
+    def fetch_file(
+        self,
+        remote_path: str,
+        validator: Validator | None = None,
+        token: CancelToken | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> FetchResult:
+        """
+        ファイルを取得し、次回の鮮度確認に使う検証子と一緒に返す
+
+        validator を渡すと条件付きリクエストになり、変更が無ければ本文を転送せずに
+        data=None を返す（検証子は新しいレスポンスのものを返す）
+        """
         # ホームディレクトリからの相対パスに変換
         rel_path = self._to_relative_path(remote_path)
 
-        url = f"{self.base_url}/file/{urllib.parse.quote(rel_path)}"
-        with urllib.request.urlopen(url) as response:
-            data = response.read()
+        headers = validator.conditional_headers() if validator is not None else None
+        with tracer.span("fetch", path=remote_path, priority=priority.name) as span:
+            data, response_headers = self._request(f"/file/{urllib.parse.quote(rel_path)}", token, priority, headers)
+            span.set("bytes", 0 if data is None else len(data))
 
         filename = posixpath.basename(remote_path)
-        return data, filename
+        return FetchResult(data, filename, Validator.from_headers(response_headers) or validator)
+
+    def search(
+        self,
+        path: str,
+        on_match: Callable[[dict], None],
+        token: CancelToken | None = None,
+        priority: Priority = Priority.LISTING,
+        **criteria,
+    ) -> dict:
+        """
+        サーバー側で path 以下を再帰的に検索し、一致したエントリを届いた順に on_match に渡す
+
+        一覧をすべて取得して手元で絞り込むのではなく、走査と照合をリモートで行う
+
+        Args:
+            criteria: name, glob, regex, ext, type, min_size, max_size,
+                newer, older, max_depth, limit, timeout（None の条件は送らない）
+
+        Returns:
+            dict: {"matched": int, "scanned": int, "truncated": bool, "timed_out": bool}
+                エントリは {"name": 起点からの相対パス, "is_dir", "size", "mtime"}
+        """
+        params = {"path": self._to_relative_path(posixpath.normpath(path))}
+        for key, value in criteria.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set, frozenset)):
+                value = ",".join(value)
+            params[key] = str(value)
+
+        summary: dict = {}
+        for line in self._stream_lines(f"/api/search?{urllib.parse.urlencode(params)}", token, priority):
+            entry = json.loads(line)
+            if entry.get("done"):
+                summary = entry
+                break
+            on_match(entry)
+        return summary
+
+    def watch(
+        self,
+        paths: list[str],
+        on_event: Callable[[dict], None],
+        token: CancelToken | None = None,
+    ) -> None:
+        """
+        指定ディレクトリの変更通知を受け取り、届いた順に on_event に渡す
+
+        サーバーが接続を閉じるか token がキャンセルされるまで返らない。
+        通知を待つだけの接続なので転送枠は使わない
+
+        イベント: {"op": "ready" | "create" | "write" | "remove" | "overflow",
+                   "dir": 絶対パス, "name", "is_dir", "size"}
+        """
+        body = json.dumps({"paths": [self._to_relative_path(p) for p in paths]}).encode()
+        lines = self._stream_lines(
+            "/api/watch", token, None, method="POST", body=body, timeout=self.WATCH_TIMEOUT
+        )
+        for line in lines:
+            # Server-Sent Events のデータ行だけを読む（":" で始まる行はハートビート）
+            if line.startswith(b"data:"):
+                on_event(json.loads(line[5:]))
+
+    def _stream_lines(
+        self,
+        url_path: str,
+        token: CancelToken | None = None,
+        priority: Priority | None = Priority.LISTING,
+        method: str = "GET",
+        body: bytes | None = None,
+        timeout: float | None = None,
+    ) -> Iterator[bytes]:
+        """
+        リクエストを送り、ボディを行単位で届いた順に返す（NDJSON・Server-Sent Events用）
+
+        priority が None の場合はスケジューラの枠を確保しない
+        """
+        if token is not None:
+            token.raise_if_cancelled()
+
+        with self.scheduler.slot(priority, token) if priority is not None else nullcontext():
+            conn = http.client.HTTPConnection(self._host, self._port, timeout=timeout)
+            if token is not None:
+                token._attach(conn)
+            try:
+                headers = {"Content-Type": "application/json"} if body is not None else {}
+                conn.request(method, url_path, body, headers)
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise IOError(f"HTTP Error {response.status}: {response.read().decode(errors='replace').strip()}")
+                while True:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    line = response.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        yield line
+            except (OSError, http.client.HTTPException, ValueError, AttributeError):
+                if token is not None and token.cancelled:
+                    raise RequestCancelled() from None
+                raise
+            finally:
+                if token is not None:
+                    token._detach()
+                conn.close()
+
+    def _get(
+        self,
+        url_path: str,
+        token: CancelToken | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> bytes:
+        """スケジューラの枠を確保してからGETリクエストを送る"""
+        body, _ = self._request(url_path, token, priority)
+        if body is None:
+            raise RuntimeError(f"Unconditional request returned no body: {url_path}")
+        return body
+
+    def _request(
+        self,
+        url_path: str,
+        token: CancelToken | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[bytes | None, http.client.HTTPMessage]:
+        """スケジューラの枠を確保してからGETリクエストを送り、ボディとレスポンスヘッダーを返す"""
+        if token is not None:
+            token.raise_if_cancelled()
+
+        queued = tracer.now()
+        with self.scheduler.slot(priority, token):
+            # 実行枠を待った時間（トンネルを共有する他の要求の影響）
+            tracer.complete("net.queue", queued, priority=priority.name)
+            return self._get_body(url_path, token, priority, headers)
+
+    def _get_body(
+        self,
+        url_path: str,
+        token: CancelToken | None,
+        priority: Priority,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[bytes | None, http.client.HTTPMessage]:
+        """
+        GETリクエストを送り、ボディをチャンク単位で読み込む
+
+        条件付きリクエストで 304 が返った場合、ボディは None
+        """
+        conn = http.client.HTTPConnection(self._host, self._port)
+        if token is not None:
+            token._attach(conn)
+        try:
+            # 要求の送信から応答ヘッダーまで（トンネルとサーバーの往復）
+            with tracer.span("net.roundtrip"):
+                conn.request("GET", url_path, headers=headers or {})
+                response = conn.getresponse()
+            if response.status == 304:
+                response.read()
+                return None, response.headers
+            if response.status != 200:
+                raise IOError(f"HTTP Error {response.status}: {response.reason}")
+
+            chunks = []
+            with tracer.span("net.body") as span:
+                while True:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    # 下位クラスは対話的な要求が終わるまでここで一時停止する
+                    self.scheduler.checkpoint(priority, token)
+                    chunk = response.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                body = b"".join(chunks)
+                span.set("bytes", len(body))
+            if token is not None:
+                token.raise_if_cancelled()
+            return body, response.headers
+        except (OSError, http.client.HTTPException, ValueError, AttributeError):
+            # キャンセルによる切断はRequestCancelledとして扱う
+            if token is not None and token.cancelled:
+                raise RequestCancelled() from None
+            raise
+        finally:
+            if token is not None:
+                token._detach()
+            conn.close()
 
     def pwd(self) -> str:
         """現在のワーキングディレクトリを返す"""
@@ -0,0 +1,150 @@
+"""
+リモートディレクトリの並列クローラー
+
+ディレクトリ一覧の取得はトンネルの往復遅延が支配的なため、複数の一覧要求を
+並列に発行して待ち時間を重ねる。見つかったファイルはディレクトリ単位で
+コールバックに渡すので、走査全体が終わる前から利用できる。
+"""
+
+import fnmatch
+import posixpath
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, NamedTuple
+
+from api.cancel import CancelToken, RequestCancelled
+from api.client import HTTPClient
+from api.scheduler import Priority
+
+
+class CrawlResult(NamedTuple):
+    """走査結果の集計"""
+    directories: int   # 一覧を取得できたディレクトリ数
+    files: int         # 条件に一致したファイル数
+    errors: int        # 一覧の取得に失敗したディレクトリ数
+
+
+class _Node:
+    """走査中のディレクトリ（結果を名前順に出力するための木の節）"""
+
+    __slots__ = ("path", "depth", "done", "found", "next")
+
+    def __init__(self, path: str, depth: int):
+        self.path = path
+        self.depth = depth
+        self.done = False
+        self.found: list[str] = []
+        # 出力順で次の節
+        self.next: _Node | None = None
+
+
+class DirectoryCrawler:
+    """
+    ディレクトリ以下のファイルを並列に列挙する
+
+    - 同時に発行する一覧要求は workers 個まで（さらにスケジューラの LISTING 枠で制限される）
+    - 結果は完了順ではなく、名前順の深さ優先（ls -R と同じ順序）で出力する
+    """
+
+    DEFAULT_WORKERS = 4
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        extensions: Iterable[str],
+        pattern: str | None = None,
+        max_depth: int | None = 0,
+        workers: int = DEFAULT_WORKERS,
+    ):
+        """
+        Args:
+            extensions: 対象とする拡張子（小文字、ドット付き）
+            pattern: ファイル名のglob（"/" を含む場合は起点からの相対パスに対して照合する）
+            max_depth: 潜るサブディレクトリの深さ（0 は起点のみ、None は無制限）
+        """
+        self.client = client
+        self.extensions = frozenset(extensions)
+        self.pattern = pattern
+        self.max_depth = max_depth
+        self.workers = max(1, workers)
+
+    def matches(self, rel_path: str) -> bool:
+        """起点からの相対パスが対象ファイルかどうか"""
+        name = posixpath.basename(rel_path)
+        if posixpath.splitext(name)[1].lower() not in self.extensions:
+            return False
+        if not self.pattern:
+            return True
+        # リモートはPOSIXなので大文字小文字を区別する
+        target = rel_path if "/" in self.pattern else name
+        return fnmatch.fnmatchcase(target, self.pattern)
+
+    def crawl(
+        self,
+        root: str,
+        on_found: Callable[[list[str]], None],
+        token: CancelToken | None = None,
+        sizes: dict[str, int] | None = None,
+    ) -> CrawlResult:
+        """
+        root 以下を走査し、一致したファイルの絶対パスをディレクトリ単位で on_found に渡す
+
+        sizes を渡すと、一致したファイルの大きさ（一覧のもの）をパスをキーにして記録する。
+        token がキャンセルされると RequestCancelled を送出する
+        """
+        root = posixpath.normpath(root)
+        directories = files = errors = 0
+        # 出力順に連結した節の先頭（これより前は出力済み）
+        head: _Node | None = _Node(root, 0)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawler") as pool:
+            pending: dict[Future, _Node] = {pool.submit(self._list, root, token): head}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node = pending.pop(future)
+                        node.done = True
+                        try:
+                            entries = future.result()
+                        except RequestCancelled:
+                            raise
+                        except Exception:
+                            errors += 1
+                            continue
+                        directories += 1
+
+                        children = []
+                        for entry in sorted(entries, key=lambda e: e["name"]):
+                            path = posixpath.join(node.path, entry["name"])
+                            if entry["is_dir"]:
+                                if self.max_depth is None or node.depth < self.max_depth:
+                                    children.append(_Node(path, node.depth + 1))
+                            elif self.matches(posixpath.relpath(path, root)):
+                                node.found.append(path)
+                                if sizes is not None:
+                                    sizes[path] = entry.get("size", 0)
+
+                        # 子ディレクトリは親の直後に連結する
+                        tail = node.next
+                        for child in reversed(children):
+                            child.next = tail
+                            tail = child
+                        node.next = tail
+                        for child in children:
+                            pending[pool.submit(self._list, child.path, token)] = child
+
+                    # 先頭から連続して完了している節の結果を出力する
+                    while head is not None and head.done:
+                        if head.found:
+                            files += len(head.found)
+                            on_found(head.found)
+                        head = head.next
+            finally:
+                # 途中で抜けた場合は未実行の要求を捨て、実行中の要求はトークンで打ち切られる
+                for future in pending:
+                    future.cancel()
+
+        return CrawlResult(directories, files, errors)
+
+    def _list(self, path: str, token: CancelToken | None) -> list[dict]:
+        return self.client.ls(path, token, Priority.LISTING)
@@ -0,0 +1,162 @@
+"""
+ネットワーク要求の優先度スケジューラ
+
+トンネルは1本しかないため、表示中の画像の取得がバックグラウンドの
+取得に埋もれないよう、クラスごとに同時実行数を制限して順序付けする。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Iterator
+
+from api.cancel import CancelToken, RequestCancelled
+
+
+class Priority(IntEnum):
+    """要求の優先度クラス（値が小さいほど優先）"""
+    INTERACTIVE = 0  # 表示中の画像
+    LISTING = 1      # ディレクトリ一覧
+    PREFETCH = 2     # 先読み・サムネイル
+
+
+class _ClassStats:
+    """優先度クラスごとのカウンタ"""
+
+    def __init__(self):
+        self.waiting = 0
+        self.running = 0
+        # 待機を終えて開始した数（待ち時間の平均の分母。待機中にキャンセルされたものは含めない）
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.paused = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "paused": self.paused,
+            "avg_wait_ms": (self.total_wait / self.started * 1000) if self.started else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+class RequestScheduler:
+    """
+    優先度クラス付きのリクエストスケジューラ
+
+    - クラスごとに同時実行数を制限する
+    - 上位クラスが待機中の間は下位クラスを開始しない
+    - INTERACTIVE が待機・実行中の間は PREFETCH の転送をチャンク境界で一時停止する
+    """
+
+    DEFAULT_LIMITS = {
+        Priority.INTERACTIVE: 2,
+        Priority.LISTING: 4,  # 一覧は小さいので並列に発行して往復遅延を重ねる
+        Priority.PREFETCH: 2,
+    }
+
+    # キャンセル確認のための待機間隔（秒）
+    _POLL_INTERVAL = 0.1
+
+    def __init__(self, limits: dict[Priority, int] | None = None):
+        self._limits = dict(self.DEFAULT_LIMITS)
+        if limits:
+            self._limits.update(limits)
+        self._cond = threading.Condition()
+        self._stats = {p: _ClassStats() for p in Priority}
+
+    @contextmanager
+    def slot(self, priority: Priority, token: CancelToken | None = None) -> Iterator[None]:
+        """実行枠を確保する。with ブロックを抜けると枠を解放する"""
+        self._acquire(priority, token)
+        cancelled = False
+        try:
+            yield
+        except RequestCancelled:
+            cancelled = True
+            raise
+        finally:
+            self._release(priority, cancelled)
+
+    def checkpoint(self, priority: Priority, token: CancelToken | None = None):
+        """
+        転送のチャンク境界で呼ぶ。上位の対話的要求があれば終わるまで待機する
+        """
+        if priority != Priority.PREFETCH:
+            return
+        with self._cond:
+            if not self._interactive_pending():
+                return
+            self._stats[priority].paused += 1
+            while self._interactive_pending():
+                if token is not None and token.cancelled:
+                    break
+                self._cond.wait(self._POLL_INTERVAL)
+        if token is not None:
+            token.raise_if_cancelled()
+
+    def set_limit(self, priority: Priority, limit: int):
+        """クラスの同時実行数を変える（増やした分は待機中の要求がすぐに開始する）"""
+        with self._cond:
+            self._limits[priority] = max(1, limit)
+            self._cond.notify_all()
+
+    def stats(self) -> dict[str, dict]:
+        """クラスごとのキュー長・待ち時間などのカウンタを返す"""
+        with self._cond:
+            return {p.name.lower(): s.snapshot() for p, s in self._stats.items()}
+
+    def _acquire(self, priority: Priority, token: CancelToken | None):
+        stats = self._stats[priority]
+        start = time.perf_counter()
+        with self._cond:
+            stats.waiting += 1
+            try:
+                while not self._can_start(priority):
+                    if token is not None and token.cancelled:
+                        stats.cancelled += 1
+                        raise RequestCancelled()
+                    self._cond.wait(self._POLL_INTERVAL)
+            finally:
+                stats.waiting -= 1
+            waited = time.perf_counter() - start
+            stats.running += 1
+            stats.started += 1
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+            # 待機者が減ったことで開始可能になるクラスがあるため通知
+            self._cond.notify_all()
+
+    def _release(self, priority: Priority, cancelled: bool):
+        with self._cond:
+            stats = self._stats[priority]
+            stats.running -= 1
+            if cancelled:
+                stats.cancelled += 1
+            else:
+                stats.completed += 1
+            self._cond.notify_all()
+
+    def _can_start(self, priority: Priority) -> bool:
+        """呼び出し時には self._cond を保持していること"""
+        if self._stats[priority].running >= self._limits[priority]:
+            return False
+        for higher in Priority:
+            if higher >= priority:
+                break
+            if self._stats[higher].waiting > 0:
+                return False
+        if priority == Priority.PREFETCH and self._interactive_pending():
+            return False
+        return True
+
+    def _interactive_pending(self) -> bool:
+        s = self._stats[Priority.INTERACTIVE]
+        return s.waiting > 0 or s.running > 0
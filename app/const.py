@@ -16,3 +16,6 @@ BORDER_DEFAULT = "transparent"
 ITEM_SELECTED_BG = "#007acc"
 
 FONT_SIZE = 18
+
+# 画像として扱う拡張子（小文字、ドット付き）
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".gif", ".svg", ".pdf")
@@ -0,0 +1,51 @@
+"""
+外部バッファを参照する QImage の所有権管理
+
+デコーダ（PyMuPDF・共有メモリ等）が確保したピクセルバッファを
+コピーせずに QImage として扱うため、バッファの所有者を QImage の
+Pythonオブジェクトに紐付けて寿命を揃える。
+
+注意: 所有者はこのPythonオブジェクトにのみ紐付くため、スレッド間で
+受け渡す場合は Signal(QImage) ではなく Signal(object) を使うこと
+（QImage型のシグナルはC++側でコピーされ、所有者を持たない別オブジェクトになる）。
+QPixmap.fromImage() も形式が同じならバッファを共有するため、QPixmap にするときは
+to_pixmap() を使う
+"""
+
+from typing import Any
+
+from PySide6.QtGui import QImage, QPixmap
+
+
+class OwnedImage(QImage):
+    """ピクセルバッファの所有者を保持する QImage"""
+
+    def __init__(self, buffer, width: int, height: int, stride: int, fmt: QImage.Format, owner: Any):
+        super().__init__(buffer, width, height, stride, fmt)
+        # QImage が生きている間、バッファを解放させない（owner が buffer の寿命を保証する）
+        self._owner = owner
+
+
+def wrap_buffer(buffer, width: int, height: int, stride: int, fmt: QImage.Format, owner: Any) -> QImage:
+    """
+    バッファをコピーせずに QImage として包む
+
+    owner は buffer が指すメモリを保持し続けるオブジェクト（例: fitz.Pixmap）
+    """
+    return OwnedImage(buffer, width, height, stride, fmt, owner)
+
+
+def to_pixmap(image: QImage) -> QPixmap:
+    """
+    QPixmap に変換する
+
+    外部バッファを参照する画像は、QPixmap がバッファを共有したまま QPixmapCache や
+    クリップボードに残って所有者より長生きしないよう、QPixmap の形式の新しいバッファにしてから
+    変換する。形式が違う場合は変換で1回だけコピーし、同じ場合だけ copy() する
+    """
+    if isinstance(image, OwnedImage):
+        native = (
+            QImage.Format.Format_ARGB32_Premultiplied if image.hasAlphaChannel() else QImage.Format.Format_RGB32
+        )
+        image = image.copy() if image.format() == native else image.convertToFormat(native)
+    return QPixmap.fromImage(image)
@@ -1,62 +1,201 @@
-from collections import deque
+from collections import OrderedDict
 from PySide6.QtGui import QImage
 
+from api.client import Validator
+
+
+class _TierStats:
+    """キャッシュ層ごとのヒット数・ミス数"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
 
 class ImageCache:
-    MAX_BYTES = 500 *  1024 * 1024  # 500MB
+    """
+    2層構成の画像キャッシュ
+
+    - encoded: 元ファイルのバイト列（長期保持、容量の大半を割り当てる）
+    - decoded: デコード済みの QImage（直近に表示したものだけを保持するホット層）
+      複数ページ文書はページごとに (path, page) をキーとして保持する
+
+    どちらの層も LRU で追い出す。取得時の検証子（ETag 等）をパスごとに保持し、
+    再読み込み時は条件付きリクエストで鮮度だけを確かめる
+    """
+
+    # 既定の上限（MemoryGovernor が搭載メモリに合わせて set_budget で変更する）
+    MAX_ENCODED_BYTES = 500 * 1024 * 1024  # 500MB
+    MAX_DECODED_BYTES = 200 * 1024 * 1024  # 200MB
 
     def __init__(self):
-        self._images: dict[str, QImage] = {}
-        self._queue = deque()  # (path, bytes)
-        self._current_bytes = 0
+        self.max_encoded_bytes = self.MAX_ENCODED_BYTES
+        self.max_decoded_bytes = self.MAX_DECODED_BYTES
+        self._encoded: OrderedDict[str, bytes] = OrderedDict()
+        self._decoded: OrderedDict[tuple[str, int], QImage] = OrderedDict()
+        self._encoded_bytes = 0
+        self._decoded_bytes = 0
+        self._encoded_stats = _TierStats()
+        self._decoded_stats = _TierStats()
+        self._validators: dict[str, Validator] = {}
+
+    def contains(self, path: str, page: int = 0) -> bool:
+        return (path, page) in self._decoded or path in self._encoded
+
+    def get(self, path: str, page: int = 0) -> QImage | None:
+        """デコード済み画像を取得する"""
+        key = (path, page)
+        img = self._decoded.get(key)
+        self._decoded_stats.record(img is not None)
+        if img is not None:
+            self._decoded.move_to_end(key)
+        return img
 
-    def contains(self, path: str) -> bool:
-        return path in self._images
+    def peek(self, path: str, page: int = 0) -> QImage | None:
+        """統計・LRU順に影響を与えずにデコード済み画像を参照する"""
+        return self._decoded.get((path, page))
 
-    def get(self, path: str) -> QImage | None:
-        return self._images.get(path)
+    def has_decoded(self, path: str, page: int = 0) -> bool:
+        """統計に影響を与えずにデコード済みかどうかを判定する"""
+        return (path, page) in self._decoded
 
-    def insert(self, path: str, image: QImage) -> None:
+    def get_encoded(self, path: str) -> bytes | None:
+        """元ファイルのバイト列を取得する"""
+        data = self._encoded.get(path)
+        self._encoded_stats.record(data is not None)
+        if data is not None:
+            self._encoded.move_to_end(path)
+        return data
+
+    def peek_encoded(self, path: str) -> bytes | None:
+        """統計・LRU順に影響を与えずにバイト列を参照する"""
+        return self._encoded.get(path)
+
+    def insert(self, path: str, image: QImage, page: int = 0) -> None:
+        """デコード済み画像をホット層に登録する"""
         bytes_ = image.sizeInBytes()
-        if bytes_ > self.MAX_BYTES:
+        if bytes_ > self.max_decoded_bytes:
             # 単体で上限超えるものは保持しない
             return
 
-        if path in self._images:
-            return  # FIFO前提、重複登録しない
+        key = (path, page)
+        old = self._decoded.pop(key, None)
+        if old is not None:
+            self._decoded_bytes -= old.sizeInBytes()
+
+        self._decoded[key] = image
+        self._decoded_bytes += bytes_
+        self._evict_if_needed()
+
+    def validator(self, path: str) -> Validator | None:
+        """キャッシュ済みの内容を取得したときの検証子（どちらの層にも無ければ None）"""
+        return self._validators.get(path)
+
+    def set_validator(self, path: str, validator: Validator | None) -> None:
+        """検証子を登録する（鮮度確認で変更が無かった場合は新しい検証子で更新する）"""
+        if validator is None:
+            self._validators.pop(path, None)
+        elif path in self._encoded or any(key[0] == path for key in self._decoded):
+            self._validators[path] = validator
+
+    def insert_encoded(
+        self, path: str, data: bytes, validator: Validator | None = None, cold: bool = False
+    ) -> None:
+        """
+        元ファイルのバイト列を登録する
 
-        self._images[path] = image
-        self._queue.append((path, bytes_))
-        self._current_bytes += bytes_
+        Args:
+            cold: 表示していないもの（サムネイル用に取得したもの等）を、まだ入っていなければ
+                  最初に追い出される位置に置く（表示中の画像の前後を押し出さないようにする）
+        """
+        bytes_ = len(data)
+        if bytes_ > self.max_encoded_bytes:
+            return
+
+        old = self._encoded.pop(path, None)
+        if old is not None:
+            self._encoded_bytes -= len(old)
 
+        self._encoded[path] = data
+        if cold and old is None:
+            self._encoded.move_to_end(path, last=False)
+        self._encoded_bytes += bytes_
+        if validator is not None:
+            self._validators[path] = validator
         self._evict_if_needed()
 
     def remove(self, path: str) -> None:
-        """指定パスのキャッシュを削除する"""
-        img = self._images.pop(path, None)
-        if img is None:
-            return
-        bytes_ = img.sizeInBytes()
-        self._current_bytes -= bytes_
-        # dequeから該当エントリを除去
-        self._queue = deque(
-            (p, b) for p, b in self._queue if p != path
-        )
+        """指定パスのキャッシュを両層から削除する（全ページ）"""
+        for key in [k for k in self._decoded if k[0] == path]:
+            self._decoded_bytes -= self._decoded.pop(key).sizeInBytes()
+        data = self._encoded.pop(path, None)
+        if data is not None:
+            self._encoded_bytes -= len(data)
+        self._validators.pop(path, None)
 
     def clear(self) -> None:
-        self._images.clear()
-        self._queue.clear()
-        self._current_bytes = 0
+        self._encoded.clear()
+        self._decoded.clear()
+        self._validators.clear()
+        self._encoded_bytes = 0
+        self._decoded_bytes = 0
 
     @property
     def current_bytes(self) -> int:
-        return self._current_bytes
+        return self._encoded_bytes + self._decoded_bytes
 
-    def _evict_if_needed(self) -> None:
-        """FIFO方式で上限を超えたら削除する"""
-        while self._current_bytes > self.MAX_BYTES and self._queue:
-            path, bytes_ = self._queue.popleft()
-            img = self._images.pop(path, None)
-            if img is not None:
-                self._current_bytes -= bytes_
+    @property
+    def encoded_bytes(self) -> int:
+        return self._encoded_bytes
+
+    @property
+    def decoded_bytes(self) -> int:
+        return self._decoded_bytes
 
+    def set_budget(self, encoded: int | None = None, decoded: int | None = None) -> None:
+        """層ごとの上限を変更する（超えている分はすぐに追い出す）"""
+        if encoded is not None:
+            self.max_encoded_bytes = encoded
+        if decoded is not None:
+            self.max_decoded_bytes = decoded
+        self._evict_if_needed()
+
+    def stats(self) -> dict[str, dict]:
+        """層ごとの使用量とヒット率を返す"""
+        encoded = self._encoded_stats.snapshot()
+        encoded.update(count=len(self._encoded), bytes=self._encoded_bytes, max_bytes=self.max_encoded_bytes)
+        decoded = self._decoded_stats.snapshot()
+        decoded.update(count=len(self._decoded), bytes=self._decoded_bytes, max_bytes=self.max_decoded_bytes)
+        return {"encoded": encoded, "decoded": decoded}
+
+    def _evict_if_needed(self) -> None:
+        """LRU方式で上限を超えたら削除する"""
+        evicted = set()
+        while self._decoded_bytes > self.max_decoded_bytes and self._decoded:
+            (path, _), img = self._decoded.popitem(last=False)
+            self._decoded_bytes -= img.sizeInBytes()
+            evicted.add(path)
+        while self._encoded_bytes > self.max_encoded_bytes and self._encoded:
+            path, data = self._encoded.popitem(last=False)
+            self._encoded_bytes -= len(data)
+            evicted.add(path)
+        # どちらの層にも残っていないパスの検証子は不要
+        if evicted:
+            remaining = {key[0] for key in self._decoded}
+            for path in evicted:
+                if path not in self._encoded and path not in remaining:
+                    self._validators.pop(path, None)
@@ -0,0 +1,169 @@
+"""
+プロセスプールによる画像デコード
+
+PDFのレンダリングやSVGのラスタライズ、大きなTIFFのデコードはGILを
+長時間保持するため、別プロセスで実行してCPUコアを並列に使う。
+デコード結果のピクセルは共有メモリ経由で受け取り、pickleしない。
+
+環境変数 SIVIEW_DECODE_PROCESSES でプロセス数を指定できる（0で無効）
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, NamedTuple
+
+from PySide6.QtGui import QImage
+
+from image.buffer import wrap_buffer
+
+# multiprocessing 一式は読み込みが重いため、プールを作るときに読み込む
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+
+class _DecodedBuffer(NamedTuple):
+    """子プロセスから返すデコード結果のメタデータ（ピクセルは共有メモリ側）"""
+    shm_name: str
+    width: int
+    height: int
+    stride: int
+    format: int
+    page_count: int
+
+
+# 子プロセス内でのみ使う QGuiApplication（SVG等の描画にフォント・プラグインが必要）
+_child_app = None
+
+
+def _ensure_child_app():
+    global _child_app
+    from PySide6.QtGui import QGuiApplication
+    if QGuiApplication.instance() is None:
+        _child_app = QGuiApplication(["siview-decoder", "-platform", "offscreen"])
+
+
+def _decode_in_child(data: bytes, filename: str, page: int) -> _DecodedBuffer:
+    """子プロセスでデコードし、ピクセルを共有メモリに書き込む"""
+    from multiprocessing.shared_memory import SharedMemory
+
+    _ensure_child_app()
+
+    from image.document import DocumentCache
+    from image.loader import ImageLoader
+
+    if DocumentCache.supports(filename):
+        documents = DocumentCache()
+        image, page_count = documents.render("", data, filename, page)
+        documents.clear()
+    else:
+        image, page_count = ImageLoader(use_pool=False).load(data, filename), 1
+
+    size = image.sizeInBytes()
+    shm = SharedMemory(create=True, size=max(size, 1))
+    try:
+        shm.buf[:size] = image.constBits()[:size]
+    finally:
+        shm.close()
+
+    return _DecodedBuffer(
+        shm.name,
+        image.width(),
+        image.height(),
+        image.bytesPerLine(),
+        image.format().value,
+        page_count,
+    )
+
+
+class _SharedMemoryOwner:
+    """QImage が参照する共有メモリのマッピングを保持する"""
+
+    def __init__(self, shm: "SharedMemory", size: int):
+        self._shm = shm
+        self.view = shm.buf[:size]
+
+    def __del__(self):
+        # ビューを先に解放しないとマッピングを閉じられない
+        self.view.release()
+        self._shm.close()
+
+
+class DecodePool:
+    """デコード用プロセスプール（コア数に合わせて生成）"""
+
+    # これより小さいラスタ画像はプロセス間のやり取りの方が高くつくため自プロセスで処理する
+    MIN_OFFLOAD_BYTES = 1 * 1024 * 1024
+    # 常に別プロセスで処理する形式
+    HEAVY_EXTENSIONS = [".pdf", ".svg", ".tif", ".tiff"]
+
+    _shared: "DecodePool | None" = None
+    _shared_lock = threading.Lock()
+    _shared_initialized = False
+
+    def __init__(self, max_workers: int):
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        self.max_workers = max_workers
+        # Qtのスレッドを抱えたプロセスをforkしないよう spawn を使う
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=get_context("spawn"),
+        )
+
+    @classmethod
+    def shared(cls) -> "DecodePool | None":
+        """プロセス全体で共有するプールを返す。無効な場合はNone"""
+        with cls._shared_lock:
+            if not cls._shared_initialized:
+                cls._shared_initialized = True
+                workers = cls._configured_workers()
+                if workers > 0:
+                    cls._shared = cls(workers)
+            return cls._shared
+
+    @staticmethod
+    def _configured_workers() -> int:
+        """環境変数またはコア数からプロセス数を決める（コアが少ない環境では無効）"""
+        env = os.environ.get("SIVIEW_DECODE_PROCESSES")
+        if env is not None:
+            try:
+                return max(0, int(env))
+            except ValueError:
+                return 0
+        cores = os.cpu_count() or 1
+        # Windowsの ProcessPoolExecutor は61プロセスが上限
+        return min(cores, 61) if cores >= 4 else 0
+
+    def should_offload(self, filename: str, size: int) -> bool:
+        ext = os.path.splitext(filename)[1].lower()
+        return ext in self.HEAVY_EXTENSIONS or size >= self.MIN_OFFLOAD_BYTES
+
+    def decode(self, data: bytes, filename: str, page: int = 0) -> tuple[QImage, int]:
+        """
+        別プロセスでデコードする（呼び出し元スレッドは完了まで待機）
+
+        Returns:
+            image (QImage): デコード結果
+            page_count (int): 総ページ数（単一画像は1）
+        """
+        from multiprocessing.shared_memory import SharedMemory
+
+        result = self._executor.submit(_decode_in_child, data, filename, page).result()
+
+        shm = SharedMemory(name=result.shm_name)
+        # 名前はすぐに削除する。マッピングは QImage が解放されるまで残る
+        shm.unlink()
+        owner = _SharedMemoryOwner(shm, result.stride * result.height)
+        image = wrap_buffer(
+            owner.view,
+            result.width,
+            result.height,
+            result.stride,
+            QImage.Format(result.format),
+            owner,
+        )
+        return image, result.page_count
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,164 @@
+"""
+2枚の画像の比較（差分画像とヒートマップ）
+
+画素値の配列はピラミッドの元画像（image.pyramid）を使い、差分はNumPyで
+一括計算する。差分画像は ScientificImage として返すため、コントラスト調整や
+ピクセル値の読み取りがそのまま使える
+"""
+
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+from image.buffer import OwnedImage
+from image.pyramid import PyramidCache
+from image.scientific import ScientificImage, ToneSettings
+
+
+class DiffResult(NamedTuple):
+    """比較結果"""
+    image_a: QImage
+    aligned_b: QImage          # A と同じサイズに合わせた B
+    diff: ScientificImage      # 画素ごとの差の絶対値（チャンネル間の最大）
+    heatmap: QImage            # 差分をカラーマップで表示した画像
+    max_abs: float
+    mean_abs: float
+    rms: float
+    changed: float             # 差のある画素の割合
+
+
+def _resample_nearest(arr: np.ndarray, height: int, width: int) -> np.ndarray:
+    """最近傍法で指定サイズにリサンプリングする"""
+    if arr.shape[:2] == (height, width):
+        return arr
+    rows = (np.arange(height) * arr.shape[0]) // height
+    cols = (np.arange(width) * arr.shape[1]) // width
+    return arr[rows[:, None], cols]
+
+
+def _luminance(arr: np.ndarray) -> np.ndarray:
+    """RGB を輝度に変換する（グレースケールと比較する場合）"""
+    if arr.ndim == 2:
+        return arr.astype(np.float32)
+    rgb = arr[..., :3].astype(np.float32)
+    return rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _to_qimage(arr: np.ndarray) -> QImage:
+    """RGB (H, W, 3) uint8 を QImage にする（コピーしない）"""
+    arr = np.ascontiguousarray(arr)
+    height, width = arr.shape[:2]
+    return OwnedImage(arr.data, width, height, arr.strides[0], QImage.Format.Format_RGB888, arr)
+
+
+def compute_diff(image_a: QImage, image_b: QImage, pyramids: PyramidCache) -> DiffResult:
+    """
+    B を A のサイズに合わせてから差分を計算する
+
+    チャンネル数が異なる場合（グレースケールとカラー）は輝度で比較する
+    """
+    a = pyramids.get(image_a).base
+    b = pyramids.get(image_b).base
+    height, width = a.shape[:2]
+    b = _resample_nearest(b, height, width)
+
+    if isinstance(image_b, ScientificImage):
+        aligned_b = ScientificImage(b) if b is not image_b.raw else image_b
+    elif b.shape[:2] == (image_b.height(), image_b.width()):
+        aligned_b = image_b
+    else:
+        aligned_b = _to_qimage(b)
+
+    if a.ndim != b.ndim or (a.ndim == 3 and a.shape[2] != b.shape[2]):
+        delta = np.abs(_luminance(a) - _luminance(b))
+    elif a.dtype == b.dtype and a.dtype.kind == "u":
+        # 符号なし整数は max - min で同じ型のまま差を求める（16bitならLUTで直接表示できる）
+        delta = np.maximum(a, b)
+        delta -= np.minimum(a, b)
+    else:
+        delta = np.abs(a.astype(np.float32) - b.astype(np.float32))
+    if delta.ndim == 3:
+        delta = delta.max(axis=2)
+
+    diff = ScientificImage(delta)
+    if delta.dtype.kind == "f" and not np.isfinite(delta).all():
+        delta = delta[np.isfinite(delta)]
+    flat = delta.reshape(-1)
+    max_abs = float(flat.max()) if flat.size else 0.0
+
+    # ヒートマップは 0〜最大差 を inferno で表示する
+    heat_settings = ToneSettings()
+    heat_settings.mode = "manual"
+    heat_settings.vmin, heat_settings.vmax = 0.0, max(max_abs, 1e-6)
+    heat_settings.colormap = "inferno"
+    heatmap = diff.render_region(heat_settings, 0, 0, width, height)
+
+    values = flat.astype(np.float32)
+    return DiffResult(
+        image_a=image_a,
+        aligned_b=aligned_b,
+        diff=diff,
+        heatmap=heatmap,
+        max_abs=max_abs,
+        mean_abs=float(flat.mean(dtype=np.float64)) if flat.size else 0.0,
+        rms=float(np.sqrt(np.dot(values, values) / values.size)) if values.size else 0.0,
+        changed=np.count_nonzero(flat) / flat.size if flat.size else 0.0,
+    )
+
+
+class DiffCache:
+    """比較結果のLRUキャッシュ（(A, Aのページ, B, Bのページ) をキーとする）"""
+
+    MAX_ENTRIES = 4
+    MAX_BYTES = 256 * 1024 * 1024  # 256MB
+
+    def __init__(self):
+        self._entries: OrderedDict[tuple[str, int, str, int], DiffResult] = OrderedDict()
+        self._bytes = 0
+        self.max_bytes = self.MAX_BYTES
+
+    @staticmethod
+    def _size(result: DiffResult) -> int:
+        # A と B はデコード済みキャッシュと共有していることが多いため、比較で生成した分だけ数える
+        return result.diff.sizeInBytes() + result.heatmap.sizeInBytes()
+
+    def get(self, key: tuple[str, int, str, int]) -> DiffResult | None:
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+
+    def insert(self, key: tuple[str, int, str, int], result: DiffResult):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._size(old)
+        self._entries[key] = result
+        self._bytes += self._size(result)
+        self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.MAX_ENTRIES or self._bytes > self.max_bytes
+        ):
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= self._size(old)
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def set_budget(self, max_bytes: int):
+        """上限を変更する（超えている分はすぐに追い出す）"""
+        self.max_bytes = max_bytes
+        self._evict_if_needed()
+
+    def remove(self, path: str):
+        """指定パスを含む比較結果を削除する"""
+        for key in [k for k in self._entries if path in (k[0], k[2])]:
+            self._bytes -= self._size(self._entries.pop(key))
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
@@ -0,0 +1,187 @@
+"""
+元ファイルのバイト列のディスクキャッシュ
+
+前回表示していた画像を次回起動時にサーバーへの接続を待たずに表示するために使う。
+prefetch.py で事前に取り込んだ画像もここに入り、GUIは接続前・接続中でもここから表示する。
+取得時の検証子も一緒に保存し、接続後は条件付きリクエストで鮮度を確かめる
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from api.client import Validator
+
+
+class DiskImageCache:
+    """
+    キーごとに1ファイルで保存するキャッシュ（合計が max_bytes を超えたら古いものから削除）
+
+    put() の書き込みはバックグラウンドスレッドで行い、一時ファイルからの rename で置き換える
+    （書き込み途中で終了しても壊れたファイルは読まれない）。GUIと prefetch.py の
+    別プロセスから同時に書き込んでも、読まれるのは完全に書き終えたファイルだけになる
+    """
+
+    MAX_BYTES = 256 * 1024 * 1024  # 256MB
+
+    def __init__(self, directory: Path, max_bytes: int | None = None):
+        """
+        Args:
+            max_bytes: 合計サイズの上限（None なら MAX_BYTES）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes or self.MAX_BYTES
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache")
+        self._lock = threading.Lock()
+        # 合計サイズ（最初の書き込みで数え、以降は書き込みごとに加減する）
+        self._total: int | None = None
+
+    @staticmethod
+    def key(host: str, remote_path: str) -> str:
+        """ホストとリモートパスからキーを作る（GUIと prefetch.py で共通）"""
+        return f"{host}:{remote_path}"
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        """(バイト列のファイル, メタデータのファイル)"""
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.directory / f"{name}.bin", self.directory / f"{name}.json"
+
+    def _read_meta(self, meta_path: Path) -> dict | None:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    def peek(self, key: str) -> tuple[int, Validator] | None:
+        """保存済みなら (大きさ, 検証子) を返す（バイト列は読まない）"""
+        data_path, meta_path = self._paths(key)
+        meta = self._read_meta(meta_path)
+        if meta is None or meta.get("key") != key:
+            return None
+        try:
+            if data_path.stat().st_size != meta.get("size"):
+                return None
+        except OSError:
+            return None
+        return meta["size"], Validator(meta.get("etag"), meta.get("last_modified"))
+
+    def get(self, key: str) -> tuple[bytes, Validator] | None:
+        """保存済みのバイト列と検証子を返す（無ければ None）"""
+        data_path, meta_path = self._paths(key)
+        meta = self._read_meta(meta_path)
+        if meta is None or meta.get("key") != key:
+            return None
+        try:
+            data = data_path.read_bytes()
+        except OSError:
+            return None
+        if len(data) != meta.get("size"):
+            return None
+        # 読んだものは最近使ったものとして扱う（削除は最終使用日時の古い順）
+        self.touch(key)
+        return data, Validator(meta.get("etag"), meta.get("last_modified"))
+
+    def put(self, key: str, data: bytes, validator: Validator):
+        """バイト列を保存する（呼び出し元は書き込みを待たない）"""
+        self._executor.submit(self.store, key, data, validator)
+
+    def store(self, key: str, data: bytes, validator: Validator):
+        """バイト列を保存し、書き終えるまで待つ（複数のスレッドから呼べる）"""
+        data_path, meta_path = self._paths(key)
+        meta = {
+            "key": key,
+            "size": len(data),
+            "etag": validator.etag,
+            "last_modified": validator.last_modified,
+        }
+        with self._lock:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                if self._read_meta(meta_path) == meta and data_path.exists():
+                    # 保存済みの内容と同じなら最終使用日時だけ更新する
+                    os.utime(data_path)
+                    return
+                if self._total is None:
+                    self._total = self._scan()[1]
+                try:
+                    self._total -= data_path.stat().st_size
+                except OSError:
+                    pass
+                # メタデータを先に消し、バイト列を置き換えてから書き直す
+                # （途中で終了しても古いメタデータと新しいバイト列が組み合わさらない）
+                meta_path.unlink(missing_ok=True)
+                self._replace(data_path, data)
+                self._replace(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+                self._total += len(data)
+                if self._total > self.max_bytes:
+                    self._prune()
+            except OSError:
+                pass
+
+    def touch(self, key: str):
+        """最終使用日時を更新する（鮮度を確かめて変更が無かった場合など）"""
+        data_path, _ = self._paths(key)
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+
+    def remove(self, key: str):
+        """保存済みの内容を削除する（元ファイルが変更されたときなど）"""
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            # メタデータを先に消す（バイト列だけ残っても読まれない）
+            meta_path.unlink(missing_ok=True)
+            try:
+                size = data_path.stat().st_size
+                data_path.unlink()
+            except OSError:
+                return
+            if self._total is not None:
+                self._total -= size
+
+    @staticmethod
+    def _replace(path: Path, data: bytes):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _scan(self) -> tuple[list[tuple[float, int, Path]], int]:
+        """([(最終使用日時, 大きさ, パス)], 合計サイズ)"""
+        entries = []
+        total = 0
+        for path in self.directory.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        return entries, total
+
+    def _prune(self):
+        """
+        合計サイズが上限を超えていれば最終使用日時の古いものから削除する
+
+        書き込みごとに全ファイルを調べると件数の2乗に比例するため、上限を超えたと
+        見積もったときだけ数え直す（別プロセスの書き込み分もここで反映される）
+        """
+        entries, total = self._scan()
+        entries.sort()
+        # 最新のもの（今書いたもの）は残す
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            path.with_suffix(".json").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            total -= size
+        self._total = total
+
+    def close(self):
+        """保留中の書き込みを終えるまで待つ"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,428 @@
+"""
+複数ページ文書（PDF / マルチページTIFF）とベクター画像のページ単位レンダリング
+
+文書はオープンしたまま DocumentCache に保持し、ページ移動やズームのたびに
+ネットワークから再取得せずに済むようにする
+"""
+
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QRectF, QSize, Qt
+from PySide6.QtGui import QImage, QImageReader, QPainter
+
+from image import scientific
+from image.buffer import wrap_buffer
+
+# PyMuPDFはスレッドセーフではないため、全文書の操作を直列化する
+_FITZ_LOCK = threading.Lock()
+
+
+class Document(ABC):
+    """ページ単位でレンダリングできる文書"""
+
+    # ベクター形式は任意の倍率で部分領域を再ラスタライズできる
+    is_vector = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    @abstractmethod
+    def page_count(self) -> int:
+        ...
+
+    @abstractmethod
+    def render_page(self, index: int) -> QImage:
+        ...
+
+    @abstractmethod
+    def render_region(self, index: int, rect: QRectF, scale: float) -> QImage:
+        """
+        ページの一部を高解像度でレンダリングする（ベクター形式以外は ValueError）
+
+        Args:
+            rect: render_page() の画像のピクセル座標系での領域
+            scale: render_page() の画像に対する倍率
+        """
+
+    def close(self):
+        pass
+
+
+class PdfDocument(Document):
+    """PyMuPDFで開いたPDF文書"""
+
+    is_vector = True
+
+    # 初回表示用の低解像度レンダリング倍率（72dpi）。拡大時は render_region で補う
+    BASE_SCALE = 1.0
+
+    def __init__(self, data: bytes):
+        # PyMuPDF は読み込みが重いため、PDFを初めて開くときに読み込む
+        import fitz
+
+        super().__init__()
+        with _FITZ_LOCK:
+            self._doc = fitz.open(stream=data, filetype="pdf")
+            count = self._doc.page_count
+        if count == 0:
+            self.close()
+            raise ValueError("PDFにページがありません")
+        self._page_count = count
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    def render_page(self, index: int) -> QImage:
+        import fitz
+
+        with self._lock, _FITZ_LOCK:
+            if self._doc is None:
+                raise ValueError("文書は既に閉じられています")
+            page = self._doc[index]
+            pix = page.get_pixmap(matrix=fitz.Matrix(self.BASE_SCALE, self.BASE_SCALE))
+        return self._to_qimage(pix)
+
+    def render_region(self, index: int, rect: QRectF, scale: float) -> QImage:
+        import fitz
+
+        zoom = self.BASE_SCALE * scale
+        # ベース画像のピクセル座標 → PDFのポイント座標
+        clip = fitz.Rect(
+            rect.left() / self.BASE_SCALE,
+            rect.top() / self.BASE_SCALE,
+            rect.right() / self.BASE_SCALE,
+            rect.bottom() / self.BASE_SCALE,
+        )
+        with self._lock, _FITZ_LOCK:
+            if self._doc is None:
+                raise ValueError("文書は既に閉じられています")
+            page = self._doc[index]
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)
+        return self._to_qimage(pix)
+
+    @staticmethod
+    def _to_qimage(pix) -> QImage:
+        # pixのサンプルをコピーせずに参照する（pixはQImageと同じ寿命で保持される）
+        return wrap_buffer(pix.samples_mv, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888, pix)
+
+    def close(self):
+        with self._lock, _FITZ_LOCK:
+            if self._doc is not None:
+                self._doc.close()
+                self._doc = None
+
+
+class ImageReaderDocument(Document):
+    """QImageReaderで開いたマルチフレーム画像（TIFF）"""
+
+    def __init__(self, data: bytes):
+        super().__init__()
+        self._bytes = QByteArray(data)
+        self._buffer = QBuffer(self._bytes)
+        self._buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        self._reader = QImageReader(self._buffer)
+        if not self._reader.canRead():
+            raise ValueError("画像の読み込みに失敗")
+        self._page_count = max(1, self._reader.imageCount())
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    def render_page(self, index: int) -> QImage:
+        with self._lock:
+            if not self._reader.jumpToImage(index):
+                raise ValueError(f"ページ {index + 1} に移動できません")
+            image = self._reader.read()
+        if image.isNull():
+            raise ValueError(f"ページ {index + 1} の読み込みに失敗: {self._reader.errorString()}")
+        # 16bitグレースケールはトーンマッピングできるよう生データを保持する
+        return scientific.from_qimage(image) or image
+
+    def render_region(self, index: int, rect: QRectF, scale: float) -> QImage:
+        raise ValueError("ベクター形式ではありません")
+
+
+class ScientificDocument(Document):
+    """tifffileで開いた高ビット深度（16bit整数・浮動小数点）のTIFF"""
+
+    def __init__(self, tif):
+        super().__init__()
+        self._tif = tif
+        self._page_count = len(tif.pages)
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    def render_page(self, index: int) -> QImage:
+        with self._lock:
+            if self._tif is None:
+                raise ValueError("文書は既に閉じられています")
+            raw = self._tif.pages[index].asarray()
+        return scientific.ScientificImage(raw)
+
+    def render_region(self, index: int, rect: QRectF, scale: float) -> QImage:
+        raise ValueError("ベクター形式ではありません")
+
+    def close(self):
+        with self._lock:
+            if self._tif is not None:
+                self._tif.close()
+                self._tif = None
+
+
+class SvgDocument(Document):
+    """QSvgRendererで開いたSVG画像（1ページ）"""
+
+    is_vector = True
+
+    def __init__(self, data: bytes):
+        super().__init__()
+        from PySide6.QtSvg import QSvgRenderer
+
+        self._renderer = QSvgRenderer(QByteArray(data))
+        if not self._renderer.isValid():
+            raise ValueError("SVGの読み込みに失敗")
+        size = self._renderer.defaultSize()
+        self._size = size if size.isValid() else QSize(512, 512)
+
+    @property
+    def page_count(self) -> int:
+        return 1
+
+    @property
+    def size(self) -> QSize:
+        """SVGの既定サイズ（指定が無い場合は 512x512）"""
+        return QSize(self._size)
+
+    def render_page(self, index: int) -> QImage:
+        return self.render_region(index, QRectF(0, 0, self._size.width(), self._size.height()), 1.0)
+
+    def render_region(self, index: int, rect: QRectF, scale: float) -> QImage:
+        width = max(1, math.ceil(rect.width() * scale))
+        height = max(1, math.ceil(rect.height() * scale))
+        image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+
+        with self._lock:
+            painter = QPainter(image)
+            painter.scale(scale, scale)
+            painter.translate(-rect.left(), -rect.top())
+            self._renderer.render(painter, QRectF(0, 0, self._size.width(), self._size.height()))
+            painter.end()
+        return image
+
+
+class DocumentCache:
+    """
+    オープン済み文書のLRUキャッシュ
+
+    上限（文書数・元データのバイト数）を超えると最も古い文書を閉じる。
+    ワーカースレッドから参照されるためロックで保護する
+    """
+
+    MAX_DOCUMENTS = 4
+    MAX_BYTES = 256 * 1024 * 1024  # 256MB
+    EXTENSIONS = [".pdf", ".tif", ".tiff", ".svg"]
+    VECTOR_EXTENSIONS = [".pdf", ".svg"]
+
+    def __init__(self):
+        self._docs: OrderedDict[str, Document] = OrderedDict()
+        # 文書ごとの使用量は開いたときの元データの大きさで見積もる
+        self._sizes: dict[str, int] = {}
+        self._bytes = 0
+        self.max_bytes = self.MAX_BYTES
+        self._lock = threading.Lock()
+
+    @classmethod
+    def supports(cls, filename: str) -> bool:
+        """ページ単位で扱う形式かどうか"""
+        return os.path.splitext(filename)[1].lower() in cls.EXTENSIONS
+
+    @classmethod
+    def supports_vector(cls, filename: str) -> bool:
+        """ズームに応じて再ラスタライズできる形式かどうか"""
+        return os.path.splitext(filename)[1].lower() in cls.VECTOR_EXTENSIONS
+
+    def is_open(self, key: str) -> bool:
+        with self._lock:
+            return key in self._docs
+
+    def render(self, key: str, data: bytes | None, filename: str, page: int) -> tuple[QImage, int]:
+        """
+        指定ページをレンダリングする。文書が未オープンなら data から開く
+
+        Returns:
+            image (QImage): レンダリング結果
+            page_count (int): 総ページ数
+        """
+        doc = self._open(key, data, filename)
+        page = min(max(page, 0), doc.page_count - 1)
+        return doc.render_page(page), doc.page_count
+
+    def open(self, key: str, data: bytes, filename: str) -> int:
+        """文書を開いてキャッシュに登録する（レンダリングはしない）。総ページ数を返す"""
+        return self._open(key, data, filename).page_count
+
+    def render_region(
+        self,
+        key: str,
+        data: bytes | None,
+        filename: str,
+        page: int,
+        rect: QRectF,
+        scale: float,
+    ) -> QImage:
+        """ベクター文書の一部を指定倍率でレンダリングする。文書が未オープンなら data から開く"""
+        doc = self._open(key, data, filename)
+        if not doc.is_vector:
+            raise ValueError(f"ベクター形式ではありません: {filename}")
+        return doc.render_region(page, rect, scale)
+
+    def is_scientific(self, key: str) -> bool:
+        """高ビット深度の文書として開かれているかどうか（生データを保持するため別プロセスに任せない）"""
+        with self._lock:
+            return isinstance(self._docs.get(key), ScientificDocument)
+
+    def page_count(self, key: str) -> int | None:
+        with self._lock:
+            doc = self._docs.get(key)
+            return doc.page_count if doc is not None else None
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def set_budget(self, max_bytes: int):
+        """上限を変更する（超えている分はすぐに閉じる）"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            evicted = self._evict_locked()
+        for doc in evicted:
+            doc.close()
+
+    def _evict_locked(self) -> list[Document]:
+        evicted = []
+        while len(self._docs) > 1 and (len(self._docs) > self.MAX_DOCUMENTS or self._bytes > self.max_bytes):
+            key, old = self._docs.popitem(last=False)
+            self._bytes -= self._sizes.pop(key, 0)
+            evicted.append(old)
+        return evicted
+
+    def remove(self, key: str):
+        with self._lock:
+            doc = self._docs.pop(key, None)
+            self._bytes -= self._sizes.pop(key, 0)
+        if doc is not None:
+            doc.close()
+
+    def clear(self):
+        with self._lock:
+            docs = list(self._docs.values())
+            self._docs.clear()
+            self._sizes.clear()
+            self._bytes = 0
+        for doc in docs:
+            doc.close()
+
+    def _open(self, key: str, data: bytes | None, filename: str) -> Document:
+        with self._lock:
+            doc = self._docs.get(key)
+            if doc is not None:
+                self._docs.move_to_end(key)
+                return doc
+
+        if data is None:
+            raise ValueError(f"文書がキャッシュにありません: {filename}")
+
+        ext = os.path.splitext(filename)[1].lower()
+        if ext == ".pdf":
+            doc = PdfDocument(data)
+        elif ext == ".svg":
+            doc = SvgDocument(data)
+        else:
+            tif = scientific.open_tiff(data)
+            doc = ScientificDocument(tif) if tif is not None else ImageReaderDocument(data)
+
+        evicted = []
+        with self._lock:
+            # 並行して開かれていた場合は先に登録された方を使う
+            existing = self._docs.get(key)
+            if existing is not None:
+                evicted.append(doc)
+                doc = existing
+            else:
+                self._docs[key] = doc
+                self._sizes[key] = len(data)
+                self._bytes += len(data)
+            evicted.extend(self._evict_locked())
+        for old in evicted:
+            old.close()
+        return doc
+
+
+class RegionRenderCache:
+    """
+    ベクター文書の部分レンダリング結果のキャッシュ
+
+    (文書, ページ, 倍率バケット) ごとに直近の領域を1枚保持し、
+    表示領域がその領域に収まっていれば再レンダリングしない
+    """
+
+    MAX_BYTES = 128 * 1024 * 1024  # 128MB
+
+    def __init__(self):
+        self._entries: OrderedDict[tuple[str, int, float], tuple[QRectF, QImage]] = OrderedDict()
+        self._bytes = 0
+        self.max_bytes = self.MAX_BYTES
+
+    @staticmethod
+    def bucket(scale: float) -> float:
+        """倍率を √2 刻みのバケットに切り上げる（常に必要以上の解像度で描画する）"""
+        return 2 ** (math.ceil(math.log2(max(scale, 1e-6)) * 2) / 2)
+
+    def get(self, path: str, page: int, bucket: float, rect: QRectF) -> tuple[QRectF, QImage] | None:
+        key = (path, page, bucket)
+        entry = self._entries.get(key)
+        if entry is None or not entry[0].contains(rect):
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def insert(self, path: str, page: int, bucket: float, rect: QRectF, image: QImage):
+        key = (path, page, bucket)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1].sizeInBytes()
+        self._entries[key] = (rect, image)
+        self._bytes += image.sizeInBytes()
+        self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, img) = self._entries.popitem(last=False)
+            self._bytes -= img.sizeInBytes()
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def set_budget(self, max_bytes: int):
+        """上限を変更する（超えている分はすぐに追い出す）"""
+        self.max_bytes = max_bytes
+        self._evict_if_needed()
+
+    def remove(self, path: str):
+        for key in [k for k in self._entries if k[0] == path]:
+            self._bytes -= self._entries.pop(key)[1].sizeInBytes()
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
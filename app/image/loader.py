@@ -1,27 +1,56 @@
 import os
 
-import fitz
-from PySide6.QtGui import QImage, QPixmap, QPainter
-from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtGui import QImage, QPainter
 from PySide6.QtCore import QByteArray, QSize, Qt
 # PyQt5の場合は import を置き換えるだけ
 
+from const import IMAGE_EXTENSIONS
+from image.buffer import to_pixmap, wrap_buffer
+from image.decode_pool import DecodePool
+
 
 class ImageLoader:
 
-    EXTENSIONS = [".png", ".jpg", ".jpeg", ".tif", ".tiff", ".gif", ".svg", ".pdf"]
+    EXTENSIONS = list(IMAGE_EXTENSIONS)
 
-    def __init__(self, return_pixmap: bool = False):
+    def __init__(self, return_pixmap: bool = False, use_pool: bool = True):
         """
         return_pixmap=True にすると QPixmap を返す
         False の場合は QImage
+
+        use_pool=True の場合、重い形式はプロセスプールでデコードする（プールが有効な場合のみ）
         """
         self.return_pixmap = return_pixmap
+        self._use_pool = use_pool
+
+    @property
+    def _pool(self) -> DecodePool | None:
+        # プールはワーカースレッドで最初にデコードするときに作る（ワーカー生成時にUIスレッドで作らない）
+        return DecodePool.shared() if self._use_pool else None
+
+    def can_offload(self, filename: str, size: int) -> bool:
+        """プロセスプールでデコードするかどうか"""
+        return self._pool is not None and self._pool.should_offload(filename, size)
+
+    def load_page(self, data: bytes, filename: str, page: int = 0) -> tuple[QImage, int]:
+        """
+        文書形式の指定ページをプロセスプールでレンダリングする
+
+        Returns:
+            image (QImage): レンダリング結果
+            page_count (int): 総ページ数
+        """
+        if self._pool is None:
+            raise RuntimeError("デコードプロセスプールが無効です")
+        return self._pool.decode(data, filename, page)
 
     def load(self, data: bytes, filename: str):
         ext = os.path.splitext(filename)[1].lower()
 
-        if ext in [".png", ".jpg", ".jpeg", ".tif", ".tiff", ".gif"]:
+        if self.can_offload(filename, len(data)):
+            image, _ = self._pool.decode(data, filename)
+
+        elif ext in [".png", ".jpg", ".jpeg", ".tif", ".tiff", ".gif"]:
             image = QImage.fromData(data)
             if image.isNull():
                 raise ValueError("画像の読み込みに失敗")
@@ -36,10 +65,13 @@ class ImageLoader:
             raise ValueError(f"未対応の拡張子: {ext}")
 
         if self.return_pixmap:
-            return QPixmap.fromImage(image)
+            return to_pixmap(image)
         return image
 
     def _load_svg(self, data: bytes) -> QImage:
+        # QtSvg と PyMuPDF は起動を遅くするため、その形式を初めて読むときに読み込む
+        from PySide6.QtSvg import QSvgRenderer
+
         renderer = QSvgRenderer(QByteArray(data))
         if not renderer.isValid():
             raise ValueError("SVGの読み込みに失敗")
@@ -60,6 +92,8 @@ class ImageLoader:
     @staticmethod
     def _load_pdf(data: bytes) -> QImage:
         """PDFの1ページ目を画像としてレンダリング"""
+        import fitz
+
         doc = fitz.open(stream=data, filetype="pdf")
         if doc.page_count == 0:
             raise ValueError("PDFにページがありません")
@@ -69,7 +103,6 @@ class ImageLoader:
         pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
         doc.close()
 
-        image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888)
-        # pixのメモリが解放されても安全なようにコピー
-        return image.copy()
+        # pixのサンプルをコピーせずに参照する（pixはQImageと同じ寿命で保持される）
+        return wrap_buffer(pix.samples_mv, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888, pix)
 
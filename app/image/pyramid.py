@@ -0,0 +1,194 @@
+"""
+解析用の多解像度ピラミッドと領域統計
+
+ヒストグラムや統計値は全画素を使わなくても十分な精度が出るため、
+1/2 ずつ間引いたレベルを遅延生成してキャッシュし、領域の大きさに応じて
+サンプル数が上限以下になるレベルで計算する（1億画素の画像でも対話的に扱える）
+"""
+
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QImage
+
+from image.scientific import ScientificImage
+
+
+class RegionStats(NamedTuple):
+    """領域の統計値とヒストグラム"""
+    count: int                 # 計算に使った画素数
+    level: int                 # 使ったピラミッドのレベル（0 が元画像）
+    minimum: float
+    maximum: float
+    mean: float
+    std: float
+    hist: np.ndarray           # (チャンネル数, BINS)
+    hist_range: tuple[float, float]
+    channels: str              # "L" または "RGB"
+
+
+class Pyramid:
+    """1/2 ずつ間引いた解像度レベルの列（必要になったレベルだけ生成する）"""
+
+    # これより小さいレベルは作らない
+    MIN_SIZE = 64
+
+    def __init__(self, base: np.ndarray, channels: str):
+        self.channels = channels
+        self._levels: list[np.ndarray] = [base]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_image(cls, image: QImage) -> "Pyramid":
+        """画像の画素値の配列からピラミッドを作る（高ビット深度画像は生データを使う）"""
+        if isinstance(image, ScientificImage):
+            raw = image.raw
+            return cls(raw, "L" if raw.ndim == 2 else "RGB")
+
+        if image.format() != QImage.Format.Format_RGB32:
+            image = image.convertToFormat(QImage.Format.Format_RGB32)
+        width, height = image.width(), image.height()
+        row = image.bytesPerLine() // 4
+        # RGB32 はメモリ上 B, G, R, A の順（リトルエンディアン）
+        bgra = np.frombuffer(image.constBits(), dtype=np.uint8).reshape(height, row, 4)[:, :width]
+        return cls(np.ascontiguousarray(bgra[..., 2::-1]), "RGB")
+
+    @property
+    def base(self) -> np.ndarray:
+        return self._levels[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self._levels)
+
+    def level(self, index: int) -> np.ndarray:
+        """指定レベルの配列を返す（未生成なら生成する）"""
+        with self._lock:
+            while len(self._levels) <= index:
+                prev = self._levels[-1]
+                if min(prev.shape[:2]) < self.MIN_SIZE * 2:
+                    break
+                self._levels.append(np.ascontiguousarray(prev[::2, ::2]))
+            return self._levels[min(index, len(self._levels) - 1)]
+
+    def region(self, rect: QRectF, max_samples: int) -> tuple[np.ndarray, int]:
+        """
+        領域（元画像のピクセル座標）の画素をサンプル数が max_samples 以下になるレベルから取り出す
+
+        Returns:
+            samples (ndarray): 領域の画素
+            level (int): 使ったレベル
+        """
+        height, width = self.base.shape[:2]
+        x0, y0 = max(0, int(rect.left())), max(0, int(rect.top()))
+        x1, y1 = min(width, int(np.ceil(rect.right()))), min(height, int(np.ceil(rect.bottom())))
+        pixels = max(1, (x1 - x0) * (y1 - y0))
+        # 1レベル上がるごとに画素数は 1/4
+        wanted = max(0, int(np.ceil(np.log(pixels / max_samples) / np.log(4)))) if pixels > max_samples else 0
+
+        array = self.level(wanted)
+        factor = self.base.shape[0] / array.shape[0]
+        level = int(round(np.log2(factor)))
+        step = 2 ** level
+        region = array[y0 // step:max(y0 // step + 1, y1 // step), x0 // step:max(x0 // step + 1, x1 // step)]
+        return region, level
+
+
+class PyramidCache:
+    """
+    画像ごとのピラミッドのLRUキャッシュ（QImage.cacheKey() で識別する）
+
+    縮小レベルは必要になったときに追加されるため、使用量はその都度合計する
+    """
+
+    MAX_ENTRIES = 4
+    MAX_BYTES = 256 * 1024 * 1024  # 256MB
+
+    def __init__(self):
+        self._entries: OrderedDict[int, Pyramid] = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_bytes = self.MAX_BYTES
+
+    def get(self, image: QImage) -> Pyramid:
+        key = image.cacheKey()
+        with self._lock:
+            pyramid = self._entries.get(key)
+            if pyramid is not None:
+                self._entries.move_to_end(key)
+                return pyramid
+
+        pyramid = Pyramid.from_image(image)
+        with self._lock:
+            self._entries[key] = pyramid
+            self._evict_locked()
+        return pyramid
+
+    def _evict_locked(self):
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.MAX_ENTRIES
+            or sum(p.nbytes for p in self._entries.values()) > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+
+    @property
+    def current_bytes(self) -> int:
+        with self._lock:
+            return sum(p.nbytes for p in self._entries.values())
+
+    def set_budget(self, max_bytes: int):
+        """上限を変更する（超えている分はすぐに追い出す）"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict_locked()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# ヒストグラムのビン数と、統計に使う最大サンプル数
+BINS = 256
+MAX_SAMPLES = 512 * 512
+
+
+def region_stats(pyramid: Pyramid, rect: QRectF) -> RegionStats:
+    """領域の統計値とヒストグラムを計算する"""
+    samples, level = pyramid.region(rect, MAX_SAMPLES)
+    if samples.ndim == 3:
+        channels = samples[..., :3].reshape(-1, min(3, samples.shape[2]))
+        values = channels.astype(np.float64)
+    else:
+        values = samples.reshape(-1, 1).astype(np.float64)
+
+    finite = values[np.isfinite(values).all(axis=1)]
+    if finite.size == 0:
+        empty = np.zeros((values.shape[1], BINS), dtype=np.int64)
+        return RegionStats(0, level, 0.0, 0.0, 0.0, 0.0, empty, (0.0, 1.0), pyramid.channels)
+
+    if samples.dtype == np.uint8:
+        # 8bitは値とビンを1対1に対応させる
+        lo, hi, span = 0.0, 255.0, 256.0
+    else:
+        lo, hi = float(finite.min()), float(finite.max())
+        if hi <= lo:
+            hi = lo + 1.0
+        span = hi - lo
+
+    # np.histogram より速い bincount で各チャンネルを数える
+    bins = np.clip(((finite - lo) * (BINS / span)).astype(np.intp), 0, BINS - 1)
+    hist = np.stack([np.bincount(bins[:, c], minlength=BINS) for c in range(bins.shape[1])])
+
+    return RegionStats(
+        count=len(finite),
+        level=level,
+        minimum=float(finite.min()),
+        maximum=float(finite.max()),
+        mean=float(finite.mean()),
+        std=float(finite.std()),
+        hist=hist,
+        hist_range=(lo, hi),
+        channels=pyramid.channels,
+    )
@@ -0,0 +1,208 @@
+"""
+高ビット深度（16bit整数・浮動小数点）画像の読み込みと表示用トーンマッピング
+
+検出器のTIFFは16bitやfloat32で保存されており、QImage.fromData では
+読めないか真っ暗に表示される。生データをNumPy配列で保持し、
+LUTによるベクトル演算で表示用の8bit画像に変換する。
+"""
+
+import io
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+from image.buffer import OwnedImage
+
+# 浮動小数点・32bit整数データを量子化するLUTの段数
+_LUT_SIZE = 4096
+
+# パーセンタイル計算に使う最大サンプル数（全画素を使わずに間引く）
+_MAX_RANGE_SAMPLES = 1 << 20
+
+# カラーマップの基準色（線形補間してLUTを作る）
+COLORMAPS: dict[str, list[tuple[int, int, int]]] = {
+    "gray": [(0, 0, 0), (255, 255, 255)],
+    "viridis": [(68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37)],
+    "magma": [(0, 0, 4), (81, 18, 124), (183, 55, 121), (252, 137, 97), (252, 253, 191)],
+    "inferno": [(0, 0, 4), (87, 16, 110), (188, 55, 84), (249, 142, 9), (252, 255, 164)],
+}
+
+class ToneSettings:
+    """
+    表示マッピングの設定（ビューア全体で共有する）
+
+    mode:
+        "percentile": lo_pct〜hi_pct パーセンタイルを表示範囲にする
+        "minmax": 最小値〜最大値
+        "manual": vmin〜vmax
+    """
+
+    MODES = ["percentile", "minmax", "manual"]
+
+    def __init__(self):
+        self.mode = "percentile"
+        self.lo_pct = 0.5
+        self.hi_pct = 99.5
+        self.vmin = 0.0
+        self.vmax = 1.0
+        self.gamma = 1.0
+        self.colormap = "gray"
+
+    def key(self) -> tuple:
+        """LUT・表示範囲のキャッシュキー"""
+        return (self.mode, self.lo_pct, self.hi_pct, self.vmin, self.vmax, self.gamma, self.colormap)
+
+
+def _build_lut(size: int, gamma: float, colormap: str) -> np.ndarray:
+    """
+    正規化値 [0, 1] を size 段に量子化した LUT を作る
+
+    要素は QImage.Format_RGB32 の画素値（0xffRRGGBB）で、1回の参照で1画素が決まる
+    """
+    t = np.linspace(0.0, 1.0, size)
+    if gamma != 1.0:
+        t = t ** (1.0 / gamma)
+    anchors = np.asarray(COLORMAPS.get(colormap, COLORMAPS["gray"]), dtype=np.float64)
+    xp = np.linspace(0.0, 1.0, len(anchors))
+    lut = np.full(size, 0xFF000000, dtype=np.uint32)
+    for c, shift in enumerate((16, 8, 0)):
+        lut |= np.interp(t, xp, anchors[:, c]).round().astype(np.uint32) << shift
+    return lut
+
+
+class ScientificImage(OwnedImage):
+    """
+    生データ（NumPy配列）を保持する画像
+
+    QImage としての画素は既定の設定でマッピングしたプレビュー。
+    表示時は render_region() で表示領域だけを現在の設定で再マッピングする
+    """
+
+    def __init__(self, raw: np.ndarray):
+        raw = np.squeeze(raw)
+        if raw.ndim == 3 and raw.shape[0] in (3, 4) and raw.shape[-1] not in (3, 4):
+            # チャンネルが先頭にある場合は (H, W, C) に並べ替える
+            raw = np.moveaxis(raw, 0, -1)
+        if raw.ndim not in (2, 3):
+            raise ValueError(f"未対応の配列形状: {raw.shape}")
+
+        self.raw = raw
+        self._range_cache: dict[tuple, tuple[float, float]] = {}
+        self._lut_cache: dict[tuple, tuple[np.ndarray, float, float]] = {}
+
+        pixels = self.map_array(raw, ToneSettings())
+        height, width = pixels.shape
+        super().__init__(pixels.data, width, height, pixels.strides[0], QImage.Format.Format_RGB32, pixels)
+
+    def sizeInBytes(self) -> int:
+        # キャッシュの容量計算には生データも含める
+        return super().sizeInBytes() + self.raw.nbytes
+
+    def display_range(self, settings: ToneSettings) -> tuple[float, float]:
+        """設定に応じた表示範囲 (vmin, vmax) を返す"""
+        if settings.mode == "manual":
+            lo, hi = settings.vmin, settings.vmax
+            return (lo, hi) if hi > lo else (lo, lo + 1.0)
+
+        key = (settings.mode, settings.lo_pct, settings.hi_pct)
+        cached = self._range_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # 全画素ではなく間引いたサンプルで求める（ノイズの多い検出器画像では十分な精度）
+        step = max(1, int(np.sqrt(self.raw.size / _MAX_RANGE_SAMPLES)))
+        sample = self.raw[::step, ::step]
+        if sample.dtype.kind == "f":
+            # NaN・±inf は範囲に含めない（inf が入ると範囲全体が inf になる）
+            sample = sample[np.isfinite(sample)]
+        if sample.size == 0:
+            lo, hi = 0.0, 1.0
+        elif settings.mode == "minmax":
+            lo, hi = float(np.min(sample)), float(np.max(sample))
+        else:
+            lo, hi = (float(v) for v in np.percentile(sample, [settings.lo_pct, settings.hi_pct]))
+        if not hi > lo:
+            hi = lo + 1.0
+        self._range_cache[key] = (lo, hi)
+        return lo, hi
+
+    def map_array(self, arr: np.ndarray, settings: ToneSettings) -> np.ndarray:
+        """配列（raw の一部）を設定に従って RGB32 の画素配列 (H, W) uint32 に変換する"""
+        lut, lo, hi = self._lut(settings, arr.dtype)
+
+        if arr.dtype in (np.uint8, np.uint16):
+            # 8/16bit整数は値域全体を網羅するLUTで直接引く
+            idx = arr
+        else:
+            scale = (_LUT_SIZE - 1) / (hi - lo)
+            # NaN は下端、±inf はLUTの両端に割り当てる
+            norm = (np.nan_to_num(arr, nan=lo, posinf=hi, neginf=lo).astype(np.float32) - lo) * scale
+            idx = np.clip(norm, 0, _LUT_SIZE - 1).astype(np.uint16)
+
+        if idx.ndim == 3:
+            # 複数チャンネルはグレーのLUTで各チャンネルを変換し、R/G/Bの成分だけを取り出して合成する
+            pixels = np.full(idx.shape[:2], 0xFF000000, dtype=np.uint32)
+            for c, mask in enumerate((0xFF0000, 0x00FF00, 0x0000FF)):
+                pixels |= lut[idx[..., min(c, idx.shape[2] - 1)]] & np.uint32(mask)
+            return pixels
+        return np.ascontiguousarray(lut[idx])
+
+    def render_region(self, settings: ToneSettings, x0: int, y0: int, x1: int, y1: int, step: int = 1) -> QImage:
+        """
+        指定領域だけを再マッピングした画像を返す
+
+        step > 1 の場合は間引いて変換する（縮小表示時に画面解像度以上の計算をしない）
+        """
+        region = self.raw[y0:y1:step, x0:x1:step]
+        pixels = self.map_array(region, settings)
+        height, width = pixels.shape
+        return OwnedImage(pixels.data, width, height, pixels.strides[0], QImage.Format.Format_RGB32, pixels)
+
+    def _lut(self, settings: ToneSettings, dtype: np.dtype) -> tuple[np.ndarray, float, float]:
+        key = settings.key() + (str(dtype),)
+        cached = self._lut_cache.get(key)
+        if cached is not None:
+            return cached
+
+        lo, hi = self.display_range(settings)
+        colormap = settings.colormap if self.raw.ndim == 2 else "gray"
+        lut = _build_lut(_LUT_SIZE, settings.gamma, colormap)
+        if dtype in (np.uint8, np.uint16):
+            # 表示範囲への正規化もLUTに含める
+            values = np.arange(256 if dtype == np.uint8 else 65536, dtype=np.float64)
+            t = np.clip((values - lo) / (hi - lo), 0.0, 1.0)
+            lut = lut[(t * (_LUT_SIZE - 1)).round().astype(np.intp)]
+
+        if len(self._lut_cache) >= 8:
+            self._lut_cache.clear()
+        result = (lut, lo, hi)
+        self._lut_cache[key] = result
+        return result
+
+
+def open_tiff(data: bytes):
+    """
+    高ビット深度のTIFFを tifffile で開く
+
+    8bit画像（Qtで表示できるもの）や tifffile が無い場合は None を返す
+    """
+    try:
+        import tifffile
+    except ImportError:
+        return None
+
+    tif = tifffile.TiffFile(io.BytesIO(data))
+    if len(tif.pages) == 0 or tif.pages[0].dtype == np.uint8:
+        tif.close()
+        return None
+    return tif
+
+
+def from_qimage(image: QImage) -> ScientificImage | None:
+    """Qtが読み込んだ16bitグレースケール画像を ScientificImage に変換する（tifffile が無い場合用）"""
+    if image.format() != QImage.Format.Format_Grayscale16:
+        return None
+    width, height = image.width(), image.height()
+    row = image.bytesPerLine() // 2
+    raw = np.frombuffer(image.constBits(), dtype=np.uint16).reshape(height, row)[:, :width].copy()
+    return ScientificImage(raw)
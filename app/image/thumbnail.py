@@ -0,0 +1,173 @@
+"""
+グリッド表示用のサムネイル生成とキャッシュ
+
+ラスタ画像は QImageReader の縮小読み込み（JPEGはデコード時に縮小される）を使い、
+元解像度の画像を作らずにセルの解像度で生成する
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QRectF, QSize, Qt
+from PySide6.QtGui import QImage, QImageReader, QPixmap
+
+from image import scientific
+from image.document import PdfDocument, SvgDocument
+
+
+def _fit(size: QSize, edge: int) -> QSize:
+    """縦横比を保って長辺が edge 以下になるサイズ"""
+    return size.scaled(QSize(edge, edge), Qt.AspectRatioMode.KeepAspectRatio) if size.isValid() else size
+
+
+def scale_image(image: QImage, edge: int) -> QImage:
+    """長辺が edge になるよう縮小する（元から小さい画像はそのまま）"""
+    if max(image.width(), image.height()) <= edge:
+        return image
+    # 大きく縮小する場合は先に粗く縮小してから平滑化する
+    if max(image.width(), image.height()) > edge * 4:
+        image = image.scaled(edge * 2, edge * 2, Qt.AspectRatioMode.KeepAspectRatio)
+    return image.scaled(edge, edge, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+
+def make_thumbnail(data: bytes, filename: str, edge: int) -> QImage:
+    """元ファイルのバイト列から長辺 edge のサムネイルを作る"""
+    ext = os.path.splitext(filename)[1].lower()
+
+    if ext == ".pdf":
+        doc = PdfDocument(data)
+        try:
+            return scale_image(doc.render_page(0), edge)
+        finally:
+            doc.close()
+
+    if ext == ".svg":
+        doc = SvgDocument(data)
+        rect = QRectF(0, 0, doc.size.width(), doc.size.height())
+        # ベクター形式なのでセルの解像度で直接ラスタライズする
+        scale = edge / max(rect.width(), rect.height(), 1)
+        return doc.render_region(0, rect, min(scale, 1.0))
+
+    if ext in (".tif", ".tiff"):
+        tif = scientific.open_tiff(data)
+        if tif is not None:
+            try:
+                raw = tif.pages[0].asarray()
+            finally:
+                tif.close()
+            # 間引いてから表示用に変換する
+            step = max(1, -(-max(raw.shape[:2]) // edge))
+            return scientific.ScientificImage(raw[::step, ::step])
+
+    # QBuffer はバイト列を参照するだけなので、読み込みが終わるまで保持しておく
+    array = QByteArray(data)
+    buffer = QBuffer(array)
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and max(size.width(), size.height()) > edge:
+        reader.setScaledSize(_fit(size, edge))
+    image = reader.read()
+    error = reader.errorString()
+    # リーダー → バッファ → バイト列の順に解放する（逆順だと解放済みのデバイスを参照する）
+    del reader
+    buffer.close()
+    del buffer
+    if image.isNull():
+        raise ValueError(f"サムネイルの生成に失敗: {error}")
+    return scale_image(image, edge)
+
+
+class ThumbnailCache:
+    """サムネイルのLRUキャッシュ（GUIスレッドで QPixmap として保持する）"""
+
+    MAX_BYTES = 64 * 1024 * 1024  # 64MB
+
+    def __init__(self):
+        self._entries: OrderedDict[str, QPixmap] = OrderedDict()
+        self._bytes = 0
+        self.max_bytes = self.MAX_BYTES
+
+    @staticmethod
+    def _size_of(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+    def get(self, path: str) -> QPixmap | None:
+        pixmap = self._entries.get(path)
+        if pixmap is not None:
+            self._entries.move_to_end(path)
+        return pixmap
+
+    def insert(self, path: str, pixmap: QPixmap):
+        old = self._entries.pop(path, None)
+        if old is not None:
+            self._bytes -= self._size_of(old)
+        self._entries[path] = pixmap
+        self._bytes += self._size_of(pixmap)
+        self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._size_of(evicted)
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def set_budget(self, max_bytes: int):
+        """上限を変更する（超えている分はすぐに追い出す）"""
+        self.max_bytes = max_bytes
+        self._evict_if_needed()
+
+    def remove(self, path: str):
+        pixmap = self._entries.pop(path, None)
+        if pixmap is not None:
+            self._bytes -= self._size_of(pixmap)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+
+class ThumbnailQueue:
+    """
+    サムネイル生成要求のキュー（複数のワーカースレッドから取り出す）
+
+    最後に要求されたものから処理する（スクロール後に表示されたセルを優先する）
+    """
+
+    def __init__(self):
+        self._items: OrderedDict[str, tuple] = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, path: str, item: tuple):
+        with self._cond:
+            self._items.pop(path, None)
+            self._items[path] = item
+            self._cond.notify()
+
+    def take(self) -> tuple[str, tuple] | None:
+        """次の要求を取り出す。キューが閉じられたら None を返す"""
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            return self._items.popitem(last=True)
+
+    def clear(self) -> list[str]:
+        """未処理の要求を取り消し、取り消したパスを返す"""
+        with self._cond:
+            paths = list(self._items)
+            self._items.clear()
+            return paths
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
@@ -7,11 +7,14 @@ from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
 
 from state.manager import StateManager
-from ui.host_dialog import HostDialog
-from ui.main_window import MainWindow
 
 
 def main():
+    # UIのモジュールは main() の中で読み込む（デコード用の子プロセスは spawn でこのモジュールを
+    # 読み込み直すため、モジュールの先頭で読み込むと子プロセスの起動も遅くなる）
+    from ui.host_dialog import HostDialog
+    from ui.main_window import MainWindow
+
     # 環境変数にPySide6を登録
     dirname = os.path.dirname(PySide6.__file__)
     plugin_path = os.path.join(dirname, "plugins", "platforms")
@@ -49,5 +52,9 @@ def main():
 
 
 if __name__ == "__main__":
+    import multiprocessing
+
+    # PyInstallerでビルドした場合にデコード用子プロセスを起動できるようにする
+    multiprocessing.freeze_support()
     main()
 
@@ -0,0 +1,339 @@
+"""
+ディスクキャッシュへの事前取り込み（GUIを使わないコマンドライン）
+
+リモートのディレクトリ以下の画像を並列にダウンロードし、GUIと共有するディスクキャッシュ
+（~/.siview/cache）に保存する。取り込んだ後にGUIで同じホストを開くと、画像はサーバーからの
+転送を待たずにディスクから表示される（接続後は条件付きリクエストで鮮度だけを確かめる）。
+
+    python app/prefetch.py HOST /data/run01 [/data/run02 ...] [-r] [-d 深さ] [-g 'img*.png'] [-j 8]
+
+- 保存済みで大きさが一覧と一致するファイルは取得しない（中断しても再実行すれば続きから取得する）
+- --revalidate を付けると保存済みのファイルも条件付きリクエストで確かめ、変わっていれば取り直す
+- 取り込む量がディスクキャッシュの上限（既定 256MB）を超える場合は --cache-size で広げる
+  （このマシンの設定として保存され、GUIも同じ上限を使う）
+
+リモートのサーバーが既に動いていれば（GUIで接続中など）停止せずにそれを使い、終了時も
+停止しない。取り込み中にGUIが接続してサーバーを起動し直した場合は、転送に失敗した
+ファイルをサーバーが応答するようになってから取り直す
+"""
+
+import argparse
+import posixpath
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from api.cancel import CancelToken, RequestCancelled
+from api.client import HTTPClient, Validator
+from api.crawler import DirectoryCrawler
+from api.scheduler import Priority, RequestScheduler
+from const import IMAGE_EXTENSIONS
+from image.disk_cache import DiskImageCache
+from server.manager import ServerManager
+from state.manager import StateManager
+from util.memory import format_size, parse_size
+
+# サーバーの起動を待つ上限（秒）
+READY_TIMEOUT = 30.0
+# サーバーの再起動などで転送に失敗したときに取り直す回数
+RETRIES = 2
+# 進捗を書き換える間隔（秒、端末でない場合はこの10倍ごとに1行ずつ出力する）
+PROGRESS_INTERVAL = 0.5
+DEFAULT_JOBS = 4
+
+
+def _free_port() -> int:
+    """GUIのトンネル（LOCAL_PORT）と衝突しないよう空いているポートを使う"""
+    with socket.create_server(("127.0.0.1", 0)) as sock:
+        return sock.getsockname()[1]
+
+
+class _Progress:
+    """取得の集計と進捗表示（複数のスレッドから呼ばれる）"""
+
+    def __init__(self, files: int, total_bytes: int, stream=sys.stderr):
+        self.files = files
+        self.total_bytes = total_bytes
+        self.done = 0
+        self.downloaded = 0
+        self.not_modified = 0
+        self.failed = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self._stream = stream
+        self._tty = stream.isatty()
+        self._interval = PROGRESS_INTERVAL if self._tty else PROGRESS_INTERVAL * 10
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, size: int | None):
+        """1ファイル分の結果を加える（size は転送した大きさ、None は変更なし）"""
+        with self._lock:
+            self.done += 1
+            if size is None:
+                self.not_modified += 1
+            else:
+                self.downloaded += 1
+                self.bytes += size
+            self._report()
+
+    def fail(self, remote_path: str, message: str):
+        with self._lock:
+            self.done += 1
+            self.failed += 1
+            self._write(f"失敗: {remote_path}: {message}", final=True)
+
+    def rate(self) -> float:
+        """転送速度（バイト/秒）"""
+        elapsed = time.perf_counter() - self.start
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def _report(self):
+        now = time.perf_counter()
+        if now - self._last < self._interval and self.done < self.files:
+            return
+        self._last = now
+        rate = self.rate()
+        remaining = max(0, self.total_bytes - self.bytes)
+        eta = f"  残り {remaining / rate:.0f}s" if rate > 0 and remaining else ""
+        self._write(
+            f"[{self.done}/{self.files}] {format_size(self.bytes)} / {format_size(self.total_bytes)}"
+            f"  {rate / 1e6:.1f} MB/s{eta}"
+        )
+
+    def _write(self, line: str, final: bool = False):
+        if self._tty:
+            # 進捗の行を書き換える（失敗の行は残す）
+            self._stream.write("\r\033[K" + line + ("\n" if final else ""))
+        else:
+            self._stream.write(line + "\n")
+        self._stream.flush()
+
+    def finish(self):
+        if self._tty:
+            self._stream.write("\n")
+            self._stream.flush()
+
+
+class Prefetcher:
+    """
+    接続済みの HTTPClient からファイルを取得してディスクキャッシュに保存する
+
+    同時に取得する数はスケジューラの PREFETCH 枠（jobs 個）で制限する
+    """
+
+    def __init__(self, client: HTTPClient, cache: DiskImageCache, host: str, jobs: int = DEFAULT_JOBS):
+        self.client = client
+        self.cache = cache
+        self.host = host
+        self.jobs = max(1, jobs)
+        self._stopped = threading.Event()
+        self._tokens: set[CancelToken] = set()
+        self._lock = threading.Lock()
+
+    def crawl(self, roots: list[str], pattern: str | None, max_depth: int | None) -> dict[str, int]:
+        """roots 以下の対象ファイルを列挙し、{パス: 大きさ} を返す"""
+        crawler = DirectoryCrawler(self.client, IMAGE_EXTENSIONS, pattern, max_depth)
+        sizes: dict[str, int] = {}
+        for root in roots:
+            token = self._new_token()
+            try:
+                result = crawler.crawl(root, lambda paths: None, token, sizes)
+            finally:
+                self._release(token)
+            if result.errors:
+                print(f"{root}: {result.errors} 個のディレクトリの一覧を取得できませんでした", file=sys.stderr)
+        return sizes
+
+    def plan(self, sizes: dict[str, int], revalidate: bool) -> tuple[list[tuple[str, Validator | None]], int]:
+        """
+        取得するファイルを選ぶ
+
+        Returns:
+            ([(パス, 保存済みの検証子)], 保存済みのため取得しないファイル数)
+            検証子があるものは条件付きリクエストで確かめる
+        """
+        pending: list[tuple[str, Validator | None]] = []
+        skipped = 0
+        for remote_path, size in sizes.items():
+            cached = self.cache.peek(DiskImageCache.key(self.host, remote_path))
+            if cached is None or cached[0] != size:
+                pending.append((remote_path, None))
+            elif revalidate:
+                pending.append((remote_path, cached[1]))
+            else:
+                skipped += 1
+        return pending, skipped
+
+    def fetch(self, entries: list[tuple[str, Validator | None]], progress: _Progress):
+        """entries を並列に取得して保存する（stop() で打ち切る）"""
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="prefetch") as pool:
+            futures = [pool.submit(self._fetch_one, path, validator, progress) for path, validator in entries]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                # Ctrl+C など: 転送中の接続も切断してから抜ける（切断しないと終わるまで待つことになる）
+                self.stop()
+                raise
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _fetch_one(self, remote_path: str, validator: Validator | None, progress: _Progress):
+        if self._stopped.is_set():
+            return
+        key = DiskImageCache.key(self.host, remote_path)
+        for attempt in range(RETRIES + 1):
+            token = self._new_token()
+            try:
+                result = self.client.fetch_file(remote_path, validator, token, Priority.PREFETCH)
+                break
+            except RequestCancelled:
+                return
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+                if attempt == RETRIES:
+                    progress.fail(remote_path, str(e))
+                    return
+            finally:
+                self._release(token)
+            # GUIの接続でサーバーが起動し直された場合など、応答するようになるまで待ってから取り直す
+            try:
+                _wait_ready(self.client, posixpath.dirname(remote_path))
+            except Exception:
+                pass
+
+        if result.data is None:
+            # 変更なし: 最近使ったものとして残りやすくする
+            self.cache.touch(key)
+            progress.add(None)
+            return
+        self.cache.store(key, result.data, result.validator or Validator(None, None))
+        progress.add(len(result.data))
+
+    def stop(self):
+        """未開始の取得を取りやめ、転送中の接続を切断する"""
+        self._stopped.set()
+        with self._lock:
+            tokens = list(self._tokens)
+        for token in tokens:
+            token.cancel()
+
+    def _new_token(self) -> CancelToken:
+        # トークンは1つの接続しか切断できないため、要求ごとに作る
+        token = CancelToken()
+        with self._lock:
+            self._tokens.add(token)
+        if self._stopped.is_set():
+            token.cancel()
+        return token
+
+    def _release(self, token: CancelToken):
+        with self._lock:
+            self._tokens.discard(token)
+
+
+def _wait_ready(client: HTTPClient, path: str):
+    """サーバーは setup() の後に非同期で起動するため、一覧を取得できるまで待つ"""
+    deadline = time.perf_counter() + READY_TIMEOUT
+    while True:
+        try:
+            client.ls(path)
+            return
+        except Exception:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def run(args) -> int:
+    state = StateManager()
+    if args.cache_size is not None:
+        state.set_disk_cache_budget(args.cache_size)
+    cache = DiskImageCache(StateManager.CACHE_DIR, state.get_disk_cache_budget())
+
+    manager = ServerManager(args.host, args.ssh_config)
+    manager.LOCAL_PORT = args.local_port or _free_port()
+    prefetcher: Prefetcher | None = None
+    try:
+        # GUIで接続中のサーバーを止めないよう、起動中ならそのまま使う
+        home_dir = manager.setup(restart=False)
+        client = HTTPClient(
+            f"http://127.0.0.1:{manager.LOCAL_PORT}",
+            home_dir=home_dir,
+            scheduler=RequestScheduler({Priority.PREFETCH: max(1, args.jobs)}),
+        )
+        roots = [posixpath.normpath(posixpath.join(home_dir, path)) for path in args.paths]
+        _wait_ready(client, roots[0])
+        prefetcher = Prefetcher(client, cache, args.host, args.jobs)
+
+        start = time.perf_counter()
+        sizes = prefetcher.crawl(roots, args.glob, args.depth)
+        pending, skipped = prefetcher.plan(sizes, args.revalidate)
+        selected = sum(sizes.values())
+        cached = len(sizes) - sum(1 for _, validator in pending if validator is None)
+        print(
+            f"{len(sizes)} files ({format_size(selected)}) listed in {time.perf_counter() - start:.1f}s, "
+            f"{cached} already cached",
+            file=sys.stderr,
+        )
+        if selected > cache.max_bytes:
+            print(
+                f"ディスクキャッシュの上限 ({format_size(cache.max_bytes)}) を超えます。"
+                f"--cache-size で上限を広げてください",
+                file=sys.stderr,
+            )
+            return 2
+        if not pending:
+            return 0
+
+        # 条件付きで確かめるものは変更が無ければ転送しないため、転送量の見込みに含めない
+        progress = _Progress(len(pending), sum(sizes[path] for path, validator in pending if validator is None))
+        try:
+            prefetcher.fetch(pending, progress)
+        finally:
+            progress.finish()
+        elapsed = time.perf_counter() - progress.start
+        print(
+            f"{progress.downloaded} downloaded ({format_size(progress.bytes)}, {progress.rate() / 1e6:.1f} MB/s), "
+            f"{progress.not_modified} not modified, {skipped} skipped, {progress.failed} failed "
+            f"in {elapsed:.1f}s",
+            file=sys.stderr,
+        )
+        return 1 if progress.failed else 0
+    except KeyboardInterrupt:
+        if prefetcher is not None:
+            prefetcher.stop()
+        print("\n中断しました（再実行すると続きから取得します）", file=sys.stderr)
+        return 130
+    finally:
+        manager.cleanup(stop_server=False)
+        # 保存済みのファイルは書き終えているが、GUIと同じく終了前に保留中の書き込みを待つ
+        cache.close()
+        state.flush()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("host", help="~/.ssh/config のホスト名")
+    parser.add_argument("paths", nargs="+", help="取り込むディレクトリ（相対パスはリモートのホームから）")
+    parser.add_argument("-r", "--recursive", action="store_true", help="サブディレクトリを深さ無制限でたどる")
+    parser.add_argument("-d", "--depth", type=int, default=0, help="たどるサブディレクトリの深さ（既定 0）")
+    parser.add_argument("-g", "--glob", help="ファイル名（\"/\" を含む場合は起点からの相対パス）のパターン")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS, help="同時に取得する数")
+    parser.add_argument("--revalidate", action="store_true", help="保存済みのファイルも鮮度を確かめる")
+    parser.add_argument("--cache-size", type=parse_size, help="ディスクキャッシュの上限（例: 20G、設定として保存する）")
+    parser.add_argument("--ssh-config", default="~/.ssh/config")
+    parser.add_argument("--local-port", type=int, default=0, help="トンネルのローカルポート（既定は空いているポート）")
+    args = parser.parse_args()
+    if args.recursive:
+        args.depth = None
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
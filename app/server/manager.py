@@ -12,12 +12,13 @@ import select
 import threading
 import socketserver
 from pathlib import Path
-from typing import Callable
-
-import paramiko
+from typing import TYPE_CHECKING, Callable
 
 from util.loader import resource_path
 
+if TYPE_CHECKING:
+    import paramiko
+
 class ServerManager:
     """
     リモートサーバーのデプロイ・起動・トンネル管理
@@ -38,12 +39,14 @@ class ServerManager:
         self._tunnel_server: socketserver.TCPServer | None = None
         self._tunnel_thread: threading.Thread | None = None
 
-    def setup(self, progress_callback: Callable[[str], None] | None = None) -> str:
+    def setup(self, progress_callback: Callable[[str], None] | None = None, restart: bool = True) -> str:
         """
         サーバーのセットアップ（デプロイ・起動・トンネル）
 
         Args:
             progress_callback: 進捗を通知するコールバック関数
+            restart: 偽なら起動中のサーバーを停止せずにそのまま使う（起動していなければ起動する）。
+                同じホストに接続中の別のプロセス（GUIと prefetch.py）の接続を切らないために使う
 
         Returns:
             初期パス（ホームディレクトリ）
@@ -57,17 +60,21 @@ class ServerManager:
         report("SSH接続中...")
         self._connect_ssh()
 
-        # 2. 既存プロセスを停止（デプロイ前に必要）
-        report("既存サーバーを停止中...")
-        self._kill_server()
+        if restart or not self._server_running():
+            # 2. 既存プロセスを停止（デプロイ前に必要）
+            if restart:
+                report("既存サーバーを停止中...")
+                self._kill_server()
 
-        # 3. デプロイ
-        report("サーバーをデプロイ中...")
-        self._deploy_binary()
+            # 3. デプロイ
+            report("サーバーをデプロイ中...")
+            self._deploy_binary()
 
-        # 4. サーバー起動
-        report("サーバーを起動中...")
-        self._start_server()
+            # 4. サーバー起動
+            report("サーバーを起動中...")
+            self._start_server()
+        else:
+            report("起動中のサーバーに接続します")
 
         # 4. ポートフォワーディング
         report("トンネルを確立中...")
@@ -83,6 +90,8 @@ class ServerManager:
 
     def _load_ssh_config(self) -> dict:
         """~/.ssh/configからホスト設定を読み込む"""
+        import paramiko
+
         config = paramiko.SSHConfig()
         with open(self.ssh_config_path) as f:
             config.parse(f)
@@ -95,6 +104,9 @@ class ServerManager:
 
     def _connect_ssh(self):
         """SSH接続を確立"""
+        # paramiko は読み込みが重いため、接続ワーカーのスレッドで初めて使うときに読み込む
+        import paramiko
+
         self.ssh = paramiko.SSHClient()
         self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
@@ -170,6 +182,13 @@ class ServerManager:
         stdout.read()
         stderr.read()
 
+    def _server_running(self) -> bool:
+        """デプロイしたサーバーがリモートで動いているか"""
+        if not self.ssh:
+            raise RuntimeError("SSH connection not established")
+        _, stdout, _ = self.ssh.exec_command(f"pgrep -f {self.REMOTE_DIR}/{self.REMOTE_BINARY}")
+        return bool(stdout.read().strip())
+
     def _start_server(self):
         """リモートでサーバーを起動"""
         if not self.ssh:
@@ -261,15 +280,17 @@ class ServerManager:
         except Exception:
             pass
 
-    def cleanup(self):
-        """リソースのクリーンアップ"""
+    def cleanup(self, stop_server: bool = True):
+        """リソースのクリーンアップ（stop_server が偽ならリモートのサーバーは動かしたままにする）"""
         # トンネルを停止
         if self._tunnel_server:
             self._tunnel_server.shutdown()
+            # 待ち受けソケットを閉じる（再接続時に同じポートで待ち受けられるように）
+            self._tunnel_server.server_close()
             self._tunnel_server = None
 
         # リモートサーバーをkill
-        if self.ssh:
+        if self.ssh and stop_server:
             try:
                 self.ssh.exec_command(f"pkill -f {self.REMOTE_BINARY}")
             except Exception:
@@ -1,89 +1,135 @@
 """
 アプリケーション状態の永続化
 
-~/.siview/state.json に状態を保存
+~/.siview/state.db（SQLite）に状態を保存する。書き込みは StateStore が
+まとめてバックグラウンドで行うため、設定メソッドはファイルI/Oを待たない
 """
 
-import json
 from pathlib import Path
 
+from state.store import StateStore
+
 
 class StateManager:
     """ホストごとの状態を管理"""
 
     STATE_DIR = Path.home() / ".siview"
-    STATE_FILE = STATE_DIR / "state.json"
+    STATE_FILE = STATE_DIR / "state.db"
+    # 以前の形式（初回起動時に取り込む）
+    LEGACY_STATE_FILE = STATE_DIR / "state.json"
+    # 前回表示していた画像のバイト列
+    CACHE_DIR = STATE_DIR / "cache"
 
     # グローバル状態用のキー
     _GLOBAL_KEY = "_global"
     _LAST_HOST_KEY = "last_host"
     _HOST_HISTORY_KEY = "host_history"
+    _MEMORY_BUDGET_KEY = "memory_budget"
+    _DISK_CACHE_BUDGET_KEY = "disk_cache_budget"
+
+    # ホストごとの状態のキー
+    _SESSION_KEY = "session"
+    _LISTING_KEY = "listing"
+    _CURSOR_PREFIX = "cursor:"
 
     def __init__(self, host: str | None = None):
         self.host = host
-        self._state = self._load()
-
-    def _load(self) -> dict:
-        """状態ファイルを読み込む"""
-        if not self.STATE_FILE.exists():
-            return {}
+        self._store = StateStore.shared(self.STATE_FILE, self.LEGACY_STATE_FILE)
 
-        try:
-            with open(self.STATE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-
-    def _save(self):
-        """状態ファイルに保存"""
-        self.STATE_DIR.mkdir(parents=True, exist_ok=True)
-
-        with open(self.STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(self._state, f, indent=2, ensure_ascii=False)
+    def flush(self):
+        """未保存の状態をすぐに書き込む（終了時に呼ぶ）"""
+        self._store.flush()
 
     def get_current_dir(self) -> str | None:
         """保存されたカレントディレクトリを取得"""
-        host_state = self._state.get(self.host, {})
-        return host_state.get("current_dir")
+        if self.host is None:
+            return None
+        return self._store.get(self.host, "current_dir")
 
     def set_current_dir(self, path: str):
         """カレントディレクトリを保存"""
         if self.host is None:
             return
 
-        if self.host not in self._state:
-            self._state[self.host] = {}
+        self._store.set(self.host, "current_dir", path)
 
-        self._state[self.host]["current_dir"] = path
-        self._save()
+    # --- セッション（次回起動時に復元する表示状態） ---
+
+    def get_session(self) -> dict:
+        """画像リスト・表示位置・ズームを取得"""
+        if self.host is None:
+            return {}
+        return self._store.get(self.host, self._SESSION_KEY, {})
+
+    def set_session(self, session: dict):
+        if self.host is None:
+            return
+        self._store.set(self.host, self._SESSION_KEY, session)
+
+    def get_listing(self) -> tuple[str, list[dict]] | None:
+        """最後に取得したディレクトリの一覧を (パス, エントリ) で取得"""
+        if self.host is None:
+            return None
+        listing = self._store.get(self.host, self._LISTING_KEY)
+        if not listing:
+            return None
+        return listing["path"], listing["entries"]
+
+    def set_listing(self, path: str, entries: list[dict]):
+        if self.host is None:
+            return
+        self._store.set(self.host, self._LISTING_KEY, {"path": path, "entries": entries})
+
+    def get_cursors(self) -> dict[str, int]:
+        """ディレクトリごとのカーソル位置を取得"""
+        if self.host is None:
+            return {}
+        return self._store.items(self.host, self._CURSOR_PREFIX)
+
+    def set_cursor(self, path: str, row: int):
+        """ディレクトリのカーソル位置を保存（ディレクトリごとに1件ずつ保存する）"""
+        if self.host is None:
+            return
+        self._store.set(self.host, self._CURSOR_PREFIX + path, row)
 
     # --- グローバル状態（ホスト非依存） ---
 
+    def get_memory_budget(self) -> int | None:
+        """このマシンでのキャッシュ全体のメモリ予算（バイト、未設定なら None で自動）"""
+        return self._store.get(self._GLOBAL_KEY, self._MEMORY_BUDGET_KEY)
+
+    def set_memory_budget(self, budget: int | None):
+        if budget is None:
+            self._store.delete(self._GLOBAL_KEY, self._MEMORY_BUDGET_KEY)
+        else:
+            self._store.set(self._GLOBAL_KEY, self._MEMORY_BUDGET_KEY, budget)
+
+    def get_disk_cache_budget(self) -> int | None:
+        """ディスクキャッシュの上限（バイト、未設定なら None で既定値）"""
+        return self._store.get(self._GLOBAL_KEY, self._DISK_CACHE_BUDGET_KEY)
+
+    def set_disk_cache_budget(self, budget: int | None):
+        if budget is None:
+            self._store.delete(self._GLOBAL_KEY, self._DISK_CACHE_BUDGET_KEY)
+        else:
+            self._store.set(self._GLOBAL_KEY, self._DISK_CACHE_BUDGET_KEY, budget)
+
     def get_last_host(self) -> str | None:
         """最後に使用したホスト名を取得"""
-        global_state = self._state.get(self._GLOBAL_KEY, {})
-        return global_state.get(self._LAST_HOST_KEY)
+        return self._store.get(self._GLOBAL_KEY, self._LAST_HOST_KEY)
 
     def set_last_host(self, host: str):
         """最後に使用したホスト名を保存"""
-        if self._GLOBAL_KEY not in self._state:
-            self._state[self._GLOBAL_KEY] = {}
-
-        self._state[self._GLOBAL_KEY][self._LAST_HOST_KEY] = host
+        self._store.set(self._GLOBAL_KEY, self._LAST_HOST_KEY, host)
         self._add_to_history(host)
-        self._save()
 
     def get_host_history(self) -> list[str]:
         """ホスト名の履歴を取得（最新順）"""
-        global_state = self._state.get(self._GLOBAL_KEY, {})
-        return global_state.get(self._HOST_HISTORY_KEY, [])
+        return self._store.get(self._GLOBAL_KEY, self._HOST_HISTORY_KEY, [])
 
     def _add_to_history(self, host: str):
         """ホスト名を履歴に追加（最新を先頭に、重複は削除）"""
-        if self._GLOBAL_KEY not in self._state:
-            self._state[self._GLOBAL_KEY] = {}
-
-        history = self._state[self._GLOBAL_KEY].get(self._HOST_HISTORY_KEY, [])
+        history = self.get_host_history()
 
         # 既存のものを削除して先頭に追加
         if host in history:
@@ -91,4 +137,4 @@ class StateManager:
         history.insert(0, host)
 
         # 最大10件まで保持
-        self._state[self._GLOBAL_KEY][self._HOST_HISTORY_KEY] = history[:10]
+        self._store.set(self._GLOBAL_KEY, self._HOST_HISTORY_KEY, history[:10])
@@ -0,0 +1,245 @@
+"""
+SQLite による状態の永続化（書き込みの遅延・一括化）
+
+値はメモリ上に保持して読み出しはメモリから行い、変更はまとめて
+バックグラウンドスレッドから1トランザクションで書き込む。UIスレッドは
+書き込みを待たず、ディレクトリ移動のたびにファイル全体を書き直すこともない。
+書き込みはトランザクション単位で反映されるため、途中で終了しても
+前回までの状態が壊れることはない。
+"""
+
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+# 削除を表す値
+_DELETED = None
+
+
+class StateStore:
+    """
+    (スコープ, キー) ごとに JSON 値を保存するキーバリューストア
+
+    スコープはホスト名（ホスト非依存の状態は "_global"）。カーソル位置のように
+    項目の多い状態は "cursor:/path" のようにキーを分けて1件ずつ保存する
+    """
+
+    # 最初の変更から書き込みまで待つ時間（この間の変更は1回の書き込みにまとめる）
+    WRITE_DELAY = 1.0
+
+    SCHEMA_VERSION = 1
+
+    _shared: dict[Path, "StateStore"] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, path: Path, legacy_json: Path | None = None) -> "StateStore":
+        """パスごとに1つのストアを返す（StateManager の各インスタンスで共有する）"""
+        with cls._shared_lock:
+            store = cls._shared.get(path)
+            if store is None:
+                store = cls(path, legacy_json)
+                cls._shared[path] = store
+            return store
+
+    def __init__(self, path: Path, legacy_json: Path | None = None):
+        """
+        Args:
+            legacy_json: 以前の形式の状態ファイル（データベースが空なら取り込む）
+        """
+        self.path = path
+        # 値は JSON 文字列で持つ（呼び出し側が取り出した値を書き換えても影響しない）
+        self._values: dict[tuple[str, str], str] = {}
+        # 未保存の変更（削除は _DELETED）
+        self._dirty: dict[tuple[str, str], str | None] = {}
+        self._cond = threading.Condition()
+        # 書き込みの直列化（ライタースレッドと flush() の間）
+        self._write_lock = threading.Lock()
+        self._closed = False
+
+        self._conn = self._connect()
+        if self._conn is not None:
+            self._load()
+            if not self._values and legacy_json is not None:
+                self._migrate_json(legacy_json)
+
+        self._writer = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._writer.start()
+        # ウィンドウを閉じずに終了した場合も未保存の変更を書き込む
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection | None:
+        """データベースを開く（開けない場合は None を返し、状態はメモリ上だけで保持する）"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            return self._open()
+        except OSError:
+            return None
+        except sqlite3.OperationalError:
+            # ロック中・ディスク不足・権限などは壊れているわけではないため、ファイルには触れない
+            return None
+        except sqlite3.DatabaseError:
+            pass
+        # 壊れたデータベースは退避して作り直す
+        try:
+            self.path.replace(self.path.with_name(self.path.name + ".corrupt"))
+            return self._open()
+        except (OSError, sqlite3.DatabaseError):
+            return None
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"整合性チェックに失敗: {result}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate_schema(conn)
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def _migrate_schema(self, conn: sqlite3.Connection):
+        """スキーマを現在の版に合わせる"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        with conn:
+            conn.execute("BEGIN")
+            if version < 1:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS state ("
+                    " scope TEXT NOT NULL,"
+                    " key TEXT NOT NULL,"
+                    " value TEXT NOT NULL,"
+                    " PRIMARY KEY (scope, key)"
+                    ") WITHOUT ROWID"
+                )
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _load(self):
+        for scope, key, value in self._conn.execute("SELECT scope, key, value FROM state"):
+            self._values[(scope, key)] = value
+
+    def _migrate_json(self, legacy_json: Path):
+        """以前の state.json を取り込み、取り込み済みの印として名前を変える"""
+        try:
+            with open(legacy_json, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+        if not isinstance(state, dict):
+            return
+
+        for scope, values in state.items():
+            if isinstance(values, dict):
+                for key, value in values.items():
+                    self._values[(scope, key)] = json.dumps(value, ensure_ascii=False)
+        self._dirty = dict(self._values)
+        self._write_pending()
+        try:
+            legacy_json.replace(legacy_json.with_name(legacy_json.name + ".migrated"))
+        except OSError:
+            pass
+
+    # --- 読み書き（UIスレッドから呼ぶ） ---
+
+    @staticmethod
+    def _decode(text: str, default: Any) -> Any:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return default
+
+    def get(self, scope: str, key: str, default: Any = None) -> Any:
+        text = self._values.get((scope, key))
+        return default if text is None else self._decode(text, default)
+
+    def items(self, scope: str, prefix: str = "") -> dict[str, Any]:
+        """スコープ内で prefix から始まるキーの値を返す（キーは prefix を除いたもの）"""
+        return {
+            key[len(prefix):]: self._decode(text, None)
+            for (s, key), text in self._values.items()
+            if s == scope and key.startswith(prefix)
+        }
+
+    def set(self, scope: str, key: str, value: Any):
+        """値を設定する（書き込みは後でまとめて行う）"""
+        text = json.dumps(value, ensure_ascii=False)
+        if self._values.get((scope, key)) == text:
+            return
+        self._values[(scope, key)] = text
+        self._mark_dirty((scope, key), text)
+
+    def delete(self, scope: str, key: str):
+        if self._values.pop((scope, key), None) is not None:
+            self._mark_dirty((scope, key), _DELETED)
+
+    def _mark_dirty(self, item: tuple[str, str], value: str | None):
+        with self._cond:
+            self._dirty[item] = value
+            self._cond.notify()
+
+    def flush(self):
+        """未保存の変更をすぐに書き込む"""
+        self._write_pending()
+
+    def close(self):
+        """未保存の変更を書き込んでライタースレッドを止める"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        self._write_pending()
+        with self._write_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- 書き込み（ライタースレッド） ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # 続けて来る変更をまとめるため少し待つ（終了時は close() が書き込む）
+                deadline = time.monotonic() + self.WRITE_DELAY
+                while not self._closed and (remaining := deadline - time.monotonic()) > 0:
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            self._write_pending()
+
+    def _write_pending(self):
+        with self._write_lock:
+            with self._cond:
+                pending, self._dirty = self._dirty, {}
+            if not pending or self._conn is None:
+                return
+            upserts = [(scope, key, value) for (scope, key), value in pending.items() if value is not _DELETED]
+            deletes = [item for item, value in pending.items() if value is _DELETED]
+            try:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(
+                        "INSERT INTO state (scope, key, value) VALUES (?, ?, ?)"
+                        " ON CONFLICT (scope, key) DO UPDATE SET value = excluded.value",
+                        upserts,
+                    )
+                    self._conn.executemany("DELETE FROM state WHERE scope = ? AND key = ?", deletes)
+            except sqlite3.Error:
+                # 書き込めなかった変更は次の機会に再度書き込む（新しい変更を優先する）
+                with self._cond:
+                    for item, value in pending.items():
+                        self._dirty.setdefault(item, value)
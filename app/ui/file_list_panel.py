@@ -1,7 +1,6 @@
 from PySide6.QtWidgets import QFrame, QListView, QVBoxLayout
 from PySide6.QtGui import QFont
 from PySide6.QtCore import Qt, QTimer
-from natsort import natsort_keygen
 
 from const import (
     BG_DEFAULT, BG_FOCUSED, TEXT_DEFAULT, TEXT_SELECTED,
@@ -96,14 +95,21 @@ class FileListPanel(QFrame):
             }}
         """)
 
-    def set_entries(self, entries: list[dict], idx: int = 0):
-        """ファイルエントリを設定して表示を更新"""
+    @staticmethod
+    def _sort_entries(entries: list[dict]):
+        # natsort は起動時には不要なので、最初の一覧を表示するときに読み込む
+        from natsort import natsort_keygen
+
         # ディレクトリ > ファイルの順にソート、名前順にソート
         natkey = natsort_keygen(key=lambda s: s.lower())
         entries.sort(
             key=lambda e: (not e["is_dir"], natkey(e["name"]))
         )
 
+    def set_entries(self, entries: list[dict], idx: int = 0):
+        """ファイルエントリを設定して表示を更新"""
+        self._sort_entries(entries)
+
         self._all_entries = entries
         self._filter_pattern = ""  # フィルタをリセット
         self._apply_filter()
@@ -112,6 +118,59 @@ class FileListPanel(QFrame):
         if self._model.rowCount() > 0:
             self.set_current_row(idx)
 
+    def append_entries(self, entries: list[dict]):
+        """
+        エントリを末尾に追加（検索結果を届いた順に表示する場合。並べ替えはしない）
+
+        メッセージ表示中なら置き換える
+        """
+        if self._model.rowCount() != len(self._entries):
+            self._all_entries = []
+            self._entries = []
+            self._model.set_entries([])
+
+        self._all_entries = self._all_entries + entries
+        if self._filter_pattern:
+            pattern = self._filter_pattern.lower()
+            visible = [e for e in entries if pattern in e["name"].lower()]
+        else:
+            visible = entries
+        first = not self._entries
+        self._entries = self._entries + visible
+        self._model.append_entries(visible)
+
+        if first and self._model.rowCount() > 0:
+            self.set_current_row(0)
+
+    def apply_changes(self, upserts: list[dict], removals: set[str]):
+        """
+        一覧の差分を反映する（追加・更新するエントリと削除する名前）
+
+        フィルタと、カーソル位置のエントリは保持する
+        """
+        if self._model.rowCount() != len(self._entries):
+            # メッセージ表示中
+            return
+        if not upserts and not removals:
+            return
+
+        current = self.current_entry()
+        row = self.current_row()
+        entries = {e["name"]: e for e in self._all_entries}
+        for name in removals:
+            entries.pop(name, None)
+        for entry in upserts:
+            entries[entry["name"]] = entry
+        self._all_entries = list(entries.values())
+        self._sort_entries(self._all_entries)
+        self._apply_filter()
+
+        if self._model.rowCount() == 0:
+            return
+        if current is not None and current["name"] in entries:
+            row = next(i for i, e in enumerate(self._entries) if e["name"] == current["name"])
+        self.set_current_row(row)
+
     def _apply_filter(self):
         """現在のフィルタパターンを適用して表示を更新"""
         if self._filter_pattern:
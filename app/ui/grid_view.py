@@ -0,0 +1,226 @@
+from PySide6.QtWidgets import QFrame, QListView, QVBoxLayout
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QPersistentModelIndex, QSize, Qt, QTimer, Signal
+from PySide6.QtGui import QColor, QPainter, QPixmap
+from typing import Any
+
+from const import BG_DEFAULT, BG_FOCUSED, BORDER_DEFAULT, BORDER_FOCUSED, ITEM_SELECTED_BG, TEXT_DEFAULT
+from image.thumbnail import ThumbnailCache
+
+
+class ThumbnailGridModel(QAbstractListModel):
+    """
+    画像リストのサムネイルを提供するモデル
+
+    ビューは表示中のセルについてだけ data() を呼ぶため、サムネイルの生成要求も
+    画面内のセルの分だけ発生する
+    """
+
+    # サムネイルが無いセルが描画されたとき
+    thumbnail_needed = Signal(str)
+
+    def __init__(self, thumbnails: ThumbnailCache, edge: int, parent=None):
+        super().__init__(parent)
+        self._paths: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._thumbnails = thumbnails
+        self._requested: set[str] = set()
+        self._failed: set[str] = set()
+        self._placeholder = self._create_placeholder(edge, QColor("#333333"))
+        self._error_placeholder = self._create_placeholder(edge, QColor("#553333"))
+
+    @staticmethod
+    def _create_placeholder(edge: int, color: QColor) -> QPixmap:
+        pixmap = QPixmap(edge, edge)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        painter.setBrush(color)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.drawRoundedRect(edge // 8, edge // 8, edge * 3 // 4, edge * 3 // 4, 6, 6)
+        painter.end()
+        return pixmap
+
+    def rowCount(
+        self,
+        parent: QModelIndex | QPersistentModelIndex = QModelIndex(),
+    ) -> int:
+        return len(self._paths)
+
+    def data(
+        self,
+        index: QModelIndex | QPersistentModelIndex,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> Any:
+        if not index.isValid() or not 0 <= index.row() < len(self._paths):
+            return None
+
+        path = self._paths[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return path.rsplit("/", 1)[-1]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return path
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._thumbnails.get(path)
+            if pixmap is not None:
+                return pixmap
+            if path in self._failed:
+                return self._error_placeholder
+            if path not in self._requested:
+                self._requested.add(path)
+                self.thumbnail_needed.emit(path)
+            return self._placeholder
+        return None
+
+    def set_paths(self, paths: list[str]):
+        self.beginResetModel()
+        self._paths = list(paths)
+        self._rows = {path: row for row, path in enumerate(self._paths)}
+        self._requested.clear()
+        self._failed.clear()
+        self.endResetModel()
+
+    def append_paths(self, paths: list[str]):
+        """末尾にパスを追加する（既存のセルとサムネイルの要求状態はそのまま）"""
+        if not paths:
+            return
+        first = len(self._paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        for path in paths:
+            self._rows[path] = len(self._paths)
+            self._paths.append(path)
+        self.endInsertRows()
+
+    def path_at(self, row: int) -> str | None:
+        return self._paths[row] if 0 <= row < len(self._paths) else None
+
+    def set_thumbnail(self, path: str, pixmap: QPixmap):
+        """生成されたサムネイルを登録してセルを再描画する"""
+        self._thumbnails.insert(path, pixmap)
+        self._requested.discard(path)
+        self._notify(path)
+
+    def set_failed(self, path: str):
+        self._requested.discard(path)
+        self._failed.add(path)
+        self._notify(path)
+
+    def invalidate(self, path: str):
+        """ファイルが更新されたセルのサムネイルを作り直させる"""
+        self._thumbnails.remove(path)
+        self._requested.discard(path)
+        self._failed.discard(path)
+        self._notify(path)
+
+    def forget_requests(self, paths: list[str]):
+        """取り消された生成要求を忘れる（再び表示されたときに要求し直す）"""
+        self._requested.difference_update(paths)
+
+    def _notify(self, path: str):
+        row = self._rows.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class GridView(QFrame):
+    """画像リストをサムネイルの一覧で表示するコンタクトシート"""
+
+    # 表示するセルが変わったとき（スクロール・リサイズ後、少し待ってから発行する）
+    visible_changed = Signal()
+    # セルが選択されて全体表示を要求されたとき
+    activated = Signal(int)
+
+    THUMBNAIL_EDGE = 160
+    _VISIBLE_DELAY = 50
+
+    def __init__(self, thumbnails: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self.setObjectName("gridView")
+        self.setFrameShape(QFrame.Shape.Box)
+        self.setLineWidth(4)
+
+        self.model = ThumbnailGridModel(thumbnails, self.THUMBNAIL_EDGE, self)
+
+        self._list_view = QListView()
+        self._list_view.setObjectName("gridListView")
+        self._list_view.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self._list_view.setViewMode(QListView.ViewMode.IconMode)
+        self._list_view.setMovement(QListView.Movement.Static)
+        self._list_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self._list_view.setWrapping(True)
+        # セルの大きさを揃えて、画面内のセルだけを配置・描画させる
+        self._list_view.setUniformItemSizes(True)
+        self._list_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self._list_view.setIconSize(QSize(self.THUMBNAIL_EDGE, self.THUMBNAIL_EDGE))
+        self._list_view.setGridSize(QSize(self.THUMBNAIL_EDGE + 24, self.THUMBNAIL_EDGE + 40))
+        self._list_view.setTextElideMode(Qt.TextElideMode.ElideMiddle)
+        self._list_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self._list_view.setModel(self.model)
+        self._list_view.doubleClicked.connect(lambda index: self.activated.emit(index.row()))
+
+        self._visible_timer = QTimer(self)
+        self._visible_timer.setSingleShot(True)
+        self._visible_timer.setInterval(self._VISIBLE_DELAY)
+        self._visible_timer.timeout.connect(self.visible_changed.emit)
+        self._list_view.verticalScrollBar().valueChanged.connect(lambda _: self._visible_timer.start())
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self._list_view)
+
+        self.set_focused(False)
+
+    def set_focused(self, focused: bool):
+        """フォーカス状態を設定"""
+        bg = BG_FOCUSED if focused else BG_DEFAULT
+        border = BORDER_FOCUSED if focused else BORDER_DEFAULT
+        self.setStyleSheet(f"""
+            #gridView {{ border: 4px solid {border}; background-color: {bg}; }}
+            #gridListView {{ background-color: {bg}; color: {TEXT_DEFAULT}; border: none; }}
+            #gridListView::item:selected {{ background-color: {ITEM_SELECTED_BG}; }}
+        """)
+
+    def set_paths(self, paths: list[str], current: int):
+        self.model.set_paths(paths)
+        self.set_current(current)
+
+    def append_paths(self, paths: list[str]):
+        self.model.append_paths(paths)
+
+    def current_row(self) -> int:
+        return self._list_view.currentIndex().row()
+
+    def set_current(self, row: int):
+        if not 0 <= row < self.model.rowCount():
+            return
+        index = self.model.index(row)
+        self._list_view.setCurrentIndex(index)
+        self._list_view.scrollTo(index)
+
+    def columns(self) -> int:
+        """1行に並ぶセルの数"""
+        grid = self._list_view.gridSize().width()
+        return max(1, self._list_view.viewport().width() // max(1, grid))
+
+    def move_cursor(self, delta: int):
+        """カーソルを移動（行の移動は delta に列数を掛けて指定する）"""
+        count = self.model.rowCount()
+        if count == 0:
+            return
+        row = self.current_row()
+        self.set_current(max(0, min(count - 1, (row if row >= 0 else 0) + delta)))
+
+    def move_row(self, delta: int):
+        self.move_cursor(delta * self.columns())
+
+    def activate_current(self):
+        row = self.current_row()
+        if row >= 0:
+            self.activated.emit(row)
+
+    def viewport_update(self):
+        """表示中のセルを再描画する（サムネイルの生成要求をし直させる）"""
+        self._list_view.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._visible_timer.start()
@@ -0,0 +1,74 @@
+from PySide6.QtWidgets import QWidget
+from PySide6.QtGui import QColor, QPainter, QPolygonF
+from PySide6.QtCore import QPointF, QRectF, Qt
+
+from const import BG_DEFAULT, TEXT_DEFAULT
+from image.pyramid import RegionStats
+
+
+class HistogramPanel(QWidget):
+    """表示領域のヒストグラムと統計値を描画するパネル"""
+
+    _HEIGHT = 120
+    _TEXT_HEIGHT = 22
+    _CHANNEL_COLORS = {
+        "L": [QColor(TEXT_DEFAULT)],
+        "RGB": [QColor(255, 80, 80, 180), QColor(80, 220, 80, 180), QColor(90, 140, 255, 180)],
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFixedHeight(self._HEIGHT)
+        self._stats: RegionStats | None = None
+
+    def set_stats(self, stats: RegionStats | None):
+        self._stats = stats
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(BG_DEFAULT))
+        stats = self._stats
+        if stats is None:
+            painter.end()
+            return
+
+        # 統計値
+        painter.setPen(QColor(TEXT_DEFAULT))
+        level = f"  (1/{2 ** stats.level})" if stats.level > 0 else ""
+        painter.drawText(
+            QRectF(4, 0, self.width() - 8, self._TEXT_HEIGHT),
+            Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft,
+            f"n={stats.count}{level}  min={stats.minimum:g}  max={stats.maximum:g}  "
+            f"mean={stats.mean:.4g}  std={stats.std:.4g}",
+        )
+
+        # ヒストグラム（チャンネルごとに折れ線で重ねる）
+        area = QRectF(4, self._TEXT_HEIGHT, self.width() - 8, self.height() - self._TEXT_HEIGHT - 4)
+        peak = float(stats.hist.max()) if stats.hist.size else 0.0
+        if peak <= 0 or area.width() <= 0:
+            painter.end()
+            return
+
+        bins = stats.hist.shape[1]
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        colors = self._CHANNEL_COLORS.get(stats.channels, self._CHANNEL_COLORS["L"])
+        for channel, counts in enumerate(stats.hist):
+            points = [QPointF(area.left(), area.bottom())]
+            for i, count in enumerate(counts):
+                x = area.left() + area.width() * (i + 0.5) / bins
+                points.append(QPointF(x, area.bottom() - area.height() * count / peak))
+            points.append(QPointF(area.right(), area.bottom()))
+            color = colors[channel % len(colors)]
+            painter.setPen(color)
+            fill = QColor(color)
+            fill.setAlpha(60)
+            painter.setBrush(fill)
+            painter.drawPolygon(QPolygonF(points))
+
+        # 値の範囲
+        lo, hi = stats.hist_range
+        painter.setPen(QColor(TEXT_DEFAULT))
+        painter.drawText(area, Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignLeft, f"{lo:g}")
+        painter.drawText(area, Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight, f"{hi:g}")
+        painter.end()
@@ -1,8 +1,18 @@
+import math
+import os
+import time
+from collections import deque
+
 from PySide6.QtWidgets import QFileDialog, QFrame, QHBoxLayout, QLabel, QMenu, QTextEdit, QVBoxLayout, QSizePolicy
-from PySide6.QtGui import QFont, QFontMetrics, QGuiApplication, QPainter, QPixmap, QImage
-from PySide6.QtCore import QEvent, QPointF, Qt, QTimer
+from PySide6.QtGui import QFont, QFontMetrics, QGuiApplication, QPainter, QPixmap, QPixmapCache, QImage
+from PySide6.QtCore import QEvent, QPointF, QRectF, Qt, QTimer, Signal
 
 from const import BG_DEFAULT, BG_FOCUSED, BORDER_FOCUSED, BORDER_DEFAULT, FONT_SIZE, TEXT_DEFAULT
+from image.buffer import to_pixmap
+from image.pyramid import RegionStats
+from image.scientific import COLORMAPS, ScientificImage, ToneSettings
+from ui.histogram_panel import HistogramPanel
+from util.trace import tracer
 
 
 class ImageViewer(QFrame):
@@ -12,16 +22,67 @@ class ImageViewer(QFrame):
     _ZOOM_MIN = 0.1
     _ZOOM_MAX = 10.0
 
+    # ズーム・パンが落ち着いてから高解像度レンダリングを要求するまでの待ち時間（ms）
+    _DETAIL_DELAY = 150
+
+    # 表示領域の変化が落ち着いてから統計を要求するまでの待ち時間（ms）
+    _STATS_DELAY = 100
+
+    # 表示用に変換済みの QPixmap を保持する容量（KB、既定値。MemoryGovernor が変更する）
+    _PIXMAP_CACHE_KB = 128 * 1024
+
+    # 表示領域（元画像のピクセル座標）と、元画像1pxあたりのデバイスピクセル数
+    detail_requested = Signal(QRectF, float)
+    # 統計・ヒストグラムを計算する表示領域（元画像のピクセル座標）
+    stats_requested = Signal(QRectF)
+    # ズーム倍率とパンオフセットが変わったとき（比較表示で別のビューアと同期する）
+    view_changed = Signal(float, QPointF)
+
     def __init__(self, parent=None):
         super().__init__(parent)
 
         self.setObjectName("imageViewer")
+        QPixmapCache.setCacheLimit(self._PIXMAP_CACHE_KB)
         self._pixmap: QPixmap | None = None
+        self._image: QImage | None = None
         self._is_focused: bool = False
         self._zoom_factor: float = 1.0
         self._pan_offset = QPointF(0, 0)
         self._drag_start: QPointF | None = None
         self._drag_offset_start: QPointF | None = None
+        self._last_view: tuple[float, QPointF] = (self._zoom_factor, QPointF(self._pan_offset))
+        # 保存用に元ファイルのバイト列を保持（再エンコードせずに保存する）
+        self._source_data: bytes | None = None
+        self._source_filename: str = ""
+
+        # ベクター画像の高解像度部分レンダリング
+        self._detail_enabled = False
+        self._detail_pixmap: QPixmap | None = None
+        self._detail_rect: QRectF | None = None
+        self._visible_rect = QRectF()
+        self._display_scale = 1.0
+        self._detail_timer = QTimer(self)
+        self._detail_timer.setSingleShot(True)
+        self._detail_timer.setInterval(self._DETAIL_DELAY)
+        self._detail_timer.timeout.connect(self._request_detail)
+
+        # 高ビット深度画像のトーンマッピング（設定は画像を切り替えても引き継ぐ）
+        self.tone = ToneSettings()
+        self._scientific: ScientificImage | None = None
+        self._tone_region: tuple[tuple, QRectF, QPixmap] | None = None
+
+        # ピクセル値の読み取りと表示領域のヒストグラム
+        self._inspector_enabled = False
+        self._image_origin = QPointF(0, 0)
+        self._image_scale = 1.0
+        self._stats_timer = QTimer(self)
+        self._stats_timer.setSingleShot(True)
+        self._stats_timer.setInterval(self._STATS_DELAY)
+        self._stats_timer.timeout.connect(self._request_stats)
+
+        # パフォーマンス表示（HUD）と描画時間の記録（(終了時刻, 所要時間) 秒）
+        self._hud_enabled = False
+        self._paint_times: deque[tuple[float, float]] = deque(maxlen=240)
 
         # 枠線設定
         self.setFrameShape(QFrame.Shape.Box)
@@ -60,6 +121,40 @@ class ImageViewer(QFrame):
         """)
         self._set_label_font(self.filename_label, FONT_SIZE)
 
+        # ピクセル値表示
+        self.pixel_label = QLabel()
+        self.pixel_label.setObjectName("pixelLabel")
+        self.pixel_label.setStyleSheet(f"""
+            #pixelLabel {{
+                color: {TEXT_DEFAULT};
+                padding: 4px;
+            }}
+        """)
+        self._set_label_font(self.pixel_label, FONT_SIZE)
+        self.pixel_label.hide()
+
+        # ヒストグラム
+        self.histogram_panel = HistogramPanel()
+        self.histogram_panel.hide()
+
+        # HUD（画像の左上に重ねて表示し、マウス操作は画像に通す）
+        self.hud_label = QLabel(self.image_label)
+        self.hud_label.setObjectName("hudLabel")
+        self.hud_label.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.hud_label.setTextFormat(Qt.TextFormat.PlainText)
+        self.hud_label.setStyleSheet(f"""
+            #hudLabel {{
+                color: {TEXT_DEFAULT};
+                background-color: rgba(0, 0, 0, 170);
+                padding: 4px;
+            }}
+        """)
+        hud_font = QFont("monospace")
+        hud_font.setStyleHint(QFont.StyleHint.Monospace)
+        hud_font.setPixelSize(max(10, FONT_SIZE - 2))
+        self.hud_label.setFont(hud_font)
+        self.hud_label.hide()
+
         # テキスト表示
         self.text_view = QTextEdit(readOnly=True)
         self.text_view.setObjectName("textView")
@@ -73,25 +168,208 @@ class ImageViewer(QFrame):
         layout.setSpacing(2)
         layout.addWidget(self.pagination_label)
         layout.addWidget(self.image_label, 8)
+        layout.addWidget(self.pixel_label)
+        layout.addWidget(self.histogram_panel)
         layout.addWidget(self.filename_label)
         layout.addWidget(self.text_view, 1)
 
-    def set_image(self, image: str | QImage | QPixmap):
-        """画像を設定"""
+    def set_image(self, image: str | QImage | QPixmap, keep_view: bool = False):
+        """画像を設定（keep_view が真ならズーム・パンを維持する）"""
         if isinstance(image, str):
             pixmap = QPixmap(image)
         elif isinstance(image, QImage):
-            pixmap = QPixmap.fromImage(image)
+            pixmap = self._display_pixmap(image)
         elif isinstance(image, QPixmap):
             pixmap = image
         else:
             raise TypeError("Unsupported image type")
 
         self._pixmap = pixmap
-        self._zoom_factor = 1.0
-        self._pan_offset = QPointF(0, 0)
+        self._image = image if isinstance(image, QImage) else None
+        self._scientific = image if isinstance(image, ScientificImage) else None
+        self._tone_region = None
+        if not keep_view:
+            self._zoom_factor = 1.0
+            self._pan_offset = QPointF(0, 0)
+        self._detail_pixmap = None
+        self._detail_rect = None
         self._update_image()
 
+    @staticmethod
+    def set_pixmap_cache_budget(max_bytes: int):
+        """表示用に変換済みの QPixmap を保持する容量を変更する"""
+        QPixmapCache.setCacheLimit(max(1, max_bytes // 1024))
+
+    @staticmethod
+    def pixmap_cache_budget() -> int:
+        return QPixmapCache.cacheLimit() * 1024
+
+    @staticmethod
+    def _display_pixmap(image: QImage) -> QPixmap:
+        """表示用の QPixmap を返す。一度表示した画像は変換済みのものを再利用する"""
+        key = f"siview-image-{image.cacheKey()}"
+        pixmap = QPixmapCache.find(key)
+        if pixmap is None:
+            with tracer.span("pixmap", width=image.width(), height=image.height()):
+                pixmap = to_pixmap(image)
+            QPixmapCache.insert(key, pixmap)
+        return pixmap
+
+    def set_detail_enabled(self, enabled: bool):
+        """ズームに応じた高解像度レンダリングの要求を有効化する（ベクター画像用）"""
+        self._detail_enabled = enabled
+        if not enabled:
+            self._detail_timer.stop()
+            self._detail_pixmap = None
+            self._detail_rect = None
+        elif self._pixmap is not None:
+            self._detail_timer.start()
+
+    def set_detail(self, image: QImage, rect: QRectF):
+        """元画像の rect の領域に重ねて描画する高解像度画像を設定"""
+        if self._pixmap is None:
+            return
+        self._detail_pixmap = to_pixmap(image)
+        self._detail_rect = QRectF(rect)
+        self._update_image(schedule_detail=False)
+
+    def image_rect(self) -> QRectF:
+        """表示中画像の全体領域（元画像のピクセル座標）"""
+        if self._pixmap is None:
+            return QRectF()
+        return QRectF(self._pixmap.rect())
+
+    def view(self) -> tuple[float, QPointF]:
+        """ズーム倍率とパンオフセット"""
+        return self._zoom_factor, QPointF(self._pan_offset)
+
+    def set_view(self, zoom: float, pan: QPointF):
+        """ズーム倍率とパンオフセットを設定する（同期元と同じ値なら何もしない）"""
+        if zoom == self._zoom_factor and pan == self._pan_offset:
+            return
+        self._zoom_factor = zoom
+        self._pan_offset = QPointF(pan)
+        self._update_image()
+
+    def current_image(self) -> QImage | None:
+        """表示中の画像（統計の計算用）"""
+        return self._image
+
+    def set_inspector_enabled(self, enabled: bool):
+        """ピクセル値の読み取りとヒストグラム表示を切り替える"""
+        self._inspector_enabled = enabled
+        self.pixel_label.setVisible(enabled)
+        self.histogram_panel.setVisible(enabled)
+        if not enabled:
+            self._stats_timer.stop()
+            self.pixel_label.setText("")
+            self.histogram_panel.set_stats(None)
+        elif self._image is not None:
+            self._stats_timer.start()
+
+    def toggle_inspector(self):
+        self.set_inspector_enabled(not self._inspector_enabled)
+
+    def set_region_stats(self, stats: RegionStats | None):
+        """表示領域の統計値を設定"""
+        if self._inspector_enabled:
+            self.histogram_panel.set_stats(stats)
+
+    def _request_stats(self):
+        if self._inspector_enabled and self._image is not None and not self._visible_rect.isEmpty():
+            self.stats_requested.emit(QRectF(self._visible_rect))
+
+    def _update_pixel_readout(self, pos: QPointF):
+        """マウス位置（ラベル座標）の画素の座標と値を表示する"""
+        if self._image is None or self._image_scale <= 0:
+            self.pixel_label.setText("")
+            return
+        x = math.floor((pos.x() - self._image_origin.x()) / self._image_scale)
+        y = math.floor((pos.y() - self._image_origin.y()) / self._image_scale)
+        if not (0 <= x < self._image.width() and 0 <= y < self._image.height()):
+            self.pixel_label.setText("")
+            return
+
+        if self._scientific is not None:
+            value = self._scientific.raw[y, x]
+            text = ", ".join(f"{v:g}" for v in value.ravel()) if value.ndim else f"{value:g}"
+        else:
+            color = self._image.pixelColor(x, y)
+            text = f"{color.red()}, {color.green()}, {color.blue()}"
+            if self._image.hasAlphaChannel():
+                text += f", {color.alpha()}"
+        self.pixel_label.setText(f"({x}, {y})  {text}")
+
+    def is_scientific(self) -> bool:
+        """表示中の画像がトーンマッピング可能な高ビット深度画像かどうか"""
+        return self._scientific is not None
+
+    def refresh_tone(self):
+        """トーン設定の変更を反映する（表示領域だけを再マッピングする）"""
+        if self._scientific is not None:
+            self._update_image(schedule_detail=False)
+
+    def cycle_colormap(self):
+        """カラーマップを順に切り替える"""
+        names = list(COLORMAPS)
+        index = names.index(self.tone.colormap) if self.tone.colormap in names else -1
+        self.tone.colormap = names[(index + 1) % len(names)]
+        self.refresh_tone()
+
+    def adjust_gamma(self, factor: float):
+        """ガンマ値を倍率で変更する"""
+        self.tone.gamma = max(0.1, min(10.0, self.tone.gamma * factor))
+        self.refresh_tone()
+
+    def tone_description(self) -> str:
+        """現在のトーン設定と表示範囲の説明"""
+        tone = self.tone
+        if tone.mode == "percentile":
+            mode = f"percentile {tone.lo_pct:g}-{tone.hi_pct:g}%"
+        else:
+            mode = tone.mode
+        text = f"contrast: {mode}  gamma={tone.gamma:.2f}  cmap={tone.colormap}"
+        if self._scientific is not None:
+            lo, hi = self._scientific.display_range(tone)
+            text += f"  range=[{lo:g}, {hi:g}]  dtype={self._scientific.raw.dtype}"
+        return text
+
+    def _tone_mapped_region(self, visible: QRectF, device_scale: float) -> tuple[QRectF, QPixmap] | None:
+        """表示領域を現在のトーン設定で再マッピングした画像（縮小表示時は間引く）"""
+        if self._scientific is None or visible.isEmpty():
+            return None
+        if self.tone.key() == ToneSettings().key():
+            # 既定の設定ならプレビュー（画像全体を変換済み）をそのまま使う
+            return None
+
+        x0, y0 = max(0, math.floor(visible.left())), max(0, math.floor(visible.top()))
+        x1 = min(self._pixmap.width(), math.ceil(visible.right()))
+        y1 = min(self._pixmap.height(), math.ceil(visible.bottom()))
+        # 画面1pxに複数の画素が対応する場合は間引いて画面解像度分だけ計算する
+        step = max(1, int(1 / device_scale)) if device_scale > 0 else 1
+        key = self.tone.key() + (x0, y0, x1, y1, step)
+        if self._tone_region is not None and self._tone_region[0] == key:
+            return self._tone_region[1], self._tone_region[2]
+
+        image = self._scientific.render_region(self.tone, x0, y0, x1, y1, step)
+        rect = QRectF(x0, y0, image.width() * step, image.height() * step)
+        pixmap = to_pixmap(image)
+        self._tone_region = (key, rect, pixmap)
+        return rect, pixmap
+
+    def _request_detail(self):
+        """元画像より細かく表示されている場合、表示領域の再レンダリングを要求する"""
+        if not self._detail_enabled or self._pixmap is None:
+            return
+        if self._display_scale <= 1.05 or self._visible_rect.isEmpty():
+            return
+        self.detail_requested.emit(QRectF(self._visible_rect), self._display_scale)
+
+    def set_source(self, data: bytes | None, filename: str):
+        """表示中画像の元ファイルのバイト列を設定"""
+        self._source_data = data
+        self._source_filename = filename
+
     def set_focused(self, focused: bool):
         """フォーカス状態を設定"""
         self._is_focused = focused
@@ -146,23 +424,50 @@ class ImageViewer(QFrame):
         if self._pixmap is None:
             return
 
+        # 元ファイルがあれば、同じ形式では元のバイト列をそのまま書き出す
+        filters = ["PNG (*.png)", "JPEG (*.jpg *.jpeg)"]
+        ext = os.path.splitext(self._source_filename)[1].lower()
+        if self._source_data is not None and ext:
+            filters.insert(0, f"元ファイル (*{ext})")
+
         path, _ = QFileDialog.getSaveFileName(
             self,
             "画像を保存",
-            "",
-            "PNG (*.png);;JPEG (*.jpg *.jpeg)"
+            self._source_filename,
+            ";;".join(filters)
         )
-        if path:
+        if not path:
+            return
+
+        if self._source_data is not None and os.path.splitext(path)[1].lower() == ext:
+            with open(path, "wb") as f:
+                f.write(self._source_data)
+        else:
             self._pixmap.save(path)
 
 
     def clear_image(self):
         """画像をクリア"""
         self._pixmap = None
+        self._image = None
+        self._scientific = None
+        self._tone_region = None
+        self._detail_pixmap = None
+        self._detail_rect = None
+        self._source_data = None
+        self._source_filename = ""
         self._zoom_factor = 1.0
         self._pan_offset = QPointF(0, 0)
         self.image_label.clear()
         self.filename_label.setText("")
+        self.pixel_label.setText("")
+        self.histogram_panel.set_stats(None)
+
+    def show_placeholder(self, filename: str, message: str):
+        """画像を消し、読み込めるまでの間の案内を表示する"""
+        self.clear_image()
+        self.filename_label.setText(filename)
+        self.image_label.setText(message)
 
     def set_filename(self, filename: str):
         """ファイル名を設定"""
@@ -176,10 +481,12 @@ class ImageViewer(QFrame):
         """テキストをクリア"""
         self.text_view.clear()
 
-    def set_pagination(self, current: int, total: int):
-        """ページネーション表示を更新"""
+    def set_pagination(self, current: int, total: int, page: int = 0, page_count: int = 1):
+        """ページネーション表示を更新（複数ページ文書の場合はページ位置も表示）"""
         if total == 0:
             self.pagination_label.setText("")
+        elif page_count > 1:
+            self.pagination_label.setText(f"{current + 1} / {total}  (p. {page + 1} / {page_count})")
         else:
             self.pagination_label.setText(f"{current + 1} / {total}")
 
@@ -216,6 +523,15 @@ class ImageViewer(QFrame):
             self._update_image()
             return True
 
+        # ホバー中の画素の値を表示
+        if t == QEvent.Type.MouseMove and self._inspector_enabled:
+            self._update_pixel_readout(event.position())
+            return False
+
+        if t == QEvent.Type.Leave and self._inspector_enabled:
+            self.pixel_label.setText("")
+            return False
+
         # ドラッグ終了
         if t == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
             self._drag_start = None
@@ -284,7 +600,7 @@ class ImageViewer(QFrame):
         self._pan_offset += QPointF(dx, dy)
         self._update_image()
 
-    def _update_image(self):
+    def _update_image(self, schedule_detail: bool = True):
         """画像をラベルサイズとズーム倍率に合わせて描画する"""
         if self._pixmap is None:
             return
@@ -310,17 +626,73 @@ class ImageViewer(QFrame):
         img_x = (label_w - zoomed_w) / 2 + self._pan_offset.x()
         img_y = (label_h - zoomed_h) / 2 + self._pan_offset.y()
 
-        # 座標変換で元画像を直接描画（キャンバス外は自動クリップ）
-        canvas = QPixmap(label_size)
-        canvas.fill(Qt.GlobalColor.transparent)
-        painter = QPainter(canvas)
-        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
-        painter.translate(img_x, img_y)
-        painter.scale(scale, scale)
-        painter.drawPixmap(0, 0, self._pixmap)
-        painter.end()
-
-        self.image_label.setPixmap(canvas)
+        # 表示領域を元画像の座標系で算出しておく
+        dpr = self.devicePixelRatioF()
+        self._visible_rect = QRectF(
+            -img_x / scale, -img_y / scale, label_w / scale, label_h / scale
+        ).intersected(QRectF(self._pixmap.rect()))
+        self._display_scale = scale * dpr
+        self._image_origin = QPointF(img_x, img_y)
+        self._image_scale = scale
+        tone_region = self._tone_mapped_region(self._visible_rect, self._display_scale)
+
+        paint_start = time.perf_counter()
+        with tracer.span("paint"):
+            # 座標変換で元画像を直接描画（キャンバス外は自動クリップ）
+            # 高DPI環境ではデバイスピクセル単位のキャンバスに描く
+            canvas = QPixmap(label_size * dpr)
+            canvas.setDevicePixelRatio(dpr)
+            canvas.fill(Qt.GlobalColor.transparent)
+            painter = QPainter(canvas)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.translate(img_x, img_y)
+            painter.scale(scale, scale)
+            painter.drawPixmap(0, 0, self._pixmap)
+            if tone_region is not None:
+                # 高ビット深度画像は表示領域だけを現在のトーン設定で描き直す
+                rect, pixmap = tone_region
+                painter.drawPixmap(rect, pixmap, QRectF(pixmap.rect()))
+            if self._detail_pixmap is not None and self._detail_rect is not None:
+                # 高解像度の部分レンダリングを同じ座標系で重ねる
+                painter.drawPixmap(self._detail_rect, self._detail_pixmap, QRectF(self._detail_pixmap.rect()))
+            painter.end()
+
+            self.image_label.setPixmap(canvas)
+        if self._hud_enabled:
+            now = time.perf_counter()
+            self._paint_times.append((now, now - paint_start))
+
+        if schedule_detail and self._detail_enabled:
+            self._detail_timer.start()
+        if self._inspector_enabled:
+            self._stats_timer.start()
+        if (self._zoom_factor, self._pan_offset) != self._last_view:
+            self._last_view = (self._zoom_factor, QPointF(self._pan_offset))
+            self.view_changed.emit(self._zoom_factor, QPointF(self._pan_offset))
+
+    def set_hud_enabled(self, enabled: bool):
+        """パフォーマンス表示の表示・非表示（内容は set_hud_text で設定する）"""
+        self._hud_enabled = enabled
+        self._paint_times.clear()
+        self.hud_label.setVisible(enabled)
+        if enabled:
+            self.hud_label.raise_()
+
+    def hud_enabled(self) -> bool:
+        return self._hud_enabled
+
+    def set_hud_text(self, text: str):
+        self.hud_label.setText(text)
+        self.hud_label.adjustSize()
+        self.hud_label.move(8, 8)
+
+    def paint_stats(self, window: float = 1.0) -> tuple[float | None, float]:
+        """直近の描画時間（ms、未描画なら None）と、直近 window 秒の描画回数から求めた FPS"""
+        if not self._paint_times:
+            return None, 0.0
+        now = time.perf_counter()
+        recent = sum(1 for end, _ in self._paint_times if now - end <= window)
+        return self._paint_times[-1][1] * 1000, recent / window
 
     def _set_label_font(self, label: QLabel, size: int):
         """ラベルにフォントサイズと高さを設定（Windows対応）"""
@@ -335,3 +707,7 @@ class ImageViewer(QFrame):
         """全ラベルのフォントサイズを設定"""
         self._set_label_font(self.pagination_label, size)
         self._set_label_font(self.filename_label, size)
+        self._set_label_font(self.pixel_label, size)
+        hud_font = self.hud_label.font()
+        hud_font.setPixelSize(max(10, size - 2))
+        self.hud_label.setFont(hud_font)
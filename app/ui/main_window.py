@@ -1,24 +1,74 @@
+import fnmatch
+import os
 import posixpath
+import re
+import shlex
+import time
 
 from PySide6.QtGui import QFont, QFontMetrics, QIcon, QImage
-from PySide6.QtWidgets import QApplication, QLabel, QSizePolicy, QSplitter, QVBoxLayout, QWidget
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication, QHBoxLayout, QLabel, QSizePolicy, QSplitter, QVBoxLayout, QWidget
+from PySide6.QtCore import QPointF, QRectF, Qt, QTimer
 
+from api.crawler import CrawlResult, DirectoryCrawler
+from image.buffer import to_pixmap
 from image.cache import ImageCache
-from ui.thread.workers import HTTPFileWorker, HTTPListWorker, ServerConnectWorker, ZoxideAddWorker
+from image.diff import DiffCache, DiffResult
+from image.disk_cache import DiskImageCache
+from image.document import DocumentCache, RegionRenderCache
+from image.loader import ImageLoader
+from image.pyramid import PyramidCache
+from image.scientific import COLORMAPS
+from image.thumbnail import ThumbnailCache, ThumbnailQueue
+from ui.thread.workers import (
+    CompareWorker, CrawlWorker, ExportProgress, ExportWorker, HTTPFileWorker, HTTPListWorker, ImageDecodeWorker,
+    PagePrerenderWorker, RegionRenderWorker, RegionStatsWorker, RevalidateWorker, SearchWorker, ServerConnectWorker,
+    ThumbnailWorker, WatchWorker, ZoxideAddWorker
+)
 from ui.host_dialog import HostDialog
 from const import FONT_SIZE
 
 from server.manager import ServerManager
-from api.client import HTTPClient
+from api.client import HTTPClient, Validator
+from api.scheduler import Priority, RequestScheduler
 from state.manager import StateManager
 from ui.file_list_panel import FileListPanel
 from ui.image_viewer import ImageViewer
 from ui.command_overlay import CommandOverlay
+from ui.grid_view import GridView
+from ui.model.image_list import ImageList
 from util.loader import resource_path
+from util.memory import MemoryGovernor, format_size, parse_size
+from util.trace import tracer
 
 
 class MainWindow(QWidget):
+    # 比較表示のモード（side: 左右に並べる, flicker: 交互に切り替える, diff: 差の絶対値, heat: 差のヒートマップ）
+    _COMPARE_MODES = ["side", "flicker", "diff", "heat"]
+    _FLICKER_INTERVAL = 500  # ms
+
+    # グリッド表示のサムネイルを並列に生成するワーカー数
+    _THUMBNAIL_WORKERS = 3
+
+    # 変更通知をまとめて反映するまでの待ち時間と、監視するディレクトリ数の上限
+    _WATCH_DELAY = 300  # ms
+    _WATCH_MAX_DIRS = 256
+
+    # セッションを保存するまでの待ち時間（表示の切り替えが続く間は待つ）
+    _SESSION_SAVE_DELAY = 2000  # ms
+    # これより大きい一覧は次回起動時の表示用に保存しない（既定値。メモリ予算に合わせて変更する）
+    _SESSION_MAX_LISTING = 10000
+    # 保存する一覧の1件あたりのメモリ使用量の見積もり（JSON 文字列として保持する）
+    _LISTING_ENTRY_BYTES = 160
+
+    # 空きメモリを確認してキャッシュの予算を配分し直す間隔
+    _MEMORY_CHECK_INTERVAL = 5000  # ms
+
+    # パフォーマンス表示（HUD）の更新間隔
+    _HUD_INTERVAL = 250  # ms
+
+    # find -size の単位
+    _SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
     def __init__(self, host: str, parent=None):
         super().__init__(parent)
 
@@ -50,9 +100,60 @@ class MainWindow(QWidget):
         self._font_size = FONT_SIZE
 
         # 画像パスリスト
-        self._image_paths: list[str] = []
+        self._image_paths = ImageList()
         self._current_image_index: int = -1
         self.image_cache = ImageCache()
+        # 複数ページ文書はオープンしたまま保持し、ページ単位でレンダリングする
+        self.documents = DocumentCache()
+        self._page_map: dict[str, int] = {}  # 画像パス毎の表示ページ
+        self._page_counts: dict[str, int] = {}  # 画像パス毎の総ページ数
+        # ベクター画像のズーム時の部分レンダリング結果
+        self.region_cache = RegionRenderCache()
+        # ヒストグラム・統計計算用の多解像度ピラミッド
+        self.pyramids = PyramidCache()
+        # 画像比較の結果
+        self.diff_cache = DiffCache()
+        self._compare_key: tuple[str, int, str, int] | None = None
+        self._compare_mode = "side"
+        self._compare_result: DiffResult | None = None
+        self._flicker_showing_b = False
+        self._flicker_timer = QTimer(self)
+        self._flicker_timer.setInterval(self._FLICKER_INTERVAL)
+        self._flicker_timer.timeout.connect(self._flicker)
+        # サーバーからの変更通知（短時間の変更はまとめて反映する）
+        self._watch_worker: WatchWorker | None = None
+        self._watch_events: list[dict] = []
+        self._watch_timer = QTimer(self)
+        self._watch_timer.setSingleShot(True)
+        self._watch_timer.setInterval(self._WATCH_DELAY)
+        self._watch_timer.timeout.connect(self._apply_watch_events)
+        # 監視対象の更新（画像の追加が続く間は待つ）
+        self._watch_paths_timer = QTimer(self)
+        self._watch_paths_timer.setSingleShot(True)
+        self._watch_paths_timer.setInterval(200)
+        self._watch_paths_timer.timeout.connect(self._update_watch_paths)
+        # 次回起動時に復元する表示状態（画像リストが変わったときも保存する）
+        # prefetch.py で取り込んだ画像もここから表示する（上限は prefetch.py --cache-size で設定）
+        self.disk_cache = DiskImageCache(StateManager.CACHE_DIR, self.state.get_disk_cache_budget())
+        self._listing: tuple[str, list[dict]] | None = None
+        self._session_timer = QTimer(self)
+        self._session_timer.setSingleShot(True)
+        self._session_timer.setInterval(self._SESSION_SAVE_DELAY)
+        self._session_timer.timeout.connect(self._save_session)
+        self._watch_paths_timer.timeout.connect(self._session_timer.start)
+        # パフォーマンス表示（表示中は取得・デコードの時間をトレーサーから読む）
+        self._hud_timer = QTimer(self)
+        self._hud_timer.setInterval(self._HUD_INTERVAL)
+        self._hud_timer.timeout.connect(self._update_hud)
+        self._hud_started_tracer = False
+        # グリッド表示のサムネイル
+        self.thumbnails = ThumbnailCache()
+        self._thumbnail_queue = ThumbnailQueue()
+        # キャッシュ全体のメモリ予算（搭載メモリから決め、空きが減ったら縮める）
+        self._session_max_listing = self._SESSION_MAX_LISTING
+        self.memory = MemoryGovernor(self.state.get_memory_budget())
+        self._memory_timer = QTimer(self)
+        self._memory_timer.setInterval(self._MEMORY_CHECK_INTERVAL)
 
         # UI コンポーネント
         self._current_display_path = ""  # 省略表示用にフルパスを保持
@@ -75,6 +176,29 @@ class MainWindow(QWidget):
 
         self.file_list_panel = FileListPanel()
         self.image_viewer = ImageViewer()
+        self.image_viewer.detail_requested.connect(self._on_detail_requested)
+        self.image_viewer.stats_requested.connect(self._on_stats_requested)
+        self.image_viewer.view_changed.connect(lambda *_: self._session_timer.start())
+
+        # 比較表示で右側に並べるビューア（ズーム・パンを同期する）
+        self.compare_viewer = ImageViewer()
+        self.compare_viewer.hide()
+        self.image_viewer.view_changed.connect(self.compare_viewer.set_view)
+        self.compare_viewer.view_changed.connect(self.image_viewer.set_view)
+        self.viewer_area = QWidget()
+        viewer_layout = QHBoxLayout(self.viewer_area)
+        viewer_layout.setContentsMargins(0, 0, 0, 0)
+        viewer_layout.setSpacing(0)
+        viewer_layout.addWidget(self.image_viewer)
+        viewer_layout.addWidget(self.compare_viewer)
+
+        # 画像リストのサムネイル一覧（コンタクトシート）
+        self.grid_view = GridView(self.thumbnails)
+        self.grid_view.hide()
+        self.grid_view.model.thumbnail_needed.connect(self._request_thumbnail)
+        self.grid_view.visible_changed.connect(self._on_grid_scrolled)
+        self.grid_view.activated.connect(self._open_from_grid)
+        viewer_layout.addWidget(self.grid_view)
 
         # フォーカスモード: "file_list" or "image_viewer"
         self._focus_mode = "file_list"
@@ -85,7 +209,7 @@ class MainWindow(QWidget):
         # Splitter
         self.splitter = QSplitter(Qt.Orientation.Horizontal)
         self.splitter.addWidget(self.file_list_panel)
-        self.splitter.addWidget(self.image_viewer)
+        self.splitter.addWidget(self.viewer_area)
 
         ratio = 0.3
         size = self.width()
@@ -100,7 +224,30 @@ class MainWindow(QWidget):
         # ワーカー参照を保持（GC防止）
         self._connect_worker: ServerConnectWorker | None = None
         self._list_worker: HTTPListWorker | None = None
-        self._file_worker: HTTPFileWorker | None = None
+        # トレース用: 一覧の要求開始時刻と、表示待ちの画像の (パス, 要求開始時刻, 読み込み元)
+        self._list_started = 0
+        self._image_request: tuple[str, int, str] | None = None
+        # addall の走査
+        self._crawl_worker: CrawlWorker | None = None
+        self._crawl_added = 0
+        # find の検索（結果の表示中はファイルリストが検索結果になる）
+        self._search_worker: SearchWorker | None = None
+        self._showing_search = False
+        self._file_worker: HTTPFileWorker | ImageDecodeWorker | None = None
+        self._prerender_worker: PagePrerenderWorker | None = None
+        self._region_worker: RegionRenderWorker | None = None
+        self._stats_worker: RegionStatsWorker | None = None
+        self._compare_worker: CompareWorker | None = None
+        self._thumbnail_workers: list[ThumbnailWorker] = []
+        # キャッシュ済み画像の鮮度確認（r と reload）
+        self._revalidate_worker: RevalidateWorker | None = None
+        self._revalidate_counts = [0, 0, 0]  # (変更なし, 更新あり, 失敗)
+        self._revalidate_report = True
+        # export の書き出し
+        self._export_worker: ExportWorker | None = None
+        self._export_dir = ""
+        self._export_errors: list[str] = []
+        self._pending_stats_rect: QRectF | None = None
 
         # キーシーケンス用（gg等の連続キー入力）
         self._pending_key: str | None = None
@@ -112,7 +259,14 @@ class MainWindow(QWidget):
         self.command_overlay = CommandOverlay(self)
         self.command_overlay.command_accepted.connect(self._on_command_accepted)
 
-        # 非同期でサーバー接続を開始
+        # キャッシュの予算を配分する（ビューアの生成後に行う）
+        self._register_memory_consumers()
+        self.memory.rebalance()
+        self._memory_timer.timeout.connect(self.memory.rebalance)
+        self._memory_timer.start()
+
+        # 前回の表示を復元してから、非同期でサーバー接続を開始
+        self._restore_session()
         self._start_connect()
 
     def _move_splitter(self, delta: int):
@@ -131,15 +285,17 @@ class MainWindow(QWidget):
             self._update_focus_style()
 
     def _focus_right(self):
-        """右のウィジェット(image_viewer)にフォーカス"""
-        if self._focus_mode != "image_viewer":
-            self._focus_mode = "image_viewer"
+        """右のウィジェット(image_viewer またはグリッド)にフォーカス"""
+        mode = "grid" if self.grid_view.isVisible() else "image_viewer"
+        if self._focus_mode != mode:
+            self._focus_mode = mode
             self._update_focus_style()
 
     def _update_focus_style(self):
         """フォーカス状態に応じてスタイルを更新"""
         self.file_list_panel.set_focused(self._focus_mode == "file_list")
         self.image_viewer.set_focused(self._focus_mode == "image_viewer")
+        self.grid_view.set_focused(self._focus_mode == "grid")
 
     def _start_connect(self):
         """サーバーセットアップを非同期で開始"""
@@ -151,12 +307,17 @@ class MainWindow(QWidget):
 
     def _on_progress(self, message: str):
         """進捗メッセージを表示"""
+        if self._listing is not None:
+            # 前回の一覧を表示している間はパスラベルに表示する
+            self._set_path_label(f"{self._listing[0]}  ({message})")
+            return
         self.file_list_panel.set_message(message)
 
     def _on_connected(self, home_dir: str):
         """サーバー接続完了時のコールバック"""
         if self._connect_worker is None:
             raise RuntimeError("Connected but worker is None")
+        restored = self._listing is not None
         self.manager = self._connect_worker.manager
         self.client = self._connect_worker.client
         self._home_dir = home_dir
@@ -168,7 +329,71 @@ class MainWindow(QWidget):
         saved_path = self.state.get_current_dir()
         self.current_path = saved_path if saved_path else home_dir
 
-        self._refresh_file_list()
+        self._start_watch()
+        self._refresh_file_list(keep_entries=restored and self._listing[0] == self.current_path)
+        self._reconcile_session()
+
+    def _restore_session(self):
+        """
+        前回終了時の一覧・画像リスト・表示中の画像を復元する
+
+        サーバーへの接続を待たずに表示し、接続後に _reconcile_session で最新の内容に合わせる
+        """
+        self._path_cursor_map = self.state.get_cursors()
+        listing = self.state.get_listing()
+        if listing is not None and listing[0] == self.state.get_current_dir():
+            path, entries = listing
+            self.current_path = path
+            self._listing = listing
+            self.file_list_panel.set_entries(entries, self._path_cursor_map.get(path, 0))
+            self.setWindowTitle(f"SIView - {self.host}:{path}")
+            self._set_path_label(path)
+
+        session = self.state.get_session()
+        self._image_paths.extend(session.get("images", []))
+        if not self._image_paths:
+            return
+        self._page_map.update(session.get("pages", {}))
+        self._current_image_index = max(0, min(session.get("index", 0), len(self._image_paths) - 1))
+
+        # ディスクキャッシュの読み込みは HTTPFileWorker が行う（UIスレッドで大きなファイルを読まない）。
+        # ディスクに無ければ接続待ちの表示になり、接続後に _reconcile_session から読み込む
+        zoom, x, y = session.get("view", (1.0, 0.0, 0.0))
+        self.image_viewer.set_view(zoom, QPointF(x, y))
+        self._show_current_image(keep_view=True)
+
+    def _reconcile_session(self):
+        """復元した表示中の画像をサーバーの内容と照合する（一覧は読み直しで置き換わる）"""
+        remote_path = self._displayed_image_path()
+        if remote_path is None:
+            return
+        validator = self.image_cache.validator(remote_path)
+        if validator is not None:
+            # 変更があれば新しい内容で表示し直す
+            self._start_revalidate([(remote_path, validator)], Priority.INTERACTIVE, report=False)
+        elif not self.image_cache.contains(remote_path, self._page_map.get(remote_path, 0)):
+            self._show_current_image()
+
+    def _save_session(self):
+        """次回起動時に復元する表示状態を保存する（書き込みは StateStore がまとめて行う）"""
+        self._session_timer.stop()
+        zoom, pan = self.image_viewer.view()
+        self.state.set_session({
+            "images": self._image_paths.paths(),
+            "index": self._current_image_index,
+            "pages": {path: page for path, page in self._page_map.items() if page},
+            "view": [zoom, pan.x(), pan.y()],
+        })
+        if self._listing is not None:
+            self.state.set_listing(*self._listing)
+
+        # 表示中の画像は検証子と一緒にディスクに保存する（接続後に鮮度を確かめられるように）
+        remote_path = self._displayed_image_path()
+        if remote_path is not None:
+            data = self.image_cache.peek_encoded(remote_path)
+            validator = self.image_cache.validator(remote_path)
+            if data is not None and validator is not None:
+                self.disk_cache.put(DiskImageCache.key(self.host, remote_path), data, validator)
 
     def _on_connect_error(self, error_msg: str):
         """サーバー接続エラー時のコールバック"""
@@ -193,6 +418,8 @@ class MainWindow(QWidget):
 
     def _change_host(self, new_host: str):
         """ホストを変更して再接続"""
+        self._save_session()
+
         # 現在の接続をクリーンアップ
         if self.manager is not None:
             self.manager.cleanup()
@@ -202,8 +429,25 @@ class MainWindow(QWidget):
         self._home_dir = None
         self.current_path = None
 
+        # 旧ホストへの転送を中断
+        self._cancel_file_worker()
+        self._cancel_crawl()
+        self._cancel_search()
+        self._cancel_revalidate()
+        self._cancel_export()
+        self._stop_watch()
+        self._end_compare(redisplay=False)
+        self._stop_thumbnail_workers()
+        self._hide_grid()
+
         # 画像リストをクリア
         self._image_paths.clear()
+        self._page_map.clear()
+        self._page_counts.clear()
+        self.documents.clear()
+        self.region_cache.clear()
+        self.diff_cache.clear()
+        self.thumbnails.clear()
         self._current_image_index = -1
         self.image_viewer.clear_image()
         self.image_viewer.set_pagination(0, 0)
@@ -211,23 +455,28 @@ class MainWindow(QWidget):
         # 新しいホストに切り替え
         self.host = new_host
         self.state = StateManager(new_host)
+        self._listing = None
         self.setWindowTitle(f"SIView - {new_host}")
 
         # 再接続
         self.file_list_panel.set_message("サーバーをセットアップ中...")
+        self._restore_session()
         self._start_connect()
 
-    def _refresh_file_list(self):
-        """現在のディレクトリのファイル一覧を非同期で更新"""
+    def _refresh_file_list(self, keep_entries: bool = False):
+        """現在のディレクトリのファイル一覧を非同期で更新（keep_entries が真なら取得中も表示中の一覧を残す）"""
         if self.client is None or self._loading:
             return
 
         self._loading = True
-        self.file_list_panel.set_message("読み込み中...")
+        self._cancel_search()
+        if not keep_entries:
+            self.file_list_panel.set_message("読み込み中...")
 
         if self.current_path is None:
             raise RuntimeError("Current path is None while refreshing file list")
 
+        self._list_started = tracer.now()
         self._list_worker = HTTPListWorker(self.client, self.current_path, self)
         self._list_worker.finished.connect(self._on_list_finished)
         self._list_worker.error.connect(self._on_list_error)
@@ -237,12 +486,20 @@ class MainWindow(QWidget):
         """ファイル一覧取得完了時のコールバック"""
         self._loading = False
         idx = self._path_cursor_map.get(path, 0)
-        self.file_list_panel.set_entries(entries, idx)
+        with tracer.span("list.populate", entries=len(entries)):
+            self.file_list_panel.set_entries(entries, idx)
+        tracer.complete("listing", self._list_started, path=path, entries=len(entries))
         self.setWindowTitle(f"SIView - {self.host}:{path}")
         self._set_path_label(path)
 
         # カレントディレクトリを保存
         self.state.set_current_dir(path)
+        if len(entries) <= self._session_max_listing:
+            self._listing = (path, entries)
+            self._session_timer.start()
+        else:
+            self._listing = None
+        self._watch_paths_timer.start()
 
     def _set_path_label(self, path: str):
         """パスラベルを設定（長すぎる場合は省略）"""
@@ -270,7 +527,11 @@ class MainWindow(QWidget):
 
     def _go_parent(self):
         """親ディレクトリに移動"""
-        if self._loading or self.current_path is None or self.current_path == "/":
+        if self._showing_search:
+            # 検索結果から検索したディレクトリの一覧に戻る
+            self._refresh_file_list()
+            return
+        if self._loading or self.client is None or self.current_path is None or self.current_path == "/":
             return
 
         # 親ディレクトリを計算
@@ -283,7 +544,7 @@ class MainWindow(QWidget):
 
     def _enter_directory(self):
         """選択中のディレクトリに入る"""
-        if self._loading or self.current_path is None:
+        if self._loading or self.client is None or self.current_path is None:
             return
 
         entry = self.file_list_panel.current_entry()
@@ -304,6 +565,7 @@ class MainWindow(QWidget):
         self._font_size = max(6, min(48, self._font_size + delta))
         self.file_list_panel.set_font_size(self._font_size)
         self.image_viewer.set_font_size(self._font_size)
+        self.compare_viewer.set_font_size(self._font_size)
         self._update_path_label_font(self._font_size)
 
     def _update_path_label_font(self, size: int):
@@ -322,8 +584,9 @@ class MainWindow(QWidget):
 
         new_row = self.file_list_panel.move_cursor_wrap(delta)
         # カーソル位置を保存
-        if self.current_path is not None:
+        if self.current_path is not None and not self._showing_search:
             self._path_cursor_map[self.current_path] = new_row
+            self.state.set_cursor(self.current_path, new_row)
 
     def _add_image_to_list(self):
         """選択中のファイルを画像リストに追加"""
@@ -341,26 +604,30 @@ class MainWindow(QWidget):
         else:
             remote_path = f"{self.current_path}/{name}"
 
-        # 既にリストにある場合はその画像を表示
-        if remote_path in self._image_paths:
-            self._current_image_index = self._image_paths.index(remote_path)
-            self._show_current_image()
-            return
-
-        # リストに追加
-        self._image_paths.append(remote_path)
-        self._current_image_index = len(self._image_paths) - 1
+        # リストに追加（既にリストにある場合はその画像を表示）
+        added = remote_path not in self._image_paths
+        self._current_image_index = self._image_paths.append(remote_path)
         self._show_current_image()
+        if added and self.grid_view.isVisible():
+            self.grid_view.append_paths([remote_path])
+        if added:
+            self._watch_paths_timer.start()
 
     def _remove_current_image(self):
         """現在表示中の画像をリストから削除"""
         if not self._image_paths or self._current_image_index < 0:
             return
 
-        self._image_paths.pop(self._current_image_index)
+        removed = self._image_paths.pop(self._current_image_index)
+        self.documents.remove(removed)
+        self.region_cache.remove(removed)
+        self.diff_cache.remove(removed)
+        self._watch_paths_timer.start()
 
         if not self._image_paths:
             # リストが空になった
+            self._cancel_file_worker()
+            self._end_compare(redisplay=False)
             self._current_image_index = -1
             self.image_viewer.clear_image()
             self.image_viewer.set_pagination(0, 0)
@@ -372,16 +639,30 @@ class MainWindow(QWidget):
 
         self._show_current_image()
 
-    def _show_current_image(self):
+    def _show_current_image(self, keep_view: bool = False):
         """現在のインデックスの画像を表示"""
         if not self._image_paths or self._current_image_index < 0:
             return
 
         remote_path = self._image_paths[self._current_image_index]
         filename = remote_path.split("/")[-1]
-        self._load_image(remote_path)
+        self._load_image(remote_path, self._page_map.get(remote_path, 0), keep_view)
         self.image_viewer.set_filename(filename)
-        self.image_viewer.set_pagination(self._current_image_index, len(self._image_paths))
+        self._update_pagination()
+        self._watch_paths_timer.start()
+
+    def _update_pagination(self):
+        """画像リスト内の位置と文書内のページ位置を表示"""
+        remote_path = self._displayed_image_path()
+        if remote_path is None:
+            self.image_viewer.set_pagination(0, 0)
+            return
+        self.image_viewer.set_pagination(
+            self._current_image_index,
+            len(self._image_paths),
+            self._page_map.get(remote_path, 0),
+            self._page_counts.get(remote_path, 1),
+        )
 
     def _next_image(self):
         """次の画像を表示"""
@@ -397,50 +678,487 @@ class MainWindow(QWidget):
         self._current_image_index = (self._current_image_index - 1) % len(self._image_paths)
         self._show_current_image()
 
-    def _load_image(self, remote_path: str):
-        """指定パスの画像を非同期で読み込み"""
-        if self.client is None:
+    def _move_page(self, delta: int):
+        """複数ページ文書の表示ページを移動"""
+        remote_path = self._displayed_image_path()
+        if remote_path is None:
+            return
+
+        page_count = self._page_counts.get(remote_path, 1)
+        page = self._page_map.get(remote_path, 0) + delta
+        if page_count <= 1 or not 0 <= page < page_count:
             return
 
-        # cacheがあればcacheを使う
-        cached_image = self.image_cache.get(remote_path)
+        self._page_map[remote_path] = page
+        self._load_image(remote_path, page)
+        self._update_pagination()
+
+    def _load_image(self, remote_path: str, page: int = 0, keep_view: bool = False):
+        """指定パスの画像を非同期で読み込み（keep_view が真なら表示位置と倍率を保つ）"""
+        # 表示対象が変わったので、古い転送は中断する
+        self._cancel_file_worker()
+        self._end_compare(redisplay=False)
+        filename = posixpath.basename(remote_path)
+        started = tracer.now()
+
+        # デコード済みキャッシュがあればそのまま表示
+        cached_image = self.image_cache.get(remote_path, page)
         if cached_image is not None:
-            self.image_viewer.set_image(cached_image)
+            self._image_request = (remote_path, started, "decoded")
+            self._display_image(cached_image, self.image_cache.peek_encoded(remote_path), filename, keep_view)
+            self._trace_image_shown(remote_path)
+            self._prerender_neighbor_pages(remote_path, page)
             return
 
-        self._file_worker = HTTPFileWorker(self.client, remote_path, self)
-        self._file_worker.finished.connect(lambda img, fn=remote_path: self._on_file_loaded(img, fn, remote_path))
-        self._file_worker.error.connect(self._on_file_error)
+        # 元バイト列がキャッシュにあるか文書がオープン済みなら、バックグラウンドでデコードのみ行う
+        data = self.image_cache.get_encoded(remote_path)
+        if data is not None or self.documents.is_open(remote_path):
+            self._image_request = (remote_path, started, "encoded")
+            self._file_worker = ImageDecodeWorker(remote_path, data, filename, self.documents, page, self)
+            self._file_worker.finished.connect(
+                lambda img, fn, pg, cnt, p=remote_path, d=data, k=keep_view:
+                    self._on_file_loaded(img, d, fn, pg, cnt, p, k)
+            )
+        else:
+            # ディスクキャッシュ（前回の表示や prefetch.py で保存したもの）を探し、無ければサーバーから取得する。
+            # 接続前でディスクにも無ければ、接続後に _reconcile_session から読み込む
+            self._image_request = (remote_path, started, "network")
+            self._file_worker = HTTPFileWorker(
+                self.client, remote_path, self.documents, page, self,
+                disk_cache=self.disk_cache, disk_key=DiskImageCache.key(self.host, remote_path),
+            )
+            self._file_worker.finished.connect(
+                lambda img, d, fn, pg, cnt, v, disk, p=remote_path, k=keep_view:
+                    self._on_file_loaded(img, d, fn, pg, cnt, p, k, v, disk)
+            )
+            self._file_worker.offline.connect(lambda p=remote_path: self._on_file_offline(p))
+        self._file_worker.error.connect(lambda msg, p=remote_path: self._on_file_error(msg, p))
         self._file_worker.start()
 
-    def _on_file_loaded(self, image: QImage, filename: str, remote_path: str):
-        """ファイル読み込み完了時のコールバック"""
-        self.image_viewer.set_image(image)
-        # キャッシュに保存
-        self.image_cache.insert(remote_path, image)
+    def _cancel_file_worker(self):
+        """実行中の画像取得ワーカーがあればキャンセルする"""
+        if self._file_worker is not None and self._file_worker.isRunning():
+            self._file_worker.cancel()
+        self._file_worker = None
+        if self._prerender_worker is not None and self._prerender_worker.isRunning():
+            self._prerender_worker.cancel()
+        self._prerender_worker = None
+
+    def _displayed_image_path(self) -> str | None:
+        """現在表示対象の画像パスを返す"""
+        if not self._image_paths or self._current_image_index < 0:
+            return None
+        return self._image_paths[self._current_image_index]
+
+    def _on_file_loaded(
+        self,
+        image: QImage,
+        data: bytes | None,
+        filename: str,
+        page: int,
+        page_count: int,
+        remote_path: str,
+        keep_view: bool = False,
+        validator: Validator | None = None,
+        from_disk: bool = False,
+    ):
+        """ファイル読み込み完了時のコールバック（from_disk はディスクキャッシュから読んだ場合）"""
+        # キャッシュに保存（元バイト列とデコード済み画像の両方）
+        if data is not None:
+            self.image_cache.insert_encoded(remote_path, data, validator)
+        self.image_cache.insert(remote_path, image, page)
+        if validator is not None:
+            # 元バイト列が大きすぎてキャッシュされない場合もデコード済み画像の検証子として残す
+            self.image_cache.set_validator(remote_path, validator)
+        self._page_counts[remote_path] = page_count
+        if from_disk and validator is not None and self.client is not None and self._revalidate_worker is None:
+            # 接続中なら変更が無いかだけ確かめる（接続前に表示したものは _reconcile_session で確かめる）
+            self._start_revalidate([(remote_path, validator)], Priority.INTERACTIVE, report=False)
+
+        # キャンセル直前に完了した古い結果は表示しない
+        if remote_path != self._displayed_image_path() or page != self._page_map.get(remote_path, 0):
+            return
+        if from_disk and self._image_request is not None and self._image_request[0] == remote_path:
+            self._image_request = (remote_path, self._image_request[1], "disk")
+        self._display_image(image, data, filename, keep_view)
+        self._trace_image_shown(remote_path)
+        self._update_pagination()
+        self._prerender_neighbor_pages(remote_path, page)
+
+    def _trace_image_shown(self, remote_path: str):
+        """要求から表示までを1つの区間として記録する"""
+        request, self._image_request = self._image_request, None
+        if request is not None and request[0] == remote_path:
+            tracer.complete("image", request[1], path=remote_path, source=request[2])
+
+    def _display_image(self, image: QImage, data: bytes | None, filename: str, keep_view: bool = False):
+        """画像をビューアに表示する（ベクター形式はズームに応じて再レンダリングする）"""
+        self._cancel_region_worker()
+        self.image_viewer.set_image(image, keep_view=keep_view)
+        self.image_viewer.set_source(data, filename)
+        self.image_viewer.set_detail_enabled(DocumentCache.supports_vector(filename))
+
+    def _on_detail_requested(self, rect: QRectF, scale: float):
+        """ベクター画像の表示領域を現在の倍率で再レンダリングする"""
+        remote_path = self._displayed_image_path()
+        if remote_path is None:
+            return
+        page = self._page_map.get(remote_path, 0)
+        bucket = RegionRenderCache.bucket(scale)
 
-    def _on_file_error(self, error_msg: str):
+        cached = self.region_cache.get(remote_path, page, bucket, rect)
+        if cached is not None:
+            self.image_viewer.set_detail(cached[1], cached[0])
+            return
+
+        # パンしても再レンダリングせずに済むよう、表示領域の周囲も含めて描画する
+        margin_x = rect.width() * 0.25
+        margin_y = rect.height() * 0.25
+        render_rect = rect.adjusted(-margin_x, -margin_y, margin_x, margin_y).intersected(
+            self.image_viewer.image_rect()
+        )
+
+        self._cancel_region_worker()
+        self._region_worker = RegionRenderWorker(
+            remote_path,
+            self.image_cache.peek_encoded(remote_path),
+            posixpath.basename(remote_path),
+            page,
+            render_rect,
+            bucket,
+            self.documents,
+            self,
+        )
+        self._region_worker.rendered.connect(
+            lambda img, p=remote_path, pg=page, b=bucket, r=render_rect: self._on_region_rendered(img, p, pg, b, r)
+        )
+        self._region_worker.start()
+
+    def _on_region_rendered(self, image: QImage, remote_path: str, page: int, bucket: float, rect: QRectF):
+        """部分レンダリング完了時のコールバック"""
+        self.region_cache.insert(remote_path, page, bucket, rect, image)
+        if remote_path != self._displayed_image_path() or page != self._page_map.get(remote_path, 0):
+            return
+        self.image_viewer.set_detail(image, rect)
+
+    def _cancel_region_worker(self):
+        if self._region_worker is not None and self._region_worker.isRunning():
+            self._region_worker.cancel()
+        self._region_worker = None
+
+    def _on_stats_requested(self, rect: QRectF):
+        """表示領域の統計を計算する（計算中なら完了後に最新の領域で計算し直す）"""
+        if self._stats_worker is not None and self._stats_worker.isRunning():
+            self._pending_stats_rect = rect
+            return
+        image = self.image_viewer.current_image()
+        if image is None:
+            return
+
+        self._pending_stats_rect = None
+        self._stats_worker = RegionStatsWorker(image, rect, self.pyramids, self)
+        self._stats_worker.finished.connect(
+            lambda stats, img=image: self._on_stats_computed(stats, img)
+        )
+        self._stats_worker.error.connect(self._on_stats_error)
+        self._stats_worker.start()
+
+    def _on_stats_computed(self, stats, image: QImage):
+        """統計計算完了時のコールバック"""
+        # シグナル処理時点ではスレッドがまだ終了していない場合があるため参照を先に外す
+        self._stats_worker = None
+        if image is self.image_viewer.current_image():
+            self.image_viewer.set_region_stats(stats)
+        if self._pending_stats_rect is not None:
+            rect, self._pending_stats_rect = self._pending_stats_rect, None
+            self._on_stats_requested(rect)
+
+    def _on_stats_error(self, error_msg: str):
+        """統計計算エラー時のコールバック（待っている領域があれば計算し直す）"""
+        self._stats_worker = None
+        self.image_viewer.show_temp_message(f"統計エラー: {error_msg}")
+        if self._pending_stats_rect is not None:
+            rect, self._pending_stats_rect = self._pending_stats_rect, None
+            self._on_stats_requested(rect)
+
+    def _prerender_neighbor_pages(self, remote_path: str, page: int):
+        """表示中ページの前後をバックグラウンドでレンダリングしておく"""
+        page_count = self._page_counts.get(remote_path, 1)
+        pages = [
+            p for p in (page + 1, page - 1)
+            if 0 <= p < page_count and not self.image_cache.has_decoded(remote_path, p)
+        ]
+        if not pages or not self.documents.is_open(remote_path):
+            return
+
+        filename = posixpath.basename(remote_path)
+        self._prerender_worker = PagePrerenderWorker(remote_path, filename, pages, self.documents, self)
+        self._prerender_worker.rendered.connect(
+            lambda p, pg, img: self.image_cache.insert(p, img, pg)
+        )
+        self._prerender_worker.start()
+
+    def _on_file_offline(self, remote_path: str):
+        """接続前でキャッシュにも無い画像に移動した場合（前の画像を残さず、接続後に読み込む）"""
+        if remote_path != self._displayed_image_path():
+            return
+        self.image_viewer.show_placeholder(posixpath.basename(remote_path), "接続待ち…")
+        self._update_pagination()
+
+    def _on_file_error(self, error_msg: str, remote_path: str):
         """ファイル読み込みエラー時のコールバック"""
+        if remote_path != self._displayed_image_path():
+            return
         self.image_viewer.set_text(f"画像読み込みエラー: {error_msg}")
 
     def _reload_current_image(self):
-        """現在表示中の画像をキャッシュから削除して再取得する"""
+        """
+        現在表示中の画像を最新の内容にする
+
+        取得時の検証子があれば条件付きリクエストで更新の有無だけを確かめ、
+        変更が無ければキャッシュをそのまま使う（本文は転送されない）
+        """
         if not self._image_paths or self._current_image_index < 0 or self.client is None:
             return
 
         remote_path = self._image_paths[self._current_image_index]
+        validator = self.image_cache.validator(remote_path)
+        if validator is not None:
+            self._start_revalidate([(remote_path, validator)], Priority.INTERACTIVE)
+            return
 
         # キャッシュから削除
-        self.image_cache.remove(remote_path)
+        self._invalidate_image(remote_path)
 
         # 画像をクリアして背景のみ表示（フェッチ中は画像が消える）
         self.image_viewer.clear_image()
         filename = remote_path.split("/")[-1]
         self.image_viewer.set_filename(filename)
-        self.image_viewer.set_pagination(self._current_image_index, len(self._image_paths))
+        self._update_pagination()
 
         # 再フェッチ
-        self._load_image(remote_path)
+        self._load_image(remote_path, self._page_map.get(remote_path, 0))
+
+    def _exec_reload(self, args: str):
+        """
+        reloadコマンド: キャッシュ済みの画像が更新されていないかを確かめる
+
+        reload      表示中の画像（r と同じ）
+        reload all  画像リストのキャッシュ済みの画像すべて
+        """
+        if self.client is None:
+            self.image_viewer.set_text("サーバー未接続")
+            return
+        if not args:
+            self._reload_current_image()
+            return
+        if args != "all":
+            self.image_viewer.set_text("usage: reload [all]")
+            return
+
+        entries: list[tuple[str, Validator]] = []
+        for remote_path in self._image_paths:
+            validator = self.image_cache.validator(remote_path)
+            if validator is not None:
+                entries.append((remote_path, validator))
+        if not entries:
+            self.image_viewer.show_temp_message("reload: キャッシュ済みの画像がありません")
+            return
+        # 表示中の画像の取得を妨げないよう先読みと同じ優先度で確認する
+        self._start_revalidate(entries, Priority.PREFETCH)
+        self.image_viewer.set_text(f"reload: {len(entries)} 件を確認中...")
+
+    def _start_revalidate(self, entries: list[tuple[str, Validator]], priority: Priority, report: bool = True):
+        """鮮度確認を開始する（report が偽なら結果を表示しない）"""
+        self._cancel_revalidate()
+        self._revalidate_counts = [0, 0, 0]
+        self._revalidate_report = report
+        self._revalidate_worker = RevalidateWorker(self.client, entries, priority, self)
+        self._revalidate_worker.checked.connect(self._on_revalidate_checked)
+        self._revalidate_worker.failed.connect(self._on_revalidate_failed)
+        self._revalidate_worker.finished.connect(self._on_revalidate_finished)
+        self._revalidate_worker.start()
+
+    def _on_revalidate_checked(self, remote_path: str, data: bytes | None, validator: Validator | None):
+        """鮮度確認の結果をキャッシュに反映する"""
+        if self.sender() is not self._revalidate_worker:
+            return
+        if data is None:
+            self._revalidate_counts[0] += 1
+            self.image_cache.set_validator(remote_path, validator)
+            return
+
+        self._revalidate_counts[1] += 1
+        # ディスクに保存していたものは新しい内容で置き換える（次回もディスクから表示できるように）
+        key = DiskImageCache.key(self.host, remote_path)
+        on_disk = validator is not None and self.disk_cache.peek(key) is not None
+        # 派生データも含めて破棄し、取得済みの新しい内容から表示し直す（再ダウンロードはしない）
+        self._invalidate_image(remote_path)
+        self.image_cache.insert_encoded(remote_path, data, validator)
+        if on_disk:
+            self.disk_cache.put(key, data, validator)
+        if self._compare_key is not None:
+            path_a, _, path_b, _ = self._compare_key
+            if remote_path in (path_a, path_b):
+                self._start_compare(path_a, path_b, self._compare_mode)
+        elif remote_path == self._displayed_image_path():
+            self._load_image(remote_path, self._page_map.get(remote_path, 0), keep_view=True)
+
+    def _on_revalidate_failed(self, remote_path: str, error_msg: str):
+        if self.sender() is not self._revalidate_worker:
+            return
+        self._revalidate_counts[2] += 1
+        if remote_path == self._displayed_image_path():
+            self.image_viewer.set_text(f"再読み込みエラー: {error_msg}")
+
+    def _on_revalidate_finished(self):
+        if self.sender() is not self._revalidate_worker:
+            return
+        worker, self._revalidate_worker = self._revalidate_worker, None
+        if not self._revalidate_report:
+            return
+        unchanged, changed, failed = self._revalidate_counts
+        if worker.priority == Priority.INTERACTIVE:
+            # r による表示中の画像の確認（更新があれば表示し直している）
+            if unchanged:
+                self.image_viewer.show_temp_message("変更なし")
+            return
+        message = f"reload: {changed} 件更新, {unchanged} 件変更なし"
+        if failed:
+            message += f", {failed} 件失敗"
+        self.image_viewer.set_text(message)
+
+    def _cancel_revalidate(self):
+        """実行中の鮮度確認を中断する"""
+        if self._revalidate_worker is not None:
+            self._revalidate_worker.cancel()
+            self._revalidate_worker = None
+
+    def _invalidate_image(self, remote_path: str):
+        """画像のキャッシュ（元バイト列・デコード済み画像・派生データ）を破棄する"""
+        self.image_cache.remove(remote_path)
+        self.documents.remove(remote_path)
+        self.region_cache.remove(remote_path)
+        self.diff_cache.remove(remote_path)
+        self.grid_view.model.invalidate(remote_path)
+        # 再表示で古い内容をディスクから読まないよう、ディスクキャッシュからも削除する
+        self.disk_cache.remove(DiskImageCache.key(self.host, remote_path))
+
+    def _start_watch(self):
+        """変更通知の受信を開始する"""
+        if self.client is None:
+            return
+        self._stop_watch()
+        self._watch_worker = WatchWorker(self.client, self)
+        self._watch_worker.changed.connect(self._on_watch_changed)
+        self._watch_worker.ready.connect(self._on_watch_ready)
+        self._watch_worker.start()
+
+    def _stop_watch(self):
+        self._watch_paths_timer.stop()
+        self._watch_timer.stop()
+        self._watch_events.clear()
+        if self._watch_worker is not None:
+            self._watch_worker.stop()
+            self._watch_worker = None
+
+    def _update_watch_paths(self):
+        """カレントディレクトリ・表示中の画像・リストの画像のディレクトリを監視対象にする"""
+        if self._watch_worker is None:
+            return
+        dirs: dict[str, None] = {}
+        if self.current_path is not None:
+            dirs[self.current_path] = None
+        displayed = self._displayed_image_path()
+        if displayed is not None:
+            dirs[posixpath.dirname(displayed)] = None
+        for remote_path in self._image_paths:
+            if len(dirs) >= self._WATCH_MAX_DIRS:
+                break
+            dirs[posixpath.dirname(remote_path)] = None
+        self._watch_worker.set_paths(list(dirs))
+
+    def _on_watch_ready(self, lost: bool):
+        """監視の開始時（再接続で変更を取りこぼした可能性があれば読み直す）"""
+        if self.sender() is not self._watch_worker or not lost:
+            return
+        self._watch_events.append({"op": "overflow"})
+        self._watch_timer.start()
+
+    def _on_watch_changed(self, events: list[dict]):
+        if self.sender() is not self._watch_worker:
+            return
+        self._watch_events.extend(events)
+        # 書き込みが続いても一定間隔で反映されるよう、待機中はタイマーを延長しない
+        if not self._watch_timer.isActive():
+            self._watch_timer.start()
+
+    def _apply_watch_events(self):
+        """まとめた変更通知をファイル一覧と画像のキャッシュに反映する"""
+        events, self._watch_events = self._watch_events, []
+        if not events:
+            return
+
+        changed: set[str] = set()
+        removed: set[str] = set()
+        if any(e["op"] == "overflow" for e in events):
+            # 取りこぼしがあるので一覧を読み直し、リストの画像は鮮度を確かめる。検証子のある画像は
+            # 条件付きリクエストで変更があったものだけを取り直し（_on_revalidate_checked が表示し直す）、
+            # 変更が無ければ 304 の往復1回で済ませる。検証子の無いものだけを取得し直す
+            if not self._loading and not self._showing_search:
+                self._refresh_file_list()
+            displayed = self._displayed_image_path()
+            entries: list[tuple[str, Validator]] = []
+            for remote_path in self._image_paths:
+                validator = self.image_cache.validator(remote_path)
+                if validator is None:
+                    self._invalidate_image(remote_path)
+                    changed.add(remote_path)
+                elif remote_path == displayed:
+                    entries.insert(0, (remote_path, validator))
+                else:
+                    entries.append((remote_path, validator))
+            if entries and self.client is not None:
+                self._start_revalidate(entries, Priority.PREFETCH, report=False)
+        else:
+            upserts: dict[str, dict] = {}
+            names_removed: set[str] = set()
+            for event in events:
+                remote_path = posixpath.join(event["dir"], event["name"])
+                if event["dir"] == self.current_path:
+                    if event["op"] == "remove":
+                        upserts.pop(event["name"], None)
+                        names_removed.add(event["name"])
+                    else:
+                        names_removed.discard(event["name"])
+                        upserts[event["name"]] = {
+                            "name": event["name"], "is_dir": event["is_dir"], "size": event["size"],
+                        }
+                if event["op"] == "create" or remote_path not in self._image_paths:
+                    # 作成直後は書き込み中なので、閉じたとき（write）に取得する
+                    continue
+                if event["op"] == "remove":
+                    removed.add(remote_path)
+                    changed.discard(remote_path)
+                else:
+                    changed.add(remote_path)
+                    removed.discard(remote_path)
+
+            if not self._loading and not self._showing_search:
+                self.file_list_panel.apply_changes(list(upserts.values()), names_removed)
+            for remote_path in changed | removed:
+                self._invalidate_image(remote_path)
+
+        displayed = self._displayed_image_path()
+        if self._compare_key is not None:
+            path_a, _, path_b, _ = self._compare_key
+            if path_a in changed or path_b in changed:
+                self._start_compare(path_a, path_b, self._compare_mode)
+        elif displayed in changed:
+            # 表示位置を保ったまま新しい内容に差し替える
+            self._load_image(displayed, self._page_map.get(displayed, 0), keep_view=True)
+        elif displayed in removed:
+            self.image_viewer.show_temp_message(f"削除されました: {posixpath.basename(displayed)}")
 
     def _init_keymap(self):
         self._pending_key = None
@@ -457,9 +1175,13 @@ class MainWindow(QWidget):
 
             ("Ctrl", Qt.Key.Key_N,): self._next_image,
             ("Ctrl", Qt.Key.Key_P,): self._prev_image,
+            (Qt.Key.Key_N,): lambda: self._move_page(1),
+            (Qt.Key.Key_P,): lambda: self._move_page(-1),
             (Qt.Key.Key_R,): self._reload_current_image,
             (Qt.Key.Key_S,): self.image_viewer.zoom_to_fit_width,
             (Qt.Key.Key_A,): self.image_viewer.zoom_to_fit_height,
+            (Qt.Key.Key_T,): self._toggle_grid,
+            (Qt.Key.Key_F12,): self._toggle_hud,
         }
 
         # モード別キーマップ
@@ -487,9 +1209,27 @@ class MainWindow(QWidget):
                 (Qt.Key.Key_K,): lambda: self.image_viewer.move_pan(0, 30),
                 (Qt.Key.Key_D,): self._remove_current_image,
                 (Qt.Key.Key_Y,): self.image_viewer._copy_image,
+                (Qt.Key.Key_I,): self.image_viewer.toggle_inspector,
+                (Qt.Key.Key_X,): self._cycle_compare_mode,
+                (Qt.Key.Key_C,): lambda: self._adjust_tone(self.image_viewer.cycle_colormap),
+                (Qt.Key.Key_BracketLeft,): lambda: self._adjust_tone(lambda: self.image_viewer.adjust_gamma(1 / 1.1)),
+                (Qt.Key.Key_BracketRight,): lambda: self._adjust_tone(lambda: self.image_viewer.adjust_gamma(1.1)),
             },
         }
 
+        self._mode_keymaps["grid"] = {
+            (Qt.Key.Key_H,): lambda: self.grid_view.move_cursor(-1),
+            (Qt.Key.Key_L,): lambda: self.grid_view.move_cursor(1),
+            (Qt.Key.Key_J,): lambda: self.grid_view.move_row(1),
+            (Qt.Key.Key_K,): lambda: self.grid_view.move_row(-1),
+            ("Ctrl", Qt.Key.Key_D): lambda: self.grid_view.move_row(5),
+            ("Ctrl", Qt.Key.Key_U): lambda: self.grid_view.move_row(-5),
+            ("Shift", Qt.Key.Key_G): lambda: self.grid_view.set_current(len(self._image_paths) - 1),
+            (Qt.Key.Key_Return,): self.grid_view.activate_current,
+            (Qt.Key.Key_Enter,): self.grid_view.activate_current,
+            (Qt.Key.Key_O,): self.grid_view.activate_current,
+        }
+
         # モード別シーケンス
         self._mode_sequences = {
             "file_list": {
@@ -497,6 +1237,9 @@ class MainWindow(QWidget):
             },
             "image_viewer": {
             },
+            "grid": {
+                (Qt.Key.Key_G, Qt.Key.Key_G): lambda: self.grid_view.set_current(0),
+            },
         }
 
 
@@ -513,6 +1256,32 @@ class MainWindow(QWidget):
             self._exec_filter(parts[1] if len(parts) > 1 else "")
         elif cmd == "noh":
             self.file_list_panel.clear_filter()
+        elif cmd == "stats":
+            self._exec_stats()
+        elif cmd == "find":
+            self._exec_find(parts[1] if len(parts) > 1 else "")
+        elif cmd == "reload":
+            self._exec_reload(parts[1].strip() if len(parts) > 1 else "")
+        elif cmd == "addall":
+            self._exec_addall(parts[1] if len(parts) > 1 else "")
+        elif cmd == "compare":
+            self._exec_compare(parts[1] if len(parts) > 1 else "")
+        elif cmd == "inspect":
+            self.image_viewer.toggle_inspector()
+        elif cmd == "contrast":
+            self._exec_contrast(parts[1] if len(parts) > 1 else "")
+        elif cmd == "gamma":
+            self._exec_gamma(parts[1] if len(parts) > 1 else "")
+        elif cmd == "cmap":
+            self._exec_cmap(parts[1] if len(parts) > 1 else "")
+        elif cmd == "memory":
+            self._exec_memory(parts[1].strip() if len(parts) > 1 else "")
+        elif cmd == "hud":
+            self._toggle_hud()
+        elif cmd == "trace":
+            self._exec_trace(parts[1].strip() if len(parts) > 1 else "")
+        elif cmd == "export":
+            self._exec_export(parts[1] if len(parts) > 1 else "")
         else:
             self.image_viewer.set_text(f"unknown command: {command}")
 
@@ -566,6 +1335,843 @@ class MainWindow(QWidget):
         """filterコマンド: 部分一致でファイルリストをフィルタ"""
         self.file_list_panel.set_filter(pattern)
 
+    def _exec_stats(self):
+        """statsコマンド: キャッシュと優先度クラスごとの統計を表示"""
+        if self.client is None:
+            self.image_viewer.set_text("サーバー未接続")
+            return
+
+        lines = []
+        for name, c in self.image_cache.stats().items():
+            lines.append(
+                f"cache {name}: {c['count']} items {c['bytes'] / 1024 / 1024:.1f}/"
+                f"{c['max_bytes'] / 1024 / 1024:.0f}MB hit={c['hit_rate'] * 100:.0f}%"
+            )
+        for name, s in self.client.scheduler.stats().items():
+            lines.append(
+                f"{name}: queued={s['queued']} running={s['running']} "
+                f"done={s['completed']} cancelled={s['cancelled']} paused={s['paused']} "
+                f"wait(avg/max)={s['avg_wait_ms']:.0f}/{s['max_wait_ms']:.0f}ms"
+            )
+        self.image_viewer.set_text("\n".join(lines))
+
+    def _exec_trace(self, args: str):
+        """
+        traceコマンド: 取得・デコード・描画の区間計測
+
+        trace             段階ごとの集計を表示
+        trace on | off    記録の開始・停止
+        trace clear       記録を消去
+        trace save [path] Chrome のトレース形式（chrome://tracing・Perfetto）で書き出す
+        """
+        parts = args.split(None, 1)
+        sub = parts[0] if parts else ""
+        if sub == "":
+            self.image_viewer.set_text(tracer.format_summary())
+        elif sub in ("on", "off"):
+            tracer.enabled = sub == "on"
+            self.image_viewer.show_temp_message(f"trace: {'記録中' if tracer.enabled else '停止'}")
+        elif sub == "clear":
+            tracer.clear()
+            self.image_viewer.show_temp_message("trace: 消去しました")
+        elif sub == "save":
+            if len(parts) > 1:
+                path = os.path.expanduser(parts[1])
+            else:
+                path = str(StateManager.STATE_DIR / f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                tracer.export_chrome(path)
+            except OSError as e:
+                self.image_viewer.set_text(f"trace: 書き出しエラー: {e}")
+                return
+            self.image_viewer.set_text(f"trace: {len(tracer.events())} 件を書き出しました: {path}")
+        else:
+            self.image_viewer.set_text("usage: trace [on | off | clear | save [path]]")
+
+    def _exec_export(self, args: str):
+        """
+        exportコマンド: 画像リストの元ファイルをローカルのディレクトリに書き出す
+
+        export [-j 並列数] [-f] ディレクトリ [対象]
+        export stop
+            対象    省略時は画像リストすべて。"." は表示中の画像、"3-10" は番号の範囲（1始まり）、
+                    それ以外はファイル名（"/" を含む場合はパス）の glob
+            -j N    同時に書き出す数（既定 4）
+            -f      書き出し先に同名のファイルがあっても上書きする（既定は飛ばすので、中断後は続きから書き出す）
+
+        書き出し先では、書き出す画像に共通する親ディレクトリからの相対パスを保つ
+        """
+        usage = "usage: export [-j 並列数] [-f] ディレクトリ [対象]"
+        try:
+            tokens = shlex.split(args)
+        except ValueError as e:
+            self.image_viewer.set_text(f"export: {e}")
+            return
+        if tokens == ["stop"]:
+            if self._export_worker is None:
+                self.image_viewer.show_temp_message("export: 実行中の書き出しはありません")
+                return
+            progress = self._export_worker.snapshot()
+            self._cancel_export()
+            self.image_viewer.set_text(
+                f"export: 中断しました（{progress.done}/{progress.total}、再実行すると続きから書き出します）"
+            )
+            return
+
+        jobs = 4
+        overwrite = False
+        positional: list[str] = []
+        while tokens:
+            token = tokens.pop(0)
+            if token == "-j":
+                if not tokens or not tokens[0].isdigit() or int(tokens[0]) < 1:
+                    self.image_viewer.set_text("export: -j には1以上の数を指定してください")
+                    return
+                jobs = int(tokens.pop(0))
+            elif token == "-f":
+                overwrite = True
+            else:
+                positional.append(token)
+        if not 1 <= len(positional) <= 2:
+            self.image_viewer.set_text(usage)
+            return
+
+        paths = self._select_images(positional[1] if len(positional) > 1 else "")
+        if paths is None:
+            self.image_viewer.set_text(usage)
+            return
+        if not paths:
+            self.image_viewer.show_temp_message("export: 対象の画像がありません")
+            return
+
+        directory = os.path.abspath(os.path.expanduser(positional[0]))
+        base = posixpath.commonpath([posixpath.dirname(path) for path in paths])
+        entries = []
+        for path in paths:
+            local_path = os.path.join(directory, *posixpath.relpath(path, base).split("/"))
+            entries.append((path, local_path, self.image_cache.peek_encoded(path)))
+
+        self._cancel_export()
+        if self.client is not None:
+            # 画像の表示は INTERACTIVE で優先されるため、先読みの枠を広げても閲覧は妨げない
+            limit = max(jobs, RequestScheduler.DEFAULT_LIMITS[Priority.PREFETCH])
+            self.client.scheduler.set_limit(Priority.PREFETCH, limit)
+        self._export_dir = directory
+        self._export_errors = []
+        self._export_worker = ExportWorker(self.client, entries, self.disk_cache, self.host, jobs, overwrite, self)
+        self._export_worker.progress.connect(self._on_export_progress)
+        self._export_worker.failed.connect(self._on_export_failed)
+        self._export_worker.finished.connect(self._on_export_finished)
+        self._export_worker.start()
+        self.image_viewer.set_text(f"export: {len(entries)} 件を書き出し中... → {directory}")
+
+    def _select_images(self, spec: str) -> list[str] | None:
+        """
+        export の対象を画像リストから選ぶ（spec が不正なら None）
+
+        "" はすべて、"." は表示中の画像、"3-10" や "5" は番号（1始まり）、それ以外は glob
+        """
+        paths = self._image_paths.paths()
+        if spec == "":
+            return paths
+        if spec == ".":
+            current = self._displayed_image_path()
+            return [current] if current is not None else []
+        match = re.fullmatch(r"(\d+)(?:-(\d*))?", spec)
+        if match is not None:
+            first = int(match.group(1))
+            last = first if match.group(2) is None else int(match.group(2) or len(paths))
+            if first < 1 or last < first:
+                return None
+            return paths[first - 1:last]
+        # リモートはPOSIXなので大文字小文字を区別する
+        if "/" in spec:
+            return [path for path in paths if fnmatch.fnmatchcase(path, spec)]
+        return [path for path in paths if fnmatch.fnmatchcase(posixpath.basename(path), spec)]
+
+    def _on_export_progress(self, progress: ExportProgress):
+        if self.sender() is not self._export_worker:
+            return
+        rate = progress.bytes / progress.elapsed / 1e6 if progress.elapsed > 0 else 0.0
+        lines = [
+            f"export: {progress.done}/{progress.total}  {format_size(progress.bytes)}  {rate:.1f} MB/s"
+            f"  (キャッシュ {progress.cached}, 転送 {format_size(progress.transferred)})"
+        ]
+        if progress.skipped:
+            lines.append(f"  書き出し済みのため {progress.skipped} 件を飛ばしました")
+        if progress.unverified:
+            lines.append(f"  未接続のため {progress.unverified} 件は最新か確かめずにディスクのキャッシュから書き出しました")
+        if progress.failed:
+            lines.append(f"  {progress.failed} 件失敗: {self._export_errors[0]}")
+        if progress.done == progress.total:
+            lines.append(f"  → {self._export_dir}")
+        self.image_viewer.set_text("\n".join(lines))
+
+    def _on_export_failed(self, remote_path: str, error_msg: str):
+        if self.sender() is not self._export_worker:
+            return
+        self._export_errors.append(f"{remote_path}: {error_msg}")
+
+    def _on_export_finished(self):
+        if self.sender() is not self._export_worker:
+            return
+        self._export_worker = None
+        self._reset_export_limit()
+
+    def _cancel_export(self):
+        """実行中の書き出しを中断する（書き終えたファイルは残る）"""
+        if self._export_worker is not None:
+            self._export_worker.cancel()
+            self._export_worker = None
+            self._reset_export_limit()
+
+    def _reset_export_limit(self):
+        if self.client is not None:
+            self.client.scheduler.set_limit(Priority.PREFETCH, RequestScheduler.DEFAULT_LIMITS[Priority.PREFETCH])
+
+    def _register_memory_consumers(self):
+        """メモリ予算を配分するキャッシュと、その割合を登録する"""
+        m = self.memory
+        m.register(
+            "encoded", 0.40,
+            lambda budget: self.image_cache.set_budget(encoded=budget), lambda: self.image_cache.encoded_bytes,
+        )
+        m.register(
+            "decoded", 0.24,
+            lambda budget: self.image_cache.set_budget(decoded=budget), lambda: self.image_cache.decoded_bytes,
+        )
+        m.register("thumbnails", 0.08, self.thumbnails.set_budget, lambda: self.thumbnails.current_bytes)
+        m.register("regions", 0.10, self.region_cache.set_budget, lambda: self.region_cache.current_bytes)
+        # 変換済み QPixmap の使用量は取得できないため上限まで使っているとみなす
+        m.register("pixmaps", 0.07, ImageViewer.set_pixmap_cache_budget, ImageViewer.pixmap_cache_budget)
+        m.register("listings", 0.02, self._set_listing_budget, self._listing_bytes)
+        m.register("diffs", 0.03, self.diff_cache.set_budget, lambda: self.diff_cache.current_bytes)
+        m.register("pyramids", 0.03, self.pyramids.set_budget, lambda: self.pyramids.current_bytes)
+        m.register("documents", 0.03, self.documents.set_budget, lambda: self.documents.current_bytes)
+
+    def _set_listing_budget(self, budget: int):
+        self._session_max_listing = max(1000, budget // self._LISTING_ENTRY_BYTES)
+
+    def _listing_bytes(self) -> int:
+        return len(self._listing[1]) * self._LISTING_ENTRY_BYTES if self._listing is not None else 0
+
+    def _exec_memory(self, args: str):
+        """
+        memoryコマンド: キャッシュのメモリ予算
+
+        memory          予算と使用量を表示
+        memory <size>   このマシンでの全体の予算を設定（例: 8G, 512M）
+        memory auto     搭載メモリから自動で決める
+        """
+        if args:
+            if args == "auto":
+                budget = None
+            else:
+                try:
+                    budget = parse_size(args)
+                except ValueError as e:
+                    self.image_viewer.set_text(f"memory: {e}")
+                    return
+                if budget < MemoryGovernor.MIN_PRESSURE_BUDGET:
+                    self.image_viewer.set_text(
+                        f"memory: {format_size(MemoryGovernor.MIN_PRESSURE_BUDGET)} 以上を指定してください"
+                    )
+                    return
+            self.memory.configured = budget
+            self.state.set_memory_budget(budget)
+            self.memory.rebalance()
+        self.image_viewer.set_text(self.memory.describe())
+
+    def _toggle_hud(self):
+        """
+        パフォーマンス表示の切り替え
+
+        取得・デコードの時間はトレーサーの区間から読むため、記録が止まっていれば
+        表示中だけ記録を有効にする
+        """
+        enabled = not self.image_viewer.hud_enabled()
+        self.image_viewer.set_hud_enabled(enabled)
+        if enabled:
+            if not tracer.enabled:
+                tracer.enabled = True
+                self._hud_started_tracer = True
+            self._update_hud()
+            self._hud_timer.start()
+        else:
+            self._hud_timer.stop()
+            if self._hud_started_tracer:
+                tracer.enabled = False
+                self._hud_started_tracer = False
+
+    def _running_workers(self) -> int:
+        """実行中のワーカースレッドの数（常駐する変更通知の接続は数えない）"""
+        workers = [
+            self._connect_worker, self._list_worker, self._crawl_worker, self._search_worker,
+            self._file_worker, self._prerender_worker, self._region_worker, self._stats_worker,
+            self._compare_worker, self._revalidate_worker, self._export_worker, *self._thumbnail_workers,
+        ]
+        return sum(1 for worker in workers if worker is not None and worker.isRunning())
+
+    def _update_hud(self):
+        """描画・取得・デコード・キャッシュ・ワーカーの最新の値を表示する"""
+        lines = []
+        paint_ms, fps = self.image_viewer.paint_stats()
+        lines.append(f"paint  {'-' if paint_ms is None else f'{paint_ms:.1f}ms'}  {fps:.0f} fps")
+
+        fetch = tracer.latest("fetch")
+        if fetch is not None:
+            seconds = (fetch.end - fetch.start) / 1e9
+            size = (fetch.args or {}).get("bytes", 0)
+            roundtrip = tracer.latest("net.roundtrip")
+            latency = f"  rtt {(roundtrip.end - roundtrip.start) / 1e6:.0f}ms" if roundtrip is not None else ""
+            lines.append(
+                f"fetch  {size / 1024 / 1024:.2f}MB  {seconds * 1000:.0f}ms  "
+                f"{size * 8 / seconds / 1e6 if seconds > 0 else 0:.0f}Mbps{latency}"
+            )
+        else:
+            lines.append("fetch  -")
+
+        decode = tracer.latest("decode")
+        lines.append(
+            "decode -" if decode is None
+            else f"decode {(decode.end - decode.start) / 1e6:.1f}ms  {(decode.args or {}).get('file', '')}"
+        )
+
+        stats = self.image_cache.stats()
+        budget = sum(tier["max_bytes"] for tier in stats.values())
+        lines.append(
+            f"cache  {self.image_cache.current_bytes / 1024 / 1024:.0f}/{budget / 1024 / 1024:.0f}MB  "
+            + "  ".join(f"{name} hit {tier['hit_rate'] * 100:.0f}%" for name, tier in stats.items())
+            + ("  (メモリ不足で縮小中)" if self.memory.under_pressure else "")
+        )
+
+        network = ""
+        if self.client is not None:
+            classes = self.client.scheduler.stats().values()
+            network = (
+                f"  net {sum(c['running'] for c in classes)} running"
+                f" / {sum(c['queued'] for c in classes)} queued"
+            )
+        lines.append(f"workers {self._running_workers()}{network}")
+        self.image_viewer.set_hud_text("\n".join(lines))
+
+    def _parse_find_args(self, args: str) -> dict:
+        """
+        findコマンドの引数を検索条件に変換する（不正な引数は ValueError）
+
+        find [-i] [-e 拡張子,...] [-re 正規表現] [-size ±N[kMG]] [-mtime ±日数]
+             [-d 深さ] [-type f|d|any] [-n 件数] [パターン]
+            -i      対応画像の拡張子だけを対象にする
+            -size   +N は N バイト以上、-N は N バイト以下
+            -mtime  -N は N 日以内に更新、+N は N 日より前に更新
+            パターン  * ? [ を含む場合はglob（"/" を含むと相対パスに照合）、それ以外は名前の部分一致
+        """
+        tokens = shlex.split(args)
+        criteria: dict = {}
+
+        def value() -> str:
+            if not tokens:
+                raise ValueError(f"{option} には値を指定してください")
+            return tokens.pop(0)
+
+        while tokens:
+            option = tokens.pop(0)
+            if option == "-i":
+                criteria["ext"] = ImageLoader.EXTENSIONS
+            elif option == "-e":
+                criteria["ext"] = [e if e.startswith(".") else f".{e}" for e in value().split(",") if e]
+            elif option == "-re":
+                pattern = value()
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise ValueError(f"正規表現が不正です: {e}") from None
+                criteria["regex"] = pattern
+            elif option == "-size":
+                size = value()
+                match = re.fullmatch(r"([+-]?)(\d+)([kKmMgG]?)", size)
+                if match is None:
+                    raise ValueError(f"-size の指定が不正です: {size}")
+                sign, number, unit = match.groups()
+                criteria["max_size" if sign == "-" else "min_size"] = int(number) * self._SIZE_UNITS[unit.lower()]
+            elif option == "-mtime":
+                days = value()
+                if not re.fullmatch(r"[+-]?\d+(\.\d+)?", days):
+                    raise ValueError(f"-mtime の指定が不正です: {days}")
+                threshold = int(time.time() - abs(float(days)) * 86400)
+                criteria["older" if days.startswith("+") else "newer"] = threshold
+            elif option == "-d":
+                depth = value()
+                if not depth.isdigit():
+                    raise ValueError(f"-d の指定が不正です: {depth}")
+                criteria["max_depth"] = int(depth)
+            elif option == "-type":
+                kind = value()
+                if kind not in ("f", "d", "any"):
+                    raise ValueError("-type には f, d, any のいずれかを指定してください")
+                criteria["type"] = kind
+            elif option == "-n":
+                limit = value()
+                if not limit.isdigit():
+                    raise ValueError(f"-n の指定が不正です: {limit}")
+                criteria["limit"] = int(limit)
+            elif option.startswith("-"):
+                raise ValueError(f"不明なオプション: {option}")
+            elif "glob" in criteria or "name" in criteria:
+                raise ValueError("パターンは1つだけ指定してください")
+            elif any(c in option for c in "*?["):
+                criteria["glob"] = option
+            else:
+                criteria["name"] = option
+        return criteria
+
+    def _exec_find(self, args: str):
+        """findコマンド: カレントディレクトリ以下をサーバー側で再帰検索し、結果をファイルリストに表示"""
+        if self.client is None or self.current_path is None:
+            self.image_viewer.set_text("サーバー未接続")
+            return
+        if self._loading:
+            return
+
+        try:
+            criteria = self._parse_find_args(args)
+        except ValueError as e:
+            self.image_viewer.set_text(f"find: {e}")
+            return
+        if not criteria:
+            self.image_viewer.set_text("find: 検索条件を指定してください")
+            return
+
+        self._cancel_search()
+        self._showing_search = True
+        self.file_list_panel.set_message("検索中...")
+        self._set_path_label(f"{self.current_path}  [find {args.strip()}]")
+        self._search_worker = SearchWorker(self.client, self.current_path, criteria, self)
+        self._search_worker.found.connect(self._on_search_found)
+        self._search_worker.finished.connect(self._on_search_finished)
+        self._search_worker.error.connect(self._on_search_error)
+        self._search_worker.start()
+
+    def _on_search_found(self, entries: list[dict]):
+        if self.sender() is not self._search_worker:
+            return
+        self.file_list_panel.append_entries(entries)
+
+    def _on_search_finished(self, summary: dict):
+        if self.sender() is not self._search_worker:
+            return
+        self._search_worker = None
+        matched = summary.get("matched", 0)
+        if matched == 0:
+            self.file_list_panel.set_message("一致するファイルはありません")
+        message = f"find: {matched} 件一致 ({summary.get('scanned', 0)} 件を走査)"
+        if summary.get("truncated"):
+            message += "\n件数の上限に達したため打ち切りました"
+        if summary.get("timed_out"):
+            message += "\n制限時間を過ぎたため打ち切りました"
+        self.image_viewer.set_text(message)
+
+    def _on_search_error(self, error_msg: str):
+        if self.sender() is not self._search_worker:
+            return
+        self._search_worker = None
+        if "HTTP Error 404: 404 page not found" in error_msg:
+            # 検索に対応していない古いサーバーが動いている
+            error_msg = "サーバーが検索に対応していません（サーバーを更新してください）"
+        self.file_list_panel.set_message(f"検索エラー: {error_msg}")
+
+    def _cancel_search(self):
+        """実行中の find の検索を中断し、検索結果の表示を終える"""
+        if self._search_worker is not None:
+            self._search_worker.cancel()
+            self._search_worker = None
+        self._showing_search = False
+
+    def _exec_addall(self, args: str):
+        """
+        addallコマンド: カレントディレクトリの対応画像をすべて画像リストに追加
+
+        addall [-r] [-d 深さ] [glob]
+            -r      サブディレクトリも再帰的に追加する
+            -d N    N階層下まで追加する（-r を含む）
+            glob    ファイル名（"/" を含む場合は相対パス）のパターン
+        """
+        if self.client is None or self.current_path is None:
+            self.image_viewer.set_text("サーバー未接続")
+            return
+
+        try:
+            tokens = shlex.split(args)
+        except ValueError as e:
+            self.image_viewer.set_text(f"addall: {e}")
+            return
+
+        max_depth: int | None = 0
+        pattern: str | None = None
+        while tokens:
+            token = tokens.pop(0)
+            if token == "-r":
+                max_depth = None
+            elif token == "-d":
+                if not tokens or not tokens[0].isdigit():
+                    self.image_viewer.set_text("addall: -d には深さを指定してください")
+                    return
+                max_depth = int(tokens.pop(0))
+            elif pattern is None:
+                pattern = token
+            else:
+                self.image_viewer.set_text("usage: addall [-r] [-d 深さ] [glob]")
+                return
+
+        self._cancel_crawl()
+        crawler = DirectoryCrawler(self.client, ImageLoader.EXTENSIONS, pattern, max_depth)
+        self._crawl_added = 0
+        self._crawl_worker = CrawlWorker(crawler, self.current_path, self)
+        self._crawl_worker.found.connect(self._on_crawl_found)
+        self._crawl_worker.finished.connect(self._on_crawl_finished)
+        self._crawl_worker.error.connect(self._on_crawl_error)
+        self._crawl_worker.start()
+        self.image_viewer.set_text("addall: 検索中...")
+
+    def _on_crawl_found(self, paths: list[str]):
+        """見つかった画像を画像リストに追加（走査の途中から順次追加する）"""
+        if self.sender() is not self._crawl_worker:
+            return
+        added = self._image_paths.extend(paths)
+        if not added:
+            return
+        self._crawl_added += len(added)
+        self._watch_paths_timer.start()
+        if self.grid_view.isVisible():
+            self.grid_view.append_paths(added)
+        if self._current_image_index < 0:
+            # リストが空だった場合は最初の画像を表示する
+            self._current_image_index = 0
+            self._show_current_image()
+        else:
+            self._update_pagination()
+        self.image_viewer.set_text(f"addall: {self._crawl_added} 件追加 (検索中...)")
+
+    def _on_crawl_finished(self, result: CrawlResult):
+        if self.sender() is not self._crawl_worker:
+            return
+        self._crawl_worker = None
+        message = f"addall: {self._crawl_added} 件追加 ({result.files} 件一致, {result.directories} ディレクトリ)"
+        if result.errors:
+            message += f"\n{result.errors} ディレクトリを読み込めませんでした"
+        self.image_viewer.set_text(message)
+
+    def _on_crawl_error(self, error_msg: str):
+        if self.sender() is not self._crawl_worker:
+            return
+        self._crawl_worker = None
+        self.image_viewer.set_text(f"addall: {error_msg}")
+
+    def _cancel_crawl(self):
+        """実行中の addall の走査を中断する"""
+        if self._crawl_worker is not None:
+            self._crawl_worker.cancel()
+            self._crawl_worker = None
+
+    def _toggle_grid(self):
+        """画像リストのサムネイル一覧と1枚表示を切り替える"""
+        if self.grid_view.isVisible():
+            self._open_from_grid(self.grid_view.current_row())
+        else:
+            self._show_grid()
+
+    def _show_grid(self):
+        if not self._image_paths:
+            return
+        self._end_compare(redisplay=False)
+        self.image_viewer.hide()
+        self.grid_view.show()
+        self.grid_view.set_paths(self._image_paths, self._current_image_index)
+        self._focus_mode = "grid"
+        self._update_focus_style()
+
+    def _hide_grid(self):
+        if not self.grid_view.isVisible():
+            return
+        self.grid_view.hide()
+        self.image_viewer.show()
+        # 表示されなくなったセルの生成要求は取り消す
+        self.grid_view.model.forget_requests(self._thumbnail_queue.clear())
+        if self._focus_mode == "grid":
+            self._focus_mode = "image_viewer"
+            self._update_focus_style()
+
+    def _open_from_grid(self, row: int):
+        """グリッドで選択した画像を1枚表示に切り替えて表示する"""
+        self._hide_grid()
+        if 0 <= row < len(self._image_paths) and row != self._current_image_index:
+            self._current_image_index = row
+            self._show_current_image()
+
+    def _on_grid_scrolled(self):
+        """スクロールで画面外に出たセルの生成要求を取り消し、表示中のセルの分だけ要求し直す"""
+        self.grid_view.model.forget_requests(self._thumbnail_queue.clear())
+        self.grid_view.viewport_update()
+
+    def _request_thumbnail(self, remote_path: str):
+        """サムネイルの生成を要求する（キャッシュ済みの画像・バイト列があれば転送しない）"""
+        if self.client is None:
+            return
+        image = self.image_cache.peek(remote_path, self._page_map.get(remote_path, 0))
+        data = self.image_cache.peek_encoded(remote_path)
+        self._thumbnail_queue.put(remote_path, (image, data))
+        self._start_thumbnail_workers()
+
+    def _start_thumbnail_workers(self):
+        if self._thumbnail_workers or self.client is None:
+            return
+        for _ in range(self._THUMBNAIL_WORKERS):
+            worker = ThumbnailWorker(self.client, self._thumbnail_queue, GridView.THUMBNAIL_EDGE, self)
+            worker.ready.connect(self._on_thumbnail_ready)
+            worker.failed.connect(lambda path, _msg: self.grid_view.model.set_failed(path))
+            worker.start()
+            self._thumbnail_workers.append(worker)
+
+    def _stop_thumbnail_workers(self):
+        """サムネイル生成を止める（接続先が変わる場合など）"""
+        self._thumbnail_queue.close()
+        for worker in self._thumbnail_workers:
+            worker.cancel()
+        self._thumbnail_workers = []
+        self._thumbnail_queue = ThumbnailQueue()
+
+    def _on_thumbnail_ready(
+        self, remote_path: str, thumbnail: QImage, data: bytes | None, validator: Validator | None
+    ):
+        """サムネイル生成完了時のコールバック"""
+        if data is not None:
+            # 取得したバイト列は1枚表示に切り替えたときにも使う。一覧をスクロールするだけで
+            # 表示中の画像の前後が押し出されないよう、最初に追い出される位置に置く
+            self.image_cache.insert_encoded(remote_path, data, validator, cold=True)
+        self.grid_view.model.set_thumbnail(remote_path, to_pixmap(thumbnail))
+
+    def _exec_compare(self, args: str):
+        """
+        compareコマンド: リスト内の2枚の画像を比較表示
+
+        compare [A B] [side|flicker|diff|heat] （A, B はリスト内の番号。省略時は表示中の画像と次の画像）
+        compare off
+        """
+        values = args.split()
+        if values == ["off"]:
+            self._end_compare()
+            return
+
+        mode = self._compare_mode
+        indices = []
+        for value in values:
+            if value in self._COMPARE_MODES:
+                mode = value
+            elif value.isdigit() and 1 <= int(value) <= len(self._image_paths):
+                indices.append(int(value) - 1)
+            else:
+                self.image_viewer.set_text(f"compare: [A B] [{'|'.join(self._COMPARE_MODES)}] | off")
+                return
+
+        # モードだけの指定は比較中の組み合わせのまま切り替える
+        if not indices and self._compare_key is not None:
+            self._set_compare_mode(mode)
+            return
+
+        if len(self._image_paths) < 2 or self._current_image_index < 0 or len(indices) == 1 or len(indices) > 2:
+            self.image_viewer.set_text("compare: 比較する画像を2枚指定してください")
+            return
+        if not indices:
+            indices = [self._current_image_index, (self._current_image_index + 1) % len(self._image_paths)]
+
+        path_a, path_b = (self._image_paths[i] for i in indices)
+        self._start_compare(path_a, path_b, mode)
+
+    def _start_compare(self, path_a: str, path_b: str, mode: str):
+        """2枚の画像の比較を開始する（差分はバックグラウンドで計算してキャッシュする）"""
+        if self.client is None:
+            self.image_viewer.set_text("サーバー未接続")
+            return
+
+        self._cancel_file_worker()
+        self._cancel_compare_worker()
+        key = (path_a, self._page_map.get(path_a, 0), path_b, self._page_map.get(path_b, 0))
+        self._compare_key = key
+        self._compare_mode = mode
+
+        cached = self.diff_cache.get(key)
+        if cached is not None:
+            self._show_compare(cached, reset_view=True)
+            return
+
+        sources = [
+            (path, page, self.image_cache.get(path, page), self.image_cache.peek_encoded(path))
+            for path, page in ((key[0], key[1]), (key[2], key[3]))
+        ]
+        self.image_viewer.set_text("比較中...")
+        self._compare_worker = CompareWorker(self.client, self.documents, self.pyramids, sources, self)
+        self._compare_worker.loaded.connect(self._on_compare_image_loaded)
+        self._compare_worker.finished.connect(lambda result, k=key: self._on_compare_finished(result, k))
+        self._compare_worker.error.connect(lambda msg: self.image_viewer.set_text(f"比較エラー: {msg}"))
+        self._compare_worker.start()
+
+    def _on_compare_image_loaded(
+        self,
+        remote_path: str,
+        image: QImage,
+        data: bytes | None,
+        filename: str,
+        page: int,
+        page_count: int,
+        validator: Validator | None,
+    ):
+        """比較のために取得した画像をキャッシュに登録する"""
+        if data is not None:
+            self.image_cache.insert_encoded(remote_path, data, validator)
+        self.image_cache.insert(remote_path, image, page)
+        if validator is not None:
+            self.image_cache.set_validator(remote_path, validator)
+        self._page_counts[remote_path] = page_count
+
+    def _on_compare_finished(self, result: DiffResult, key: tuple[str, int, str, int]):
+        """差分計算完了時のコールバック"""
+        self.diff_cache.insert(key, result)
+        if key == self._compare_key:
+            self._show_compare(result, reset_view=True)
+
+    def _show_compare(self, result: DiffResult, reset_view: bool = False):
+        """現在のモードで比較結果を表示する"""
+        self._compare_result = result
+        name_a = posixpath.basename(self._compare_key[0])
+        name_b = posixpath.basename(self._compare_key[2])
+        keep_view = not reset_view
+        mode = self._compare_mode
+
+        self._flicker_timer.stop()
+        self._flicker_showing_b = False
+        self.image_viewer.set_detail_enabled(False)
+        self.image_viewer.set_source(None, "")
+
+        if mode == "side":
+            self.compare_viewer.show()
+            self.image_viewer.set_image(result.image_a, keep_view)
+            self.image_viewer.set_filename(f"A: {name_a}")
+            self.compare_viewer.set_image(result.aligned_b, keep_view)
+            self.compare_viewer.set_filename(f"B: {name_b}")
+            self.compare_viewer.set_view(*self.image_viewer.view())
+        else:
+            self.compare_viewer.hide()
+            self.compare_viewer.clear_image()
+            if mode == "flicker":
+                self.image_viewer.set_image(result.image_a, keep_view)
+                self.image_viewer.set_filename(f"A: {name_a}")
+                self._flicker_timer.start()
+            else:
+                self.image_viewer.set_image(result.diff if mode == "diff" else result.heatmap, keep_view)
+                self.image_viewer.set_filename(f"|A - B|: {name_a} / {name_b}")
+
+        self.image_viewer.set_text(
+            f"compare {mode}: max={result.max_abs:g} mean={result.mean_abs:.4g} "
+            f"rms={result.rms:.4g} changed={result.changed * 100:.2f}%"
+        )
+
+    def _set_compare_mode(self, mode: str):
+        self._compare_mode = mode
+        if self._compare_result is not None:
+            self._show_compare(self._compare_result)
+
+    def _cycle_compare_mode(self):
+        """比較中なら表示モードを順に切り替える"""
+        if self._compare_key is None:
+            return
+        index = self._COMPARE_MODES.index(self._compare_mode)
+        self._set_compare_mode(self._COMPARE_MODES[(index + 1) % len(self._COMPARE_MODES)])
+
+    def _flicker(self):
+        """A と B を交互に表示する（ズーム・パンは維持する）"""
+        result = self._compare_result
+        if result is None or self._compare_key is None:
+            self._flicker_timer.stop()
+            return
+        self._flicker_showing_b = not self._flicker_showing_b
+        if self._flicker_showing_b:
+            self.image_viewer.set_image(result.aligned_b, keep_view=True)
+            self.image_viewer.set_filename(f"B: {posixpath.basename(self._compare_key[2])}")
+        else:
+            self.image_viewer.set_image(result.image_a, keep_view=True)
+            self.image_viewer.set_filename(f"A: {posixpath.basename(self._compare_key[0])}")
+
+    def _cancel_compare_worker(self):
+        if self._compare_worker is not None and self._compare_worker.isRunning():
+            self._compare_worker.cancel()
+        self._compare_worker = None
+
+    def _end_compare(self, redisplay: bool = True):
+        """比較表示を終了する（redisplay が真なら表示中の画像に戻す）"""
+        if self._compare_key is None:
+            return
+        self._cancel_compare_worker()
+        self._flicker_timer.stop()
+        self._compare_key = None
+        self._compare_result = None
+        self.compare_viewer.hide()
+        self.compare_viewer.clear_image()
+        if redisplay:
+            self._show_current_image()
+
+    def _adjust_tone(self, change):
+        """トーン設定を変更して、設定内容を表示する"""
+        change()
+        self.image_viewer.set_text(self.image_viewer.tone_description())
+
+    def _exec_contrast(self, args: str):
+        """
+        contrastコマンド: 高ビット深度画像の表示範囲を設定
+
+        contrast auto | minmax | p <lo> <hi> | <vmin> <vmax>
+        """
+        tone = self.image_viewer.tone
+        values = args.split()
+        try:
+            if not values or values == ["auto"]:
+                tone.mode, tone.lo_pct, tone.hi_pct = "percentile", 0.5, 99.5
+            elif values == ["minmax"]:
+                tone.mode = "minmax"
+            elif len(values) == 3 and values[0] == "p":
+                lo, hi = float(values[1]), float(values[2])
+                if not 0 <= lo < hi <= 100:
+                    raise ValueError
+                tone.mode, tone.lo_pct, tone.hi_pct = "percentile", lo, hi
+            elif len(values) == 2:
+                tone.mode, tone.vmin, tone.vmax = "manual", float(values[0]), float(values[1])
+            else:
+                raise ValueError
+        except ValueError:
+            self.image_viewer.set_text("contrast: auto | minmax | p <lo> <hi> | <vmin> <vmax>")
+            return
+        self._adjust_tone(self.image_viewer.refresh_tone)
+
+    def _exec_gamma(self, value: str):
+        """gammaコマンド: 高ビット深度画像のガンマ値を設定"""
+        try:
+            gamma = float(value)
+            if gamma <= 0:
+                raise ValueError
+        except ValueError:
+            self.image_viewer.set_text("gamma: 正の数値を指定してください")
+            return
+        self.image_viewer.tone.gamma = gamma
+        self._adjust_tone(self.image_viewer.refresh_tone)
+
+    def _exec_cmap(self, name: str):
+        """cmapコマンド: 高ビット深度画像のカラーマップを設定"""
+        if name not in COLORMAPS:
+            self.image_viewer.set_text(f"cmap: {' | '.join(COLORMAPS)}")
+            return
+        self.image_viewer.tone.colormap = name
+        self._adjust_tone(self.image_viewer.refresh_tone)
+
     def _copy_current_path(self):
         """選択中ファイルのフルパスをクリップボードにコピー"""
         if self.current_path is None:
@@ -647,6 +2253,17 @@ class MainWindow(QWidget):
 
     def closeEvent(self, event):
         """ウィンドウを閉じるときにサーバーをクリーンアップ"""
+        self._cancel_crawl()
+        self._cancel_search()
+        self._cancel_revalidate()
+        self._cancel_export()
+        self._stop_watch()
+        self._stop_thumbnail_workers()
+        self._hud_timer.stop()
+        self._memory_timer.stop()
+        self._save_session()
+        self.disk_cache.close()
+        self.state.flush()
         if self.manager is not None:
             self.manager.cleanup()
         super().closeEvent(event)
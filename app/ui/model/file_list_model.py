@@ -92,3 +92,11 @@ class FileListModel(QAbstractListModel):
         self._entries = entries
         self.endResetModel()
 
+    def append_entries(self, entries):
+        """末尾にエントリを追加（既存の行は作り直さない）"""
+        if not entries:
+            return
+        first = len(self._entries)
+        self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+        self._entries = self._entries + entries
+        self.endInsertRows()
@@ -0,0 +1,62 @@
+class ImageList:
+    """
+    表示対象の画像パスのリスト
+
+    パスから位置への索引を持ち、追加済みかどうかの判定と位置の検索を O(1) で行う
+    （数万件を一括追加しても重複判定が線形探索にならないようにする）
+    """
+
+    def __init__(self):
+        self._paths: list[str] = []
+        self._rows: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __getitem__(self, row: int) -> str:
+        return self._paths[row]
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self._rows
+
+    def index(self, path: str) -> int:
+        """パスの位置を返す（無い場合は -1）"""
+        return self._rows.get(path, -1)
+
+    def append(self, path: str) -> int:
+        """末尾に追加して位置を返す（追加済みの場合は既存の位置を返す）"""
+        row = self._rows.get(path)
+        if row is not None:
+            return row
+        self._rows[path] = len(self._paths)
+        self._paths.append(path)
+        return len(self._paths) - 1
+
+    def extend(self, paths: list[str]) -> list[str]:
+        """未追加のパスだけを末尾に追加し、追加したパスを返す"""
+        added = []
+        for path in paths:
+            if path not in self._rows:
+                self._rows[path] = len(self._paths)
+                self._paths.append(path)
+                added.append(path)
+        return added
+
+    def pop(self, row: int) -> str:
+        """指定位置のパスを取り除いて返す（後ろの要素の索引を詰める）"""
+        path = self._paths.pop(row)
+        del self._rows[path]
+        for i in range(row, len(self._paths)):
+            self._rows[self._paths[i]] = i
+        return path
+
+    def clear(self):
+        self._paths.clear()
+        self._rows.clear()
+
+    def paths(self) -> list[str]:
+        """パスのリストのコピーを返す"""
+        return list(self._paths)
@@ -1,9 +1,25 @@
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
 from PySide6.QtGui import QImage
-from PySide6.QtCore import QThread, Signal
+from PySide6.QtCore import QRectF, QThread, Signal
 
 from server.manager import ServerManager
-from api.client import HTTPClient
+from api.client import CancelToken, FetchResult, HTTPClient, RequestCancelled, Validator
+from api.crawler import DirectoryCrawler
+from api.scheduler import Priority
+from image.diff import compute_diff
+from image.disk_cache import DiskImageCache
+from image.document import DocumentCache
 from image.loader import ImageLoader
+from image.pyramid import PyramidCache, region_stats
+from image.thumbnail import ThumbnailQueue, make_thumbnail, scale_image
+from util.trace import tracer
 
 class ServerConnectWorker(QThread):
     """サーバーセットアップを行うワーカースレッド"""
@@ -52,6 +68,401 @@ class HTTPListWorker(QThread):
             self.error.emit(str(e))
 
 
+class _StreamingWorker(QThread):
+    """
+    結果を少しずつ見つけるワーカーの基底（一定間隔でまとめてGUIスレッドに送る）
+
+    結果がまばらに届く場合も _streaming() の間は補助スレッドが溜まった分を送るため、
+    次の結果が届くまで前の結果が送られずに残ることはない
+    """
+    found = Signal(list)
+    finished = Signal(object)
+    error = Signal(str)
+
+    # GUIスレッドへの通知をまとめる間隔（秒）
+    _EMIT_INTERVAL = 0.1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._token = CancelToken()
+        self._batch: list = []
+        self._last_emit = 0.0
+        # 送る順序を保つため、送信も含めてこのロックの中で行う
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._token.cancel()
+
+    def _add(self, items: list):
+        with self._lock:
+            self._batch.extend(items)
+            if time.monotonic() - self._last_emit >= self._EMIT_INTERVAL:
+                self._flush_locked()
+
+    def _flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._batch and not self._token.cancelled:
+            self.found.emit(self._batch)
+        self._batch = []
+        self._last_emit = time.monotonic()
+
+    @contextmanager
+    def _streaming(self) -> Iterator[None]:
+        """with ブロックの間、溜まった結果を _EMIT_INTERVAL ごとに送り、抜けるときに残りを送る"""
+        stop = threading.Event()
+
+        def flush_pending():
+            while not stop.wait(self._EMIT_INTERVAL):
+                with self._lock:
+                    if self._batch and time.monotonic() - self._last_emit >= self._EMIT_INTERVAL:
+                        self._flush_locked()
+
+        flusher = threading.Thread(target=flush_pending, name="stream-flush", daemon=True)
+        flusher.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            flusher.join()
+            self._flush()
+
+
+class CrawlWorker(_StreamingWorker):
+    """
+    ディレクトリ以下の画像を並列に列挙し、見つかった順に少しずつ送るワーカースレッド
+
+    found: 画像のパスのリスト（名前順の深さ優先）、finished: CrawlResult
+    """
+
+    def __init__(self, crawler: DirectoryCrawler, root: str, parent=None):
+        super().__init__(parent)
+        self.crawler = crawler
+        self.root = root
+
+    def run(self):
+        try:
+            with self._streaming():
+                result = self.crawler.crawl(self.root, self._add, self._token)
+            if result.directories == 0 and result.errors > 0:
+                self.error.emit(f"ディレクトリを読み込めません: {self.root}")
+            else:
+                self.finished.emit(result)
+        except RequestCancelled:
+            pass
+        except Exception as e:
+            if not self._token.cancelled:
+                self.error.emit(str(e))
+
+
+class SearchWorker(_StreamingWorker):
+    """
+    サーバー側の再帰検索の結果を届いた順に少しずつ送るワーカースレッド
+
+    found: エントリのリスト（name は起点からの相対パス）、finished: 集計の dict
+    """
+
+    def __init__(self, client: HTTPClient, root: str, criteria: dict, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self.root = root
+        self.criteria = criteria
+
+    def run(self):
+        try:
+            with self._streaming():
+                summary = self.client.search(
+                    self.root, lambda entry: self._add([entry]), self._token, **self.criteria
+                )
+            self.finished.emit(summary)
+        except RequestCancelled:
+            pass
+        except Exception as e:
+            if not self._token.cancelled:
+                self.error.emit(str(e))
+
+
+class WatchWorker(QThread):
+    """
+    サーバーからディレクトリの変更通知を受け取り続けるワーカースレッド
+
+    監視対象が変わると接続し直し、切断された場合は間隔を空けて再接続する
+    """
+    changed = Signal(list)  # 変更イベントのリスト
+    ready = Signal(bool)    # 監視を開始した（True なら切断されていた間の変更を取りこぼしている）
+
+    _RETRY_MIN = 1.0
+    _RETRY_MAX = 30.0
+
+    def __init__(self, client: HTTPClient, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self._paths: list[str] = []
+        self._token = CancelToken()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def set_paths(self, paths: list[str]):
+        """監視対象を変更する（実行中の接続は打ち切って張り直す）"""
+        with self._lock:
+            if paths == self._paths:
+                return
+            self._paths = list(paths)
+            token = self._token
+        token.cancel()
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        with self._lock:
+            token = self._token
+        token.cancel()
+        self._wake.set()
+
+    def run(self):
+        delay = self._RETRY_MIN
+        lost = False
+        while True:
+            with self._lock:
+                # stop() / set_paths() はこの後に作るトークンをキャンセルする
+                if self._stopped:
+                    break
+                self._wake.clear()
+                paths = list(self._paths)
+                self._token = token = CancelToken()
+            if not paths:
+                self._wake.wait()
+                continue
+
+            def on_event(event: dict):
+                nonlocal delay, lost
+                if event.get("op") == "ready":
+                    self.ready.emit(lost)
+                    delay = self._RETRY_MIN
+                    lost = False
+                else:
+                    self.changed.emit([event])
+
+            try:
+                self.client.watch(paths, on_event, token)
+                lost = True
+            except RequestCancelled:
+                # 監視対象の変更による張り直し
+                continue
+            except Exception:
+                lost = True
+            self._wake.wait(delay)
+            delay = min(delay * 2, self._RETRY_MAX)
+
+
+class RevalidateWorker(QThread):
+    """
+    キャッシュ済みの画像が更新されていないかを条件付きリクエストで確かめるワーカースレッド
+
+    変更が無ければ本文は転送されない（往復1回分だけで済む）
+    """
+    # (remote_path, data, validator) data は更新されていた場合の新しい内容、変更が無ければ None
+    checked = Signal(str, object, object)
+    failed = Signal(str, str)  # (remote_path, message)
+
+    # 同時に確認する数
+    _WORKERS = 4
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        entries: list[tuple[str, Validator]],
+        priority: Priority = Priority.INTERACTIVE,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.client = client
+        self.entries = entries
+        self.priority = priority
+        self._token = CancelToken()
+
+    def cancel(self):
+        self._token.cancel()
+
+    def _check(self, remote_path: str, validator: Validator):
+        try:
+            data, _, new_validator = self.client.fetch_file(remote_path, validator, self._token, self.priority)
+            if not self._token.cancelled:
+                self.checked.emit(remote_path, data, new_validator)
+        except RequestCancelled:
+            pass
+        except Exception as e:
+            if not self._token.cancelled:
+                self.failed.emit(remote_path, str(e))
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=min(self._WORKERS, max(1, len(self.entries)))) as pool:
+            for remote_path, validator in self.entries:
+                pool.submit(self._check, remote_path, validator)
+
+
+class ExportProgress(NamedTuple):
+    """書き出しの進み具合"""
+    total: int
+    written: int       # 書き出したファイル数
+    skipped: int       # 書き出し先にあったため飛ばしたファイル数
+    failed: int
+    cached: int        # キャッシュのバイト列から書き出したファイル数
+    unverified: int    # 未接続のため鮮度を確かめずにディスクのキャッシュから書き出したファイル数
+    bytes: int         # 書き出したバイト数
+    transferred: int   # サーバーから転送したバイト数
+    elapsed: float     # 開始からの秒数
+
+    @property
+    def done(self) -> int:
+        return self.written + self.skipped + self.failed
+
+
+class ExportWorker(QThread):
+    """
+    画像の元ファイルをローカルのディレクトリに並列に書き出すワーカースレッド
+
+    元バイト列はメモリのキャッシュにあればそれを使い、無ければ先読みと同じ優先度で
+    取得する（表示中の画像の取得を妨げない）。ディスクのキャッシュは前回以前のセッションのものが
+    残っているため、接続中は条件付きリクエストで変更が無いと確かめたときだけ使い、未接続なら
+    確かめずに使って unverified に数える。一時ファイルに書いてから rename するため
+    書き出し先にあるのは書き終えたファイルだけで、中断後に実行し直すと残りだけを書き出す
+    """
+    progress = Signal(object)   # ExportProgress
+    failed = Signal(str, str)   # (remote_path, message)
+
+    # 進み具合を通知する間隔（秒）
+    _EMIT_INTERVAL = 0.2
+
+    def __init__(
+        self,
+        client: HTTPClient | None,
+        entries: list[tuple[str, str, bytes | None]],
+        disk_cache: DiskImageCache,
+        host: str,
+        jobs: int = 4,
+        overwrite: bool = False,
+        parent=None,
+    ):
+        """
+        Args:
+            entries: [(リモートのパス, 書き出し先のパス, メモリのキャッシュにある元バイト列)]
+            overwrite: 書き出し先にあるファイルも上書きする
+        """
+        super().__init__(parent)
+        self.client = client
+        self.entries = entries
+        self.disk_cache = disk_cache
+        self.host = host
+        self.jobs = max(1, jobs)
+        self.overwrite = overwrite
+        self._cancelled = threading.Event()
+        # トークンは1つの接続しか切断できないため、要求ごとに作る
+        self._tokens: set[CancelToken] = set()
+        self._lock = threading.Lock()
+        self._counts = dict(written=0, skipped=0, failed=0, cached=0, unverified=0, bytes=0, transferred=0)
+        self._start = 0.0
+        self._last_emit = 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            tokens = list(self._tokens)
+        for token in tokens:
+            token.cancel()
+
+    def snapshot(self) -> ExportProgress:
+        with self._lock:
+            return ExportProgress(len(self.entries), **self._counts, elapsed=time.perf_counter() - self._start)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._counts[key] += value
+            now = time.perf_counter()
+            if now - self._last_emit < self._EMIT_INTERVAL:
+                return
+            self._last_emit = now
+        self.progress.emit(self.snapshot())
+
+    def _fetch(self, remote_path: str, validator: Validator | None = None) -> FetchResult | None:
+        """
+        サーバーから取得する（キャンセルされたら None）
+
+        validator を渡すと条件付きリクエストになり、変更が無ければ data=None の結果を返す
+        """
+        if self.client is None:
+            raise RuntimeError("サーバー未接続")
+        token = CancelToken()
+        with self._lock:
+            self._tokens.add(token)
+        if self._cancelled.is_set():
+            token.cancel()
+        try:
+            return self.client.fetch_file(remote_path, validator, token, Priority.PREFETCH)
+        except RequestCancelled:
+            return None
+        finally:
+            with self._lock:
+                self._tokens.discard(token)
+
+    def _export(self, remote_path: str, local_path: str, data: bytes | None):
+        if self._cancelled.is_set():
+            return
+        if not self.overwrite and os.path.exists(local_path):
+            self._count(skipped=1)
+            return
+        try:
+            from_cache = data is not None
+            verified = True
+            if data is None:
+                key = DiskImageCache.key(self.host, remote_path)
+                cached = self.disk_cache.get(key)
+                if cached is not None and self.client is None:
+                    data, _ = cached
+                    from_cache, verified = True, False
+                else:
+                    result = self._fetch(remote_path, cached[1] if cached is not None else None)
+                    if result is None:
+                        return
+                    if result.data is None:
+                        # 変更が無かったのでディスクのバイト列を使う
+                        data = cached[0]
+                        from_cache = True
+                        self.disk_cache.touch(key)
+                    else:
+                        data = result.data
+                        if cached is not None and result.validator is not None:
+                            # 古くなっていたディスクの内容も置き換える
+                            self.disk_cache.put(key, data, result.validator)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            tmp = local_path + ".part"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, local_path)
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self.failed.emit(remote_path, str(e))
+                self._count(failed=1)
+            return
+        if from_cache:
+            self._count(written=1, cached=1, unverified=0 if verified else 1, bytes=len(data))
+        else:
+            self._count(written=1, bytes=len(data), transferred=len(data))
+
+    def run(self):
+        self._start = time.perf_counter()
+        workers = min(self.jobs, max(1, len(self.entries)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+            for remote_path, local_path, data in self.entries:
+                pool.submit(self._export, remote_path, local_path, data)
+        if not self._cancelled.is_set():
+            self.progress.emit(self.snapshot())
+
+
 class ZoxideAddWorker(QThread):
     """非同期でリモートのzoxide addを実行するワーカー"""
 
@@ -67,21 +478,323 @@ class ZoxideAddWorker(QThread):
             pass
 
 
+def _decode_page(
+    loader: ImageLoader,
+    documents: DocumentCache,
+    remote_path: str,
+    data: bytes | None,
+    filename: str,
+    page: int,
+) -> tuple[QImage, int]:
+    """複数ページ形式は文書キャッシュ経由で、それ以外は通常の読み込みでデコードする"""
+    with tracer.span("decode", file=filename, page=page):
+        if documents.supports(filename):
+            if data is not None and not documents.is_open(remote_path) and loader.can_offload(filename, len(data)):
+                # 以降のページ移動用に文書を開き、初回のレンダリングは別プロセスで行う
+                # （高ビット深度の画像は生データを保持する必要があるため自プロセスで処理する）
+                page_count = documents.open(remote_path, data, filename)
+                if not documents.is_scientific(remote_path):
+                    image, _ = loader.load_page(data, filename, page)
+                    return image, page_count
+            return documents.render(remote_path, data, filename, page)
+        if data is None:
+            raise ValueError(f"データがありません: {filename}")
+        return loader.load(data, filename), 1
+
+
 class HTTPFileWorker(QThread):
-    """ファイルを取得して画像として読み込むワーカースレッド"""
-    finished = Signal(QImage, str)  # (image, filename)
+    """
+    ファイルを取得して画像として読み込むワーカースレッド
+
+    disk_cache を渡すと先にディスクキャッシュ（前回の表示や prefetch.py で保存したもの）を探し、
+    あればサーバーに問い合わせずにそれを使う（読み込みもこのスレッドで行い、GUIを止めない）。
+    接続前（client が None）でディスクにも無ければ offline を通知する
+    """
+    # 画像はバッファ所有者を保ったまま渡すため object 型で送る（image.buffer を参照）
+    # (image, data, filename, page, page_count, validator, from_disk)
+    finished = Signal(object, object, str, int, int, object, bool)
     error = Signal(str)
+    offline = Signal()
 
-    def __init__(self, client: HTTPClient, remote_path: str, parent=None):
+    def __init__(
+        self,
+        client: HTTPClient | None,
+        remote_path: str,
+        documents: DocumentCache,
+        page: int = 0,
+        parent=None,
+        disk_cache: DiskImageCache | None = None,
+        disk_key: str | None = None,
+    ):
         super().__init__(parent)
         self.client = client
         self.remote_path = remote_path
+        self.documents = documents
+        self.page = page
+        self.disk_cache = disk_cache
+        self.disk_key = disk_key
         self._loader = ImageLoader()
+        self._token = CancelToken()
+
+    def cancel(self):
+        """転送・デコードを中断する（キャンセル後はシグナルを発行しない）"""
+        self._token.cancel()
+
+    def is_cancelled(self) -> bool:
+        return self._token.cancelled
+
+    def run(self):
+        try:
+            cached = None
+            if self.disk_cache is not None and self.disk_key is not None:
+                cached = self.disk_cache.get(self.disk_key)
+            if cached is not None:
+                data, validator = cached
+                filename = posixpath.basename(self.remote_path)
+            elif self.client is None:
+                self.offline.emit()
+                return
+            else:
+                data, filename, validator = self.client.fetch_file(self.remote_path, token=self._token)
+            # 再取得した内容で文書を開き直す
+            self.documents.remove(self.remote_path)
+            image, page_count = _decode_page(
+                self._loader, self.documents, self.remote_path, data, filename, self.page
+            )
+            # デコード中にキャンセルされた場合は結果を捨てる
+            self._token.raise_if_cancelled()
+            self.finished.emit(image, data, filename, self.page, page_count, validator, cached is not None)
+        except RequestCancelled:
+            pass
+        except Exception as e:
+            if not self._token.cancelled:
+                self.error.emit(str(e))
+
+
+class ImageDecodeWorker(QThread):
+    """キャッシュ済みのバイト列（またはオープン済み文書）から画像をデコードするワーカースレッド"""
+    finished = Signal(object, str, int, int)  # (image, filename, page, page_count)
+    error = Signal(str)
+
+    def __init__(
+        self,
+        remote_path: str,
+        data: bytes | None,
+        filename: str,
+        documents: DocumentCache,
+        page: int = 0,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.remote_path = remote_path
+        self.data = data
+        self.filename = filename
+        self.documents = documents
+        self.page = page
+        self._loader = ImageLoader()
+        self._token = CancelToken()
+
+    def cancel(self):
+        """デコード結果を破棄する（デコード自体は中断できない）"""
+        self._token.cancel()
+
+    def run(self):
+        try:
+            image, page_count = _decode_page(
+                self._loader, self.documents, self.remote_path, self.data, self.filename, self.page
+            )
+            if not self._token.cancelled:
+                self.finished.emit(image, self.filename, self.page, page_count)
+        except Exception as e:
+            if not self._token.cancelled:
+                self.error.emit(str(e))
+
+
+class PagePrerenderWorker(QThread):
+    """オープン済み文書の隣接ページを先行レンダリングするワーカースレッド"""
+    rendered = Signal(str, int, object)  # (remote_path, page, image)
+
+    def __init__(self, remote_path: str, filename: str, pages: list[int], documents: DocumentCache, parent=None):
+        super().__init__(parent)
+        self.remote_path = remote_path
+        self.filename = filename
+        self.pages = pages
+        self.documents = documents
+        self._token = CancelToken()
+
+    def cancel(self):
+        self._token.cancel()
+
+    def run(self):
+        for page in self.pages:
+            if self._token.cancelled or not self.documents.is_open(self.remote_path):
+                return
+            try:
+                image, _ = self.documents.render(self.remote_path, None, self.filename, page)
+            except Exception:
+                return
+            if not self._token.cancelled:
+                self.rendered.emit(self.remote_path, page, image)
+
+
+class RegionRenderWorker(QThread):
+    """ベクター文書の表示領域を現在の倍率で再ラスタライズするワーカースレッド"""
+    rendered = Signal(object)  # image
+    error = Signal(str)
+
+    def __init__(
+        self,
+        remote_path: str,
+        data: bytes | None,
+        filename: str,
+        page: int,
+        rect: QRectF,
+        scale: float,
+        documents: DocumentCache,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.remote_path = remote_path
+        self.data = data
+        self.filename = filename
+        self.page = page
+        self.rect = rect
+        self.scale = scale
+        self.documents = documents
+        self._token = CancelToken()
+
+    def cancel(self):
+        self._token.cancel()
+
+    def run(self):
+        try:
+            image = self.documents.render_region(
+                self.remote_path, self.data, self.filename, self.page, self.rect, self.scale
+            )
+            if not self._token.cancelled:
+                self.rendered.emit(image)
+        except Exception as e:
+            if not self._token.cancelled:
+                self.error.emit(str(e))
+
+
+class RegionStatsWorker(QThread):
+    """表示領域の統計値とヒストグラムを計算するワーカースレッド"""
+    finished = Signal(object)  # RegionStats
+    error = Signal(str)
+
+    def __init__(self, image: QImage, rect: QRectF, pyramids: PyramidCache, parent=None):
+        super().__init__(parent)
+        self.image = image
+        self.rect = rect
+        self.pyramids = pyramids
 
     def run(self):
         try:
-            data, filename = self.client.get_file(self.remote_path)
-            image = self._loader.load(data, filename)
-            self.finished.emit(image, filename)
+            stats = region_stats(self.pyramids.get(self.image), self.rect)
+            self.finished.emit(stats)
         except Exception as e:
             self.error.emit(str(e))
+
+
+class CompareWorker(QThread):
+    """比較する2枚の画像を揃え、差分を計算するワーカースレッド"""
+    # キャッシュに無かった画像を取得・デコードしたとき
+    # (remote_path, image, data, filename, page, page_count, validator)
+    loaded = Signal(str, object, object, str, int, int, object)
+    finished = Signal(object)  # DiffResult
+    error = Signal(str)
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        documents: DocumentCache,
+        pyramids: PyramidCache,
+        sources: list[tuple[str, int, QImage | None, bytes | None]],
+        parent=None,
+    ):
+        """
+        Args:
+            sources: 比較する2枚の (remote_path, page, デコード済み画像, 元バイト列)。
+                     画像もバイト列も無いものはサーバーから取得する
+        """
+        super().__init__(parent)
+        self.client = client
+        self.documents = documents
+        self.pyramids = pyramids
+        self.sources = sources
+        self._loader = ImageLoader()
+        self._token = CancelToken()
+
+    def cancel(self):
+        self._token.cancel()
+
+    def run(self):
+        try:
+            images = []
+            for remote_path, page, image, data in self.sources:
+                if image is None:
+                    filename = remote_path.split("/")[-1]
+                    validator = None
+                    if data is None and not self.documents.is_open(remote_path):
+                        data, filename, validator = self.client.fetch_file(remote_path, token=self._token)
+                    image, page_count = _decode_page(
+                        self._loader, self.documents, remote_path, data, filename, page
+                    )
+                    self._token.raise_if_cancelled()
+                    self.loaded.emit(remote_path, image, data, filename, page, page_count, validator)
+                images.append(image)
+
+            result = compute_diff(images[0], images[1], self.pyramids)
+            self._token.raise_if_cancelled()
+            self.finished.emit(result)
+        except RequestCancelled:
+            pass
+        except Exception as e:
+            if not self._token.cancelled:
+                self.error.emit(str(e))
+
+
+class ThumbnailWorker(QThread):
+    """キューからサムネイル生成要求を取り出して処理するワーカースレッド（複数起動して並列に処理する）"""
+    # (remote_path, thumbnail, data, validator) data と validator はサーバーから取得した場合のみ
+    ready = Signal(str, object, object, object)
+    failed = Signal(str, str)            # (remote_path, message)
+
+    def __init__(self, client: HTTPClient, queue: ThumbnailQueue, edge: int, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self.queue = queue
+        self.edge = edge
+        self._token = CancelToken()
+
+    def cancel(self):
+        """実行中の転送を中断して終了する（キューは呼び出し元で閉じる）"""
+        self._token.cancel()
+
+    def run(self):
+        while not self._token.cancelled:
+            entry = self.queue.take()
+            if entry is None:
+                return
+            remote_path, (image, data) = entry
+            try:
+                fetched = validator = None
+                if image is not None:
+                    thumbnail = scale_image(image, self.edge)
+                else:
+                    if data is None:
+                        # 表示中の画像の転送を妨げないよう先読みと同じ優先度で取得する
+                        data, _, validator = self.client.fetch_file(
+                            remote_path, token=self._token, priority=Priority.PREFETCH
+                        )
+                        fetched = data
+                    with tracer.span("thumbnail", path=remote_path):
+                        thumbnail = make_thumbnail(data, remote_path.split("/")[-1], self.edge)
+                if not self._token.cancelled:
+                    self.ready.emit(remote_path, thumbnail, fetched, validator)
+            except RequestCancelled:
+                return
+            except Exception as e:
+                if not self._token.cancelled:
+                    self.failed.emit(remote_path, str(e))
@@ -0,0 +1,194 @@
+"""
+メモリ予算の管理
+
+搭載メモリから全体の予算を決め、各キャッシュ（デコード済み画像・元バイト列・
+サムネイル・部分レンダリング・表示用 QPixmap・一覧・比較結果・ピラミッド・
+オープン済み文書）に割り当てる。利用可能なメモリが
+減ったときは、キャッシュが使える量を空きメモリに合わせて縮め、スワップを避ける。
+
+全体の予算は環境変数 SIVIEW_MEMORY_BUDGET（例: 8G, 512M）か、:memory コマンドで
+マシンごとに保存した値で上書きできる
+"""
+
+import ctypes
+import os
+import re
+import sys
+from typing import Callable, NamedTuple
+
+_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    """"512M" や "8G" をバイト数にする（不正な値は ValueError）"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*", text, re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"サイズを解釈できません: {text}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def format_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if size >= _UNITS[unit.lower()]:
+            return f"{size / _UNITS[unit.lower()]:.1f}{unit}"
+    return f"{size}B"
+
+
+class SystemMemory(NamedTuple):
+    total: int
+    available: int | None  # 取得できない環境では None
+
+
+def system_memory() -> SystemMemory | None:
+    """搭載メモリと利用可能なメモリ（取得できなければ None）"""
+    if sys.platform == "win32":
+        return _windows_memory()
+    try:
+        # Linux: MemAvailable はページキャッシュなど解放できる分を含む
+        info = {}
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                info[key] = int(value.split()[0]) * 1024
+        return SystemMemory(info["MemTotal"], info.get("MemAvailable"))
+    except (OSError, KeyError, ValueError, IndexError):
+        pass
+    try:
+        # macOS など: 利用可能なメモリは取得しない
+        return SystemMemory(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"), None)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _windows_memory() -> SystemMemory | None:
+    class MEMORYSTATUSEX(ctypes.Structure):
+        _fields_ = [
+            ("dwLength", ctypes.c_ulong),
+            ("dwMemoryLoad", ctypes.c_ulong),
+            ("ullTotalPhys", ctypes.c_ulonglong),
+            ("ullAvailPhys", ctypes.c_ulonglong),
+            ("ullTotalPageFile", ctypes.c_ulonglong),
+            ("ullAvailPageFile", ctypes.c_ulonglong),
+            ("ullTotalVirtual", ctypes.c_ulonglong),
+            ("ullAvailVirtual", ctypes.c_ulonglong),
+            ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+        ]
+
+    status = MEMORYSTATUSEX()
+    status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+    if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):  # type: ignore[attr-defined]
+        return None
+    return SystemMemory(status.ullTotalPhys, status.ullAvailPhys)
+
+
+class _Consumer(NamedTuple):
+    share: float
+    apply: Callable[[int], None]   # 予算を設定する（超えていれば追い出す）
+    usage: Callable[[], int]       # 現在の使用量
+
+
+class MemoryGovernor:
+    """
+    全体の予算を登録されたキャッシュに割合で配分する
+
+    rebalance() を定期的に呼ぶと、その時点の空きメモリに合わせて配分し直す。
+    キャッシュが使えるのは「現在の使用量 + (空きメモリ - 予備)」までで、空きが予備を
+    下回ればその分だけ各キャッシュを縮める
+    """
+
+    # 自動設定では搭載メモリのこの割合を予算とする
+    RAM_FRACTION = 0.25
+    # 予算の下限・上限（自動設定時）
+    MIN_BUDGET = 256 * 1024 ** 2
+    MAX_AUTO_BUDGET = 32 * 1024 ** 3
+    # 搭載メモリが分からない場合の予算
+    FALLBACK_BUDGET = 1024 ** 3
+    # 空けておくメモリ（搭載メモリに対する割合と下限）
+    RESERVE_FRACTION = 0.10
+    MIN_RESERVE = 512 * 1024 ** 2
+    # メモリ不足でもこれより小さくはしない（表示中の画像を保持できる程度）
+    MIN_PRESSURE_BUDGET = 64 * 1024 ** 2
+
+    ENV_VAR = "SIVIEW_MEMORY_BUDGET"
+
+    def __init__(self, configured: int | None = None, memory: Callable[[], SystemMemory | None] = system_memory):
+        """
+        Args:
+            configured: マシンごとに設定された全体の予算（None なら搭載メモリから決める）
+        """
+        self._memory = memory
+        self._consumers: dict[str, _Consumer] = {}
+        self.configured = configured
+        self.budgets: dict[str, int] = {}
+        self.total_budget = 0
+        self.under_pressure = False
+
+    def register(self, name: str, share: float, apply: Callable[[int], None], usage: Callable[[], int]):
+        """キャッシュを登録する（share は全体の予算に対する割合）"""
+        self._consumers[name] = _Consumer(share, apply, usage)
+
+    def configured_budget(self) -> tuple[int | None, str]:
+        """(設定された予算, 設定元) 環境変数・保存された設定の順に優先する"""
+        env = os.environ.get(self.ENV_VAR)
+        if env:
+            try:
+                return parse_size(env), "env"
+            except ValueError:
+                pass
+        if self.configured is not None:
+            return self.configured, "config"
+        return None, "auto"
+
+    def target_budget(self, memory: SystemMemory | None) -> int:
+        """メモリ不足を考慮しない全体の予算"""
+        configured, _ = self.configured_budget()
+        if configured is not None:
+            return configured
+        if memory is None:
+            return self.FALLBACK_BUDGET
+        return int(min(max(memory.total * self.RAM_FRACTION, self.MIN_BUDGET), self.MAX_AUTO_BUDGET))
+
+    def usage(self) -> dict[str, int]:
+        return {name: consumer.usage() for name, consumer in self._consumers.items()}
+
+    def rebalance(self) -> dict[str, int]:
+        """空きメモリに合わせて予算を配分し直し、各キャッシュに設定する"""
+        memory = self._memory()
+        budget = self.target_budget(memory)
+
+        self.under_pressure = False
+        if memory is not None and memory.available is not None:
+            reserve = max(self.MIN_RESERVE, int(memory.total * self.RESERVE_FRACTION))
+            used = sum(self.usage().values())
+            limit = max(self.MIN_PRESSURE_BUDGET, used + memory.available - reserve)
+            if limit < budget:
+                budget = limit
+                self.under_pressure = True
+
+        self.total_budget = budget
+        shares = sum(consumer.share for consumer in self._consumers.values()) or 1.0
+        self.budgets = {
+            name: int(budget * consumer.share / shares) for name, consumer in self._consumers.items()
+        }
+        for name, consumer in self._consumers.items():
+            consumer.apply(self.budgets[name])
+        return self.budgets
+
+    def describe(self) -> str:
+        """予算と使用量の表示用の文字列"""
+        memory = self._memory()
+        configured, source = self.configured_budget()
+        lines = []
+        if memory is not None:
+            available = "?" if memory.available is None else format_size(memory.available)
+            lines.append(f"memory: {format_size(memory.total)} total, {available} available")
+        lines.append(
+            f"budget: {format_size(self.total_budget)} ({source}"
+            + (f" {format_size(configured)}" if configured is not None else "")
+            + (", 空きメモリ不足のため縮小中" if self.under_pressure else "")
+            + ")"
+        )
+        usage = self.usage()
+        for name, budget in self.budgets.items():
+            lines.append(f"  {name:<11} {format_size(usage.get(name, 0)):>8} / {format_size(budget)}")
+        return "\n".join(lines)
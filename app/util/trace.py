@@ -0,0 +1,194 @@
+"""
+区間計測（トレース）
+
+取得・デコード・描画などの各段階を区間として記録し、段階ごとの集計や
+Chrome のトレース形式（chrome://tracing・Perfetto で開ける JSON）での書き出しを行う。
+既定では無効で、無効な間の span() は何もしない共有オブジェクトを返すだけにする。
+
+    with tracer.span("decode", file=filename):
+        ...
+
+環境変数 SIVIEW_TRACE=1 で起動時から有効になる（:trace on でも切り替えられる）
+"""
+
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, NamedTuple
+
+
+class SpanEvent(NamedTuple):
+    """記録済みの区間（時刻は perf_counter_ns）"""
+    name: str
+    start: int
+    end: int
+    tid: int
+    args: dict[str, Any] | None
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_args", "_start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def set(self, key: str, value: Any):
+        """区間に付ける情報を追加する（転送量など、終わるまで分からない値）"""
+        self._args[key] = value
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+        self._tracer._record(self._name, self._start, time.perf_counter_ns(), self._args)
+        return False
+
+
+class _NullSpan:
+    """無効時の span()（何も記録しない）"""
+    __slots__ = ()
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    区間の記録（スレッドセーフ）
+
+    記録は上限付きのリングバッファに追加するだけで、集計・書き出しは要求されたときに行う
+    """
+
+    MAX_EVENTS = 100_000
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._events: deque[SpanEvent] = deque(maxlen=self.MAX_EVENTS)
+        self._thread_names: dict[int, str] = {}
+        # 段階ごとの最新の区間（HUD 用）
+        self._latest: dict[str, SpanEvent] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def now() -> int:
+        """complete() に渡す開始時刻"""
+        return time.perf_counter_ns()
+
+    def span(self, name: str, **args) -> _Span | _NullSpan:
+        """with 文で囲んだ区間を記録する"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def complete(self, name: str, start: int, **args):
+        """
+        start（now() の値）から現在までを区間として記録する
+
+        開始と終了が別のコールバックにまたがる区間（要求から表示まで等）に使う
+        """
+        if self.enabled:
+            self._record(name, start, time.perf_counter_ns(), args)
+
+    def _record(self, name: str, start: int, end: int, args: dict[str, Any]):
+        thread = threading.current_thread()
+        tid = thread.ident or 0
+        if tid not in self._thread_names:
+            with self._lock:
+                self._thread_names[tid] = thread.name
+        event = SpanEvent(name, start, end, tid, args or None)
+        # deque.append と dict の代入はスレッドセーフ
+        self._events.append(event)
+        self._latest[name] = event
+
+    def events(self) -> list[SpanEvent]:
+        return list(self._events)
+
+    def latest(self, name: str) -> SpanEvent | None:
+        """指定した段階の最後に記録された区間"""
+        return self._latest.get(name)
+
+    def clear(self):
+        self._events.clear()
+        self._latest.clear()
+
+    def summary(self) -> dict[str, dict]:
+        """段階ごとの件数と所要時間（ms）"""
+        durations: dict[str, list[float]] = {}
+        for event in self.events():
+            durations.setdefault(event.name, []).append((event.end - event.start) / 1e6)
+
+        result = {}
+        for name, samples in durations.items():
+            samples.sort()
+            result[name] = {
+                "count": len(samples),
+                "total_ms": sum(samples),
+                "p50_ms": statistics.median(samples),
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "max_ms": samples[-1],
+            }
+        return result
+
+    def format_summary(self) -> str:
+        """summary() を表示用の文字列にする（合計時間の長い順）"""
+        summary = self.summary()
+        if not summary:
+            return "trace: 記録なし" + ("" if self.enabled else "（:trace on で記録を開始）")
+        width = max(len(name) for name in summary)
+        lines = [f"{'stage':<{width}}  {'count':>6}  {'total':>9}  {'p50':>8}  {'p95':>8}  {'max':>8}"]
+        for name, s in sorted(summary.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+            lines.append(
+                f"{name:<{width}}  {s['count']:>6}  {s['total_ms']:>7.0f}ms  {s['p50_ms']:>6.1f}ms  "
+                f"{s['p95_ms']:>6.1f}ms  {s['max_ms']:>6.1f}ms"
+            )
+        return "\n".join(lines)
+
+    def export_chrome(self, path: str):
+        """Chrome のトレース形式（Trace Event Format）で書き出す"""
+        events = self.events()
+        origin = min((event.start for event in events), default=0)
+        pid = os.getpid()
+        trace_events: list[dict] = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self._thread_names.items())
+        ]
+        for event in events:
+            trace_event = {
+                "name": event.name,
+                "cat": event.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (event.start - origin) / 1000,
+                "dur": (event.end - event.start) / 1000,
+                "pid": pid,
+                "tid": event.tid,
+            }
+            if event.args:
+                trace_event["args"] = {
+                    key: value if isinstance(value, (int, float, bool)) else str(value)
+                    for key, value in event.args.items()
+                }
+            trace_events.append(trace_event)
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+# プロセス全体で共有するトレーサー
+tracer = Tracer(enabled=os.environ.get("SIVIEW_TRACE", "") not in ("", "0"))
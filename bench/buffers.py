@@ -0,0 +1,100 @@
+"""
+外部バッファを参照する画像の寿命の確認
+
+DecodePool で別プロセスからデコードした画像（共有メモリを参照する QImage）を
+キャッシュに入れて QPixmap に変換し、キャッシュから追い出して共有メモリを解放した後も
+QPixmap が正しい画素を保持しているかを確認する。QPixmap が解放済みのバッファを
+参照していると、画素が壊れるかプロセスが異常終了するため、終了コード1で終了する。
+
+    python bench/buffers.py [--rounds N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# 子プロセスで実行する確認（異常終了しても結果を報告できるよう別プロセスにする）
+_CHECK_SNIPPET = """
+import gc
+import sys
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QColor, QGuiApplication, QImage
+
+app = QGuiApplication(["siview", "-platform", "offscreen"])
+
+from image.buffer import to_pixmap
+from image.cache import ImageCache
+from image.decode_pool import DecodePool
+
+rounds = int(sys.argv[1])
+size = 1024
+
+
+def color(index):
+    return QColor((index * 37) % 256, (index * 91) % 256, (index * 53) % 256)
+
+
+def encode(index):
+    image = QImage(size, size, QImage.Format.Format_RGB32)
+    image.fill(color(index))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(data.data())
+
+
+pool = DecodePool(2)
+cache = ImageCache()
+pixmaps = []
+for index in range(rounds):
+    image, _ = pool.decode(encode(index), "check.png")
+    path = f"/check/{index}.png"
+    cache.insert(path, image)
+    del image
+    pixmaps.append(to_pixmap(cache.get(path)))
+    # 追い出して共有メモリのマッピングを閉じる
+    cache.remove(path)
+    gc.collect()
+pool.shutdown()
+
+failures = 0
+for index, pixmap in enumerate(pixmaps):
+    actual = pixmap.toImage().pixelColor(size // 2, size // 2)
+    if actual != color(index):
+        print(f"round {index}: expected {color(index).name()}, got {actual.name()}")
+        failures += 1
+sys.exit(1 if failures else 0)
+"""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=8, help="デコード・追い出しの回数")
+    args = parser.parse_args()
+
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run(
+        [sys.executable, "-c", _CHECK_SNIPPET, str(max(1, args.rounds))],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.stdout:
+        print(result.stdout, end="")
+    if result.returncode < 0:
+        print(f"FAIL: 確認用プロセスが異常終了しました（シグナル {-result.returncode}）")
+        return 1
+    if result.returncode != 0:
+        print(result.stderr, end="")
+        print("FAIL: 追い出し後の QPixmap の画素が一致しません")
+        return 1
+    print(f"ok: {args.rounds} rounds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
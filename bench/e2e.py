@@ -0,0 +1,264 @@
+"""
+エンドツーエンドのベンチマーク
+
+bench/standin.py のローカルサーバーに対して HTTPClient・ImageLoader・ImageCache・
+FileListPanel を offscreen で動かし、結果をJSONで出力する。同じ条件で取った結果同士を
+--compare で比べられる。
+
+    python bench/e2e.py [--latency-ms MS] [--bandwidth-mbps MBPS] [--only listing,fetch,...]
+                        [--out result.json] [--compare baseline.json]
+
+計測項目:
+    listing    ディレクトリ一覧の往復時間と、ツリー全体の並列走査時間
+    fetch      逐次・並列の転送速度と、条件付きリクエスト（304）の往復時間
+    decode     形式ごとのデコード時間
+    cache      画像の前後移動と再訪を模した閲覧での各層のヒット率
+    file_list  大きな一覧を FileListPanel に設定する時間
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "app"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from PySide6.QtWidgets import QApplication
+
+from api.client import HTTPClient
+from api.crawler import DirectoryCrawler
+from api.scheduler import Priority
+from image.cache import ImageCache
+from image.loader import ImageLoader
+from standin import NetworkProfile, StandinServer, SyntheticTree, TreeSpec
+
+CASES = ["listing", "fetch", "decode", "cache", "file_list"]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _summary(samples: list[float]) -> dict:
+    """秒の計測値を ms の代表値にする"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": _ms(statistics.median(ordered)),
+        "p95_ms": _ms(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]),
+        "mean_ms": _ms(statistics.fmean(ordered)),
+    }
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_listing(client: HTTPClient, tree: SyntheticTree) -> dict:
+    samples = [_timed(client.ls, "/" + path)[0] for path in tree.directories()]
+    crawler = DirectoryCrawler(client, ImageLoader.EXTENSIONS, max_depth=None)
+    crawl_time, result = _timed(crawler.crawl, "/", lambda paths: None)
+    return {
+        "ls": _summary(samples),
+        "crawl_ms": _ms(crawl_time),
+        "crawl_directories": result.directories,
+        "crawl_files": result.files,
+    }
+
+
+def bench_fetch(client: HTTPClient, tree: SyntheticTree) -> dict:
+    files = ["/" + path for path in tree.files(tree.directories()[0])]
+
+    start = time.perf_counter()
+    fetched = [client.fetch_file(path) for path in files]
+    sequential = time.perf_counter() - start
+    total = sum(len(result.data) for result in fetched)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda path: client.get_file(path, priority=Priority.PREFETCH), files))
+        parallel = time.perf_counter() - start
+
+    revalidate = [
+        _timed(client.fetch_file, path, result.validator)[0]
+        for path, result in zip(files, fetched)
+    ]
+    return {
+        "files": len(files),
+        "bytes": total,
+        "sequential_mbps": round(total * 8 / sequential / 1e6, 2),
+        "parallel_mbps": round(total * 8 / parallel / 1e6, 2),
+        "sequential_ms": _ms(sequential),
+        "parallel_ms": _ms(parallel),
+        "revalidate": _summary(revalidate),
+    }
+
+
+def bench_decode(client: HTTPClient, tree: SyntheticTree, repeat: int = 5) -> dict:
+    loader = ImageLoader(use_pool=False)
+    results = {}
+    for path in tree.files(tree.directories()[0])[:len(tree.spec.formats)]:
+        data, filename = client.get_file("/" + path)
+        ext = filename.rsplit(".", 1)[-1]
+        results[ext] = _summary([_timed(loader.load, data, filename)[0] for _ in range(repeat)])
+        results[ext]["bytes"] = len(data)
+    return results
+
+
+def bench_cache(client: HTTPClient, tree: SyntheticTree) -> dict:
+    """前進・後退・少し前の画像への再訪を繰り返す閲覧を、表示と同じ手順（decoded → encoded → 取得）で再現する"""
+    # 既定の構成ではデコード済み層に収まらない枚数になる（後退時に元バイト列の層が効く）
+    paths = ["/" + path for directory in tree.directories() for path in tree.files(directory)]
+    sequence = list(range(len(paths)))
+    sequence += list(reversed(sequence))
+    sequence += [i for start in range(0, len(paths), 8) for i in (start, max(0, start - 4), start)]
+
+    cache = ImageCache()
+    loader = ImageLoader(use_pool=False)
+    fetched = 0
+    start = time.perf_counter()
+    for index in sequence:
+        path = paths[index]
+        if cache.get(path) is not None:
+            continue
+        data = cache.get_encoded(path)
+        if data is None:
+            data, _ = client.get_file(path)
+            fetched += len(data)
+            cache.insert_encoded(path, data)
+        cache.insert(path, loader.load(data, path))
+    elapsed = time.perf_counter() - start
+
+    stats = cache.stats()
+    return {
+        "steps": len(sequence),
+        "total_ms": _ms(elapsed),
+        "bytes_fetched": fetched,
+        "decoded_hit_rate": round(stats["decoded"]["hit_rate"], 4),
+        "encoded_hit_rate": round(stats["encoded"]["hit_rate"], 4),
+    }
+
+
+def bench_file_list(sizes: tuple[int, ...] = (1000, 10000, 50000), repeat: int = 3) -> dict:
+    from ui.file_list_panel import FileListPanel
+
+    panel = FileListPanel()
+    panel.resize(400, 800)
+    results = {}
+    for size in sizes:
+        entries = [
+            {"name": f"frame_{i % 97}_{i}.png" if i % 10 else f"dir{i}", "is_dir": i % 10 == 0, "size": i}
+            for i in range(size)
+        ]
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            panel.set_entries(list(entries))
+            QApplication.processEvents()
+            samples.append(time.perf_counter() - start)
+        results[str(size)] = _summary(samples)
+    return results
+
+
+def run(args) -> dict:
+    # FileListPanel と画像のデコードに必要（戻り値は終了まで保持する）
+    app = QApplication.instance() or QApplication(["siview-bench"])
+    spec = TreeSpec(dirs=args.dirs, files_per_dir=args.files, image_size=args.size)
+    profile = NetworkProfile(args.latency_ms / 1000, args.bandwidth_mbps * 1e6 / 8)
+    server = StandinServer(SyntheticTree(spec), profile).start()
+    client = HTTPClient(server.base_url, home_dir="/")
+    cases = args.only.split(",") if args.only else CASES
+
+    results = {}
+    try:
+        for case in cases:
+            if case == "listing":
+                results[case] = bench_listing(client, server.tree)
+            elif case == "fetch":
+                results[case] = bench_fetch(client, server.tree)
+            elif case == "decode":
+                results[case] = bench_decode(client, server.tree)
+            elif case == "cache":
+                results[case] = bench_cache(client, server.tree)
+            elif case == "file_list":
+                results[case] = bench_file_list()
+            else:
+                raise ValueError(f"unknown case: {case}")
+    finally:
+        server.stop()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tree": {"dirs": spec.dirs, "files_per_dir": spec.files_per_dir, "image_size": spec.image_size},
+            "network": {"latency_ms": args.latency_ms, "bandwidth_mbps": args.bandwidth_mbps},
+            "server": server.counters.snapshot(),
+        },
+        "results": results,
+    }
+
+
+def _flatten(value, prefix: str = "") -> dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, child in value.items():
+            flat.update(_flatten(child, f"{prefix}.{key}" if prefix else key))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(baseline: dict, current: dict):
+    """数値の項目を並べて表示する（比は current / baseline）"""
+    if baseline["meta"]["network"] != current["meta"]["network"] or baseline["meta"]["tree"] != current["meta"]["tree"]:
+        print("warning: 計測条件が異なります", file=sys.stderr)
+    before = _flatten(baseline["results"])
+    after = _flatten(current["results"])
+    width = max((len(key) for key in after), default=0)
+    for key, value in after.items():
+        if key in before:
+            ratio = f"{value / before[key]:6.2f}x" if before[key] else "     -"
+            print(f"{key:<{width}}  {before[key]:>12}  {value:>12}  {ratio}")
+        else:
+            print(f"{key:<{width}}  {'-':>12}  {value:>12}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dirs", type=int, default=TreeSpec.dirs)
+    parser.add_argument("--files", type=int, default=TreeSpec.files_per_dir, help="ディレクトリごとの画像数")
+    parser.add_argument("--size", type=int, default=TreeSpec.image_size, help="画像の一辺")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="要求ごとに加える遅延")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="転送速度の上限（0 は無制限）")
+    parser.add_argument("--only", help="実行する項目（カンマ区切り）: " + ",".join(CASES))
+    parser.add_argument("--out", help="結果を保存するJSONファイル")
+    parser.add_argument("--compare", help="比較する以前の結果（JSON）")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), result)
+    elif not args.out:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+"""
+ベンチマーク用のローカルSSHサーバー
+
+ServerManager が使う exec・SFTP・direct-tcpip だけを paramiko で実装した、同じプロセス内で
+動くSSHサーバー。どの鍵・パスワードでも認証を通し、コマンドは一時ディレクトリを HOME として
+ローカルのシェルで実行する。往復遅延（RTT）を加える中継を前段に置けば、遠いホストへの接続を
+1台のマシンで模擬できる。
+
+    standin = SSHStandin(home, rtt=0.04).start()
+    config = standin.write_ssh_config(tmp / "ssh_config", "bench")
+    manager = ServerManager("bench", str(config))
+"""
+
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import paramiko
+
+# サーバー側のトランスポートのログ（クライアントの切断で出る例外など）は表示しない
+_LOG_CHANNEL = "siview.bench.ssh"
+logging.getLogger(_LOG_CHANNEL).setLevel(logging.CRITICAL)
+
+
+def _pump(read, write, close):
+    """read() が空を返すまで write() に流し、最後に close() を呼ぶ"""
+    try:
+        while data := read():
+            write(data)
+    except (OSError, EOFError):
+        pass
+    finally:
+        try:
+            close()
+        except OSError:
+            pass
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OP_UNSUPPORTED
+
+
+class _SFTPInterface(paramiko.SFTPServerInterface):
+    """相対パスを HOME からのパスとして、ローカルのファイルシステムを操作する"""
+
+    def __init__(self, server, home: Path, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.home = home
+
+    def _local(self, path: str) -> str:
+        return os.path.join(self.home, path) if not os.path.isabs(path) else path
+
+    def canonicalize(self, path):
+        return os.path.normpath(self._local(path))
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            result = []
+            for name in os.listdir(local):
+                attr = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(local, name)))
+                attr.filename = name
+                result.append(attr)
+            return result
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            mode = getattr(attr, "st_mode", None) or 0o644
+            fd = os.open(local, flags, mode)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+        if flags & os.O_WRONLY:
+            fstr = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            fstr = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            fstr = "rb"
+        try:
+            f = os.fdopen(fd, fstr)
+        except OSError as e:
+            os.close(fd)
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+        handle = _SFTPHandle(flags)
+        handle.filename = local
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            if attr.st_mode is not None:
+                os.chmod(self._local(path), attr.st_mode)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """1接続分のSSHサーバーの振る舞い"""
+
+    def __init__(self, standin: "SSHStandin"):
+        self.standin = standin
+        # direct-tcpip のチャネルID → 接続先（チャネル自体は Transport.accept() で受け取る）
+        self.forwards: dict[int, tuple[str, int]] = {}
+
+    def get_allowed_auths(self, username):
+        return "publickey,password"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        self.forwards[chanid] = destination
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(
+            target=self.standin._exec, args=(channel, command.decode()), name="ssh-exec", daemon=True
+        ).start()
+        return True
+
+
+class _LatencyRelay:
+    """
+    TCP接続を中継し、各方向に RTT/2 の遅延を加える
+
+    受信した順に到着時刻を記録して遅らせて送るため、転送速度は制限しない
+    """
+
+    def __init__(self, target_port: int, rtt: float):
+        self.target_port = target_port
+        self.delay = rtt / 2
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, name="ssh-latency", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            for src, dst in ((client, upstream), (upstream, client)):
+                self._start_direction(src, dst)
+
+    def _start_direction(self, src: socket.socket, dst: socket.socket):
+        pending: queue.Queue[tuple[float, bytes]] = queue.Queue()
+
+        def receive():
+            try:
+                while data := src.recv(65536):
+                    pending.put((time.monotonic() + self.delay, data))
+            except OSError:
+                pass
+            pending.put((time.monotonic() + self.delay, b""))
+
+        def send():
+            try:
+                while True:
+                    due, data = pending.get()
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    if not data:
+                        dst.shutdown(socket.SHUT_WR)
+                        return
+                    dst.sendall(data)
+            except OSError:
+                pass
+
+        threading.Thread(target=receive, name="ssh-latency-recv", daemon=True).start()
+        threading.Thread(target=send, name="ssh-latency-send", daemon=True).start()
+
+    def close(self):
+        self._listener.close()
+
+
+class SSHStandin:
+    """
+    exec・SFTP・direct-tcpip に対応したSSHサーバー（start() から stop() まで別スレッドで待ち受ける）
+
+    Args:
+        home: リモートの HOME として使うディレクトリ（exec の作業ディレクトリ・SFTPの基準）
+        rtt: 加える往復遅延（秒、0 なら中継を置かない）
+    """
+
+    def __init__(self, home: Path, rtt: float = 0.0):
+        self.home = Path(home)
+        self.rtt = rtt
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.client_key = paramiko.RSAKey.generate(2048)
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self._relay = _LatencyRelay(self._listener.getsockname()[1], rtt) if rtt > 0 else None
+        self._transports: list[paramiko.Transport] = []
+        self._lock = threading.Lock()
+        self._shell = shutil.which("bash") or "/bin/sh"
+        self.exec_log: list[str] = []
+
+    @property
+    def port(self) -> int:
+        """クライアントが接続するポート（遅延を加える場合は中継のポート）"""
+        return self._relay.port if self._relay else self._listener.getsockname()[1]
+
+    def start(self) -> "SSHStandin":
+        threading.Thread(target=self._accept, name="ssh-standin", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._listener.close()
+        if self._relay:
+            self._relay.close()
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+
+    def write_ssh_config(self, path: Path, alias: str) -> Path:
+        """このサーバーに接続する ssh_config と秘密鍵を書き出す（ServerManager にそのまま渡せる）"""
+        path = Path(path)
+        key_path = path.with_name(path.name + ".key")
+        self.client_key.write_private_key_file(str(key_path))
+        path.write_text(
+            f"Host {alias}\n"
+            f"    HostName 127.0.0.1\n"
+            f"    Port {self.port}\n"
+            f"    User {os.environ.get('USER', 'bench')}\n"
+            f"    IdentityFile {key_path}\n"
+        )
+        return path
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(sock,), name="ssh-transport", daemon=True).start()
+
+    def _serve(self, sock: socket.socket):
+        transport = paramiko.Transport(sock)
+        transport.set_log_channel(_LOG_CHANNEL)
+        transport.add_server_key(self.host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _SFTPInterface, self.home)
+        server = _ServerInterface(self)
+        with self._lock:
+            self._transports.append(transport)
+        try:
+            transport.start_server(server=server)
+        except (paramiko.SSHException, EOFError, OSError):
+            return
+
+        # セッションのチャネルはコールバックで処理するため、ここでは転送のチャネルだけを扱う
+        while transport.is_active():
+            channel = transport.accept(1.0)
+            if channel is None:
+                continue
+            destination = server.forwards.pop(channel.get_id(), None)
+            if destination is not None:
+                self._forward(channel, destination)
+
+    def _forward(self, channel: paramiko.Channel, destination: tuple[str, int]):
+        try:
+            sock = socket.create_connection(destination)
+        except OSError:
+            channel.close()
+            return
+        threading.Thread(
+            target=_pump, args=(lambda: channel.recv(65536), sock.sendall, lambda: sock.shutdown(socket.SHUT_WR)),
+            name="ssh-forward", daemon=True,
+        ).start()
+        threading.Thread(
+            target=_pump, args=(lambda: sock.recv(65536), channel.sendall, channel.close),
+            name="ssh-forward", daemon=True,
+        ).start()
+
+    def _exec(self, channel: paramiko.Channel, command: str):
+        """sshd と同じくユーザーのシェルの -c でコマンドを実行する"""
+        self.exec_log.append(command)
+        env = dict(os.environ, HOME=str(self.home))
+        try:
+            result = subprocess.run(
+                [self._shell, "-c", command], cwd=self.home, env=env,
+                stdin=subprocess.DEVNULL, capture_output=True,
+            )
+            channel.sendall(result.stdout)
+            channel.sendall_stderr(result.stderr)
+            channel.send_exit_status(result.returncode)
+        except (OSError, paramiko.SSHException):
+            channel.send_exit_status(255)
+        finally:
+            channel.close()
@@ -0,0 +1,269 @@
+"""
+ベンチマーク用のローカルサーバー
+
+server/main.go と同じ /api/list と /file/ のプロトコルで、メモリ上に生成した
+ディレクトリと画像を返す。遅延と帯域制限を加えて、SSHトンネル越しの環境を模擬できる。
+
+単体でも起動できる（GUIから接続して試す場合など）:
+
+    python bench/standin.py --port 9000 --latency-ms 40 --bandwidth-mbps 50
+"""
+
+import argparse
+import json
+import posixpath
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QImage
+
+# 生成したファイルの更新日時（検証子を安定させるため固定）
+_MTIME = 1_700_000_000
+
+
+@dataclass
+class TreeSpec:
+    """生成するディレクトリ構成"""
+    dirs: int = 8                 # ルート直下のディレクトリ数
+    files_per_dir: int = 32       # ディレクトリごとの画像数
+    image_size: int = 1024        # 画像の一辺（ピクセル）
+    formats: tuple[str, ...] = ("png", "jpg")
+    extra_files: int = 0          # 画像以外のファイル数（一覧の大きさだけを増やす）
+    seed: int = 0
+
+
+def encode_image(width: int, height: int, fmt: str, seed: int) -> bytes:
+    """グラデーションにノイズを加えた画像を指定形式で符号化する（圧縮が効きすぎないように）"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // max(1, width - 1), y * 255 // max(1, height - 1), (x + y) % 256], axis=-1)
+    noise = rng.integers(0, 48, size=(height, width, 3))
+    arr = np.ascontiguousarray(((base + noise) % 256).astype(np.uint8))
+    image = QImage(arr.data, width, height, width * 3, QImage.Format.Format_RGB888)
+
+    array = QByteArray()
+    buffer = QBuffer(array)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    if not image.save(buffer, fmt.upper()):
+        raise ValueError(f"未対応の形式: {fmt}")
+    buffer.close()
+    return bytes(array.data())
+
+
+class SyntheticTree:
+    """
+    メモリ上のディレクトリツリー
+
+    同じ形式・大きさの画像は1度だけ符号化して使い回す（ファイルごとの内容の違いは不要）
+    """
+
+    def __init__(self, spec: TreeSpec):
+        self.spec = spec
+        self._blobs = {
+            fmt: encode_image(spec.image_size, spec.image_size, fmt, spec.seed + i)
+            for i, fmt in enumerate(spec.formats)
+        }
+        # ディレクトリ（"" がルート） → [(名前, ディレクトリか, 内容)]
+        self._dirs: dict[str, list[tuple[str, bool, bytes | None]]] = {"": []}
+        for d in range(spec.dirs):
+            name = f"run{d:04d}"
+            self._dirs[""].append((name, True, None))
+            entries = self._dirs.setdefault(name, [])
+            for f in range(spec.files_per_dir):
+                fmt = spec.formats[f % len(spec.formats)]
+                entries.append((f"img{f:05d}.{fmt}", False, self._blobs[fmt]))
+            for f in range(spec.extra_files):
+                entries.append((f"data{f:05d}.bin", False, b"\0" * 16))
+
+    def directories(self) -> list[str]:
+        """ルートを除くディレクトリの相対パス"""
+        return [path for path in self._dirs if path]
+
+    def files(self, directory: str) -> list[str]:
+        return [
+            posixpath.join(directory, name)
+            for name, is_dir, _ in self._dirs.get(directory, [])
+            if not is_dir and not name.endswith(".bin")
+        ]
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        """server/main.go の safePath と同じくルートからの相対パスに正規化する（"." はルート）"""
+        return posixpath.normpath("/" + path).strip("/")
+
+    def listing(self, path: str) -> list[dict] | None:
+        entries = self._dirs.get(self._normalize(path))
+        if entries is None:
+            return None
+        return [
+            {"name": name, "is_dir": is_dir, "size": 0 if data is None else len(data)}
+            for name, is_dir, data in entries
+        ]
+
+    def read(self, path: str) -> bytes | None:
+        directory, name = posixpath.split(self._normalize(path))
+        for entry_name, is_dir, data in self._dirs.get(directory, []):
+            if entry_name == name and not is_dir:
+                return data
+        return None
+
+
+@dataclass
+class NetworkProfile:
+    """模擬するネットワーク"""
+    latency: float = 0.0          # 要求ごとの遅延（秒）
+    bandwidth: float = 0.0        # 転送速度の上限（バイト/秒、0 は無制限）
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+
+    def add(self, sent: int, not_modified: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += sent
+            self.not_modified += int(not_modified)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "not_modified": self.not_modified, "bytes_sent": self.bytes_sent}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StandinServer"
+    protocol_version = "HTTP/1.1"
+
+    # 帯域制限時に1回で送る大きさ
+    _CHUNK = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        profile = self.server.profile
+        if profile.latency:
+            time.sleep(profile.latency)
+
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/api/list":
+            path = urllib.parse.parse_qs(url.query).get("path", [""])[0]
+            entries = self.server.tree.listing(path)
+            if entries is None:
+                self._send_error(404, "no such directory")
+                return
+            self._send(200, json.dumps(entries).encode(), {"Content-Type": "application/json"})
+        elif url.path.startswith("/file/"):
+            data = self.server.tree.read(urllib.parse.unquote(url.path[len("/file/"):]))
+            if data is None:
+                self._send_error(404, "not found")
+                return
+            # server/main.go と同じく大きさと更新日時から ETag を作る
+            etag = f'"{len(data):x}-{_MTIME * 10 ** 9:x}"'
+            headers = {"ETag": etag, "Last-Modified": formatdate(_MTIME, usegmt=True)}
+            if self._not_modified(etag):
+                self._send(304, b"", headers)
+                return
+            self._send(200, data, headers)
+        else:
+            self._send_error(404, "not found")
+
+    def _not_modified(self, etag: str) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= _MTIME
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send_error(self, status: int, message: str):
+        self._send(status, message.encode(), {"Content-Type": "text/plain"})
+
+    def _send(self, status: int, body: bytes, headers: dict[str, str]):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        bandwidth = self.server.profile.bandwidth
+        try:
+            if not bandwidth:
+                self.wfile.write(body)
+            else:
+                start = time.perf_counter()
+                for offset in range(0, len(body), self._CHUNK):
+                    self.wfile.write(body[offset:offset + self._CHUNK])
+                    ahead = (offset + self._CHUNK) / bandwidth - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントのキャンセル
+            return
+        self.server.counters.add(len(body), status == 304)
+
+
+class StandinServer(ThreadingHTTPServer):
+    """合成ツリーを配信するサーバー（serve_forever は start() が別スレッドで実行する）"""
+
+    daemon_threads = True
+
+    def __init__(self, tree: SyntheticTree, profile: NetworkProfile | None = None, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.tree = tree
+        self.profile = profile or NetworkProfile()
+        self.counters = _Counters()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--dirs", type=int, default=TreeSpec.dirs)
+    parser.add_argument("--files", type=int, default=TreeSpec.files_per_dir, help="ディレクトリごとの画像数")
+    parser.add_argument("--size", type=int, default=TreeSpec.image_size, help="画像の一辺")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="0 は無制限")
+    args = parser.parse_args()
+
+    tree = SyntheticTree(TreeSpec(dirs=args.dirs, files_per_dir=args.files, image_size=args.size))
+    profile = NetworkProfile(args.latency_ms / 1000, args.bandwidth_mbps * 1e6 / 8)
+    server = StandinServer(tree, profile, args.port)
+    print(f"serving {len(tree.directories())} directories on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+起動時間のベンチマーク
+
+python -X importtime で起動時に読み込まれるモジュールと読み込み時間を計測し、
+予算を超えた場合や、初回使用時まで遅延させている重いモジュール（PyMuPDF・paramiko 等）が
+起動時に読み込まれた場合は終了コード1で終了する。
+
+    python bench/startup.py [--runs N] [--budget-ms MS] [--window-budget-ms MS] [--json]
+
+計測する区間:
+    import  app/main.py と、main() がウィンドウを表示するまでに読み込むモジュール
+    window  QApplication の生成から MainWindow の生成まで（offscreen、接続は行わない）
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# main() がウィンドウを表示するまでに実行する import
+_IMPORT_SNIPPET = """
+import main
+from ui.host_dialog import HostDialog
+from ui.main_window import MainWindow
+"""
+
+_WINDOW_SNIPPET = """
+import time
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+app = QApplication(["siview", "-platform", "offscreen"])
+from ui.main_window import MainWindow
+MainWindow._start_connect = lambda self: None
+window = MainWindow(host="bench")
+window.show()
+app.processEvents()
+print((time.perf_counter() - start) * 1000)
+"""
+
+# 初回使用時まで読み込みを遅延させているモジュール（起動時に読み込まれたら失敗とする）
+DEFERRED_MODULES = [
+    "fitz",
+    "pymupdf",
+    "paramiko",
+    "natsort",
+    "tifffile",
+    "PySide6.QtSvg",
+    "concurrent.futures.process",
+    "multiprocessing.shared_memory",
+]
+
+DEFAULT_BUDGET_MS = 600.0
+DEFAULT_WINDOW_BUDGET_MS = 1500.0
+
+
+def _run(snippet: str, importtime: bool, home: str) -> subprocess.CompletedProcess:
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    args += ["-c", snippet]
+    env = dict(os.environ, HOME=home, QT_QPA_PLATFORM="offscreen")
+    return subprocess.run(args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """-X importtime の出力を {モジュール名: (自身の時間, 累積時間)}（マイクロ秒）にする"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return modules
+
+
+def measure(runs: int) -> dict:
+    totals = []
+    windows = []
+    modules: dict[str, tuple[int, int]] = {}
+    with tempfile.TemporaryDirectory() as home:
+        for _ in range(runs):
+            modules = parse_importtime(_run(_IMPORT_SNIPPET, True, home).stderr)
+            totals.append(sum(own for own, _ in modules.values()) / 1000)
+            windows.append(float(_run(_WINDOW_SNIPPET, False, home).stdout.strip().splitlines()[-1]))
+
+    top = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:15]
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(totals), 1),
+        "window_ms": round(statistics.median(windows), 1),
+        "module_count": len(modules),
+        "deferred_loaded": [name for name in DEFERRED_MODULES if name in modules],
+        "slowest": [{"module": name, "self_ms": own / 1000, "cumulative_ms": cum / 1000} for name, (own, cum) in top],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（中央値を使う）")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="import の予算")
+    parser.add_argument("--window-budget-ms", type=float, default=DEFAULT_WINDOW_BUDGET_MS, help="ウィンドウ生成までの予算")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    result = measure(max(1, args.runs))
+    failures = []
+    if result["import_ms"] > args.budget_ms:
+        failures.append(f"import {result['import_ms']} ms > {args.budget_ms} ms")
+    if result["window_ms"] > args.window_budget_ms:
+        failures.append(f"window {result['window_ms']} ms > {args.window_budget_ms} ms")
+    if result["deferred_loaded"]:
+        failures.append("起動時に読み込まれた遅延対象: " + ", ".join(result["deferred_loaded"]))
+    result["failures"] = failures
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(f"import: {result['import_ms']} ms ({result['module_count']} modules, median of {result['runs']})")
+        print(f"window: {result['window_ms']} ms")
+        print("slowest modules (self):")
+        for entry in result["slowest"]:
+            print(f"  {entry['self_ms']:8.1f} ms  {entry['module']}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
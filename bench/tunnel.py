@@ -0,0 +1,236 @@
+"""
+SSH接続・デプロイ・トンネルのベンチマーク
+
+bench/ssh_standin.py のローカルSSHサーバーに対して ServerManager.setup() を実行し、
+接続から最初の一覧取得までの時間、デプロイの時間、トンネル越しの転送速度を計測する。
+デプロイするバイナリの代わりに bench/standin.py を起動するスクリプトを転送する。
+
+    python bench/tunnel.py [--rtt-ms MS] [--runs N] [--out result.json] [--compare baseline.json]
+
+計測項目:
+    setup       setup() の各段階（接続・停止・デプロイ・起動・トンネル）の時間。
+                cold は未デプロイの状態から、warm はデプロイ済みの状態から
+    listing     setup() の開始から、トンネル越しに最初の一覧を取得できるまでの時間
+                （サーバーの起動待ちを含む。ready_ms はそのうち setup() の後の待ち時間）
+    throughput  トンネル越しと直接接続での逐次・並列の転送速度
+
+注意: setup() は実際と同じく pkill -f siview-server を実行するため、コマンドラインに
+siview-server を含むローカルのプロセスはすべて停止される。
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "app"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from api.client import HTTPClient
+from e2e import _ms, _summary, compare
+from server.manager import ServerManager
+from ssh_standin import SSHStandin
+
+# setup() が進捗を通知する段階（通知の順）
+STAGES = ["connect", "kill", "deploy", "start", "tunnel"]
+
+# 最初の一覧を待つ上限
+READY_TIMEOUT = 30.0
+
+_SERVER_SCRIPT = """#!{python}
+import sys
+sys.path.insert(0, {bench_dir!r})
+sys.argv[1:] = {argv!r}
+from standin import main
+main()
+"""
+
+
+def _free_port() -> int:
+    with socket.create_server(("127.0.0.1", 0)) as sock:
+        return sock.getsockname()[1]
+
+
+def _write_server_script(path: Path, port: int, args) -> Path:
+    """
+    リモートで起動するスクリプトを書き出す
+
+    ファイル名はそのままリモートのバイナリ名になり、プロセスのコマンドラインにも残るため
+    ServerManager の pkill -f で停止できる
+    """
+    argv = ["--port", str(port), "--dirs", str(args.dirs), "--files", str(args.files), "--size", str(args.size)]
+    path.write_text(_SERVER_SCRIPT.format(python=sys.executable, bench_dir=str(BENCH_DIR), argv=argv))
+    path.chmod(0o755)
+    return path
+
+
+class _Setup:
+    """1回分の setup() と最初の一覧取得"""
+
+    def __init__(self, config: Path, binary: Path, remote_port: int, local_port: int):
+        self.manager = ServerManager("bench", str(config))
+        self.manager.LOCAL_BINARY = str(binary)
+        self.manager.REMOTE_PORT = remote_port
+        self.manager.LOCAL_PORT = local_port
+        self.client = HTTPClient(f"http://127.0.0.1:{local_port}", home_dir="/")
+
+    def run(self) -> dict:
+        marks: list[float] = []
+        start = time.perf_counter()
+        self.manager.setup(progress_callback=lambda msg: marks.append(time.perf_counter()))
+        setup_end = time.perf_counter()
+        marks.append(setup_end)
+        stages = {
+            name: _ms(end - begin)
+            for name, begin, end in zip(STAGES, marks, marks[1:])
+        }
+
+        # サーバーは非同期に起動するため、一覧を取得できるまで繰り返す
+        while True:
+            try:
+                self.client.ls("/")
+                break
+            except Exception:
+                if time.perf_counter() - setup_end > READY_TIMEOUT:
+                    raise
+                time.sleep(0.01)
+        end = time.perf_counter()
+        return {
+            "stages": stages,
+            "setup_ms": _ms(setup_end - start),
+            "ready_ms": _ms(end - setup_end),
+            "first_listing_ms": _ms(end - start),
+        }
+
+    def cleanup(self):
+        self.manager.cleanup()
+
+
+def bench_setup(config: Path, binary: Path, home: Path, remote_port: int, local_port: int, runs: int) -> dict:
+    results = {}
+    for kind in ("cold", "warm"):
+        samples = []
+        for _ in range(runs):
+            if kind == "cold":
+                shutil.rmtree(home / ServerManager.REMOTE_DIR, ignore_errors=True)
+            setup = _Setup(config, binary, remote_port, local_port)
+            try:
+                samples.append(setup.run())
+            finally:
+                setup.cleanup()
+        results[kind] = {
+            "stages": {
+                name: _summary([s["stages"][name] / 1000 for s in samples if name in s["stages"]])
+                for name in STAGES
+            },
+            "setup": _summary([s["setup_ms"] / 1000 for s in samples]),
+            "ready": _summary([s["ready_ms"] / 1000 for s in samples]),
+            "first_listing": _summary([s["first_listing_ms"] / 1000 for s in samples]),
+        }
+    return results
+
+
+def _transfer(client: HTTPClient, files: list[str]) -> dict:
+    start = time.perf_counter()
+    total = sum(len(client.get_file(path)[0]) for path in files)
+    sequential = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        start = time.perf_counter()
+        list(pool.map(client.get_file, files))
+        parallel = time.perf_counter() - start
+    return {
+        "bytes": total,
+        "sequential_mbps": round(total * 8 / sequential / 1e6, 2),
+        "parallel_mbps": round(total * 8 / parallel / 1e6, 2),
+    }
+
+
+def bench_throughput(config: Path, binary: Path, remote_port: int, local_port: int) -> dict:
+    setup = _Setup(config, binary, remote_port, local_port)
+    try:
+        setup.run()
+        tunneled = setup.client
+        directory = next(e["name"] for e in tunneled.ls("/") if e["is_dir"])
+        files = [f"/{directory}/{e['name']}" for e in tunneled.ls("/" + directory) if not e["is_dir"]]
+        direct = HTTPClient(f"http://127.0.0.1:{remote_port}", home_dir="/")
+        return {
+            "files": len(files),
+            "tunnel": _transfer(tunneled, files),
+            "direct": _transfer(direct, files),
+        }
+    finally:
+        setup.cleanup()
+
+
+def run(args) -> dict:
+    cases = args.only.split(",") if args.only else ["setup", "throughput"]
+    with tempfile.TemporaryDirectory(prefix="siview-bench-ssh-") as tmp:
+        tmp = Path(tmp)
+        home = tmp / "home"
+        home.mkdir()
+        standin = SSHStandin(home, rtt=args.rtt_ms / 1000).start()
+        config = standin.write_ssh_config(tmp / "ssh_config", "bench")
+        remote_port, local_port = _free_port(), _free_port()
+        binary = _write_server_script(tmp / ServerManager.REMOTE_BINARY, remote_port, args)
+
+        results = {}
+        try:
+            for case in cases:
+                if case == "setup":
+                    results[case] = bench_setup(config, binary, home, remote_port, local_port, args.runs)
+                elif case == "throughput":
+                    results[case] = bench_throughput(config, binary, remote_port, local_port)
+                else:
+                    raise ValueError(f"unknown case: {case}")
+        finally:
+            # cleanup() の pkill は完了を待たないため、このHOMEから起動したサーバーを確実に止める
+            subprocess.run(["pkill", "-f", str(home / ServerManager.REMOTE_DIR)], check=False)
+            standin.stop()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tree": {"dirs": args.dirs, "files_per_dir": args.files, "image_size": args.size},
+            "network": {"rtt_ms": args.rtt_ms},
+            "runs": args.runs,
+        },
+        "results": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="SSH接続に加える往復遅延")
+    parser.add_argument("--runs", type=int, default=3, help="setup の繰り返し回数")
+    parser.add_argument("--dirs", type=int, default=2)
+    parser.add_argument("--files", type=int, default=16, help="ディレクトリごとの画像数")
+    parser.add_argument("--size", type=int, default=1024, help="画像の一辺")
+    parser.add_argument("--only", help="実行する項目（カンマ区切り）: setup,throughput")
+    parser.add_argument("--out", help="結果を保存するJSONファイル")
+    parser.add_argument("--compare", help="比較する以前の結果（JSON）")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), result)
+    elif not args.out:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
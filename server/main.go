@@ -1,11 +1,22 @@
 package main
 
 import (
+	"context"
 	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"io/fs"
 	"log"
 	"net/http"
 	"os"
 	"path/filepath"
+	"regexp"
+	"strconv"
+	"strings"
+	"syscall"
+	"time"
+	"unsafe"
 )
 
 type Entry struct {
@@ -53,13 +64,458 @@ func listHandler(w http.ResponseWriter, r *http.Request) {
 	json.NewEncoder(w).Encode(out)
 }
 
+// 検索結果の1件（name は検索の起点からの相対パス）
+type SearchMatch struct {
+	Name  string `json:"name"`
+	IsDir bool   `json:"is_dir"`
+	Size  int64  `json:"size"`
+	Mtime int64  `json:"mtime"`
+}
+
+// 検索の最後に送る集計
+type SearchSummary struct {
+	Done      bool `json:"done"`
+	Matched   int  `json:"matched"`
+	Scanned   int  `json:"scanned"`
+	Truncated bool `json:"truncated"`
+	TimedOut  bool `json:"timed_out"`
+}
+
+type searchQuery struct {
+	name     string // 名前の部分一致（大文字小文字を区別しない）
+	glob     string // "/" を含む場合は相対パス、含まない場合は名前に対して照合
+	re       *regexp.Regexp
+	exts     map[string]bool
+	kind     string // "f", "d", "any"
+	minSize  int64
+	maxSize  int64 // -1 は上限なし
+	newer    int64 // 更新日時の下限（UNIX秒、0 は指定なし）
+	older    int64 // 更新日時の上限（UNIX秒、0 は指定なし）
+	maxDepth int   // -1 は無制限
+	limit    int
+}
+
+const (
+	searchDefaultLimit   = 10000
+	searchMaxLimit       = 100000
+	searchDefaultTimeout = 30 * time.Second
+	searchMaxTimeout     = 300 * time.Second
+	// 一致が少なくても結果が届くよう、この間隔でフラッシュする
+	searchFlushInterval = 100 * time.Millisecond
+	searchFlushCount    = 64
+)
+
+var errSearchStop = errors.New("search stopped")
+
+func parseInt(r *http.Request, key string, def int64) (int64, error) {
+	v := r.URL.Query().Get(key)
+	if v == "" {
+		return def, nil
+	}
+	return strconv.ParseInt(v, 10, 64)
+}
+
+func parseSearchQuery(r *http.Request) (*searchQuery, time.Duration, error) {
+	q := r.URL.Query()
+	sq := &searchQuery{
+		name: strings.ToLower(q.Get("name")),
+		glob: q.Get("glob"),
+		kind: q.Get("type"),
+	}
+	if sq.kind == "" {
+		sq.kind = "f"
+	}
+	if sq.kind != "f" && sq.kind != "d" && sq.kind != "any" {
+		return nil, 0, errors.New("type must be f, d or any")
+	}
+	if sq.glob != "" {
+		if _, err := filepath.Match(sq.glob, ""); err != nil {
+			return nil, 0, err
+		}
+	}
+	if expr := q.Get("regex"); expr != "" {
+		re, err := regexp.Compile(expr)
+		if err != nil {
+			return nil, 0, err
+		}
+		sq.re = re
+	}
+	if exts := q.Get("ext"); exts != "" {
+		sq.exts = make(map[string]bool)
+		for _, e := range strings.Split(exts, ",") {
+			e = strings.ToLower(strings.TrimSpace(e))
+			if e == "" {
+				continue
+			}
+			if !strings.HasPrefix(e, ".") {
+				e = "." + e
+			}
+			sq.exts[e] = true
+		}
+	}
+
+	var err error
+	if sq.minSize, err = parseInt(r, "min_size", 0); err != nil {
+		return nil, 0, err
+	}
+	if sq.maxSize, err = parseInt(r, "max_size", -1); err != nil {
+		return nil, 0, err
+	}
+	if sq.newer, err = parseInt(r, "newer", 0); err != nil {
+		return nil, 0, err
+	}
+	if sq.older, err = parseInt(r, "older", 0); err != nil {
+		return nil, 0, err
+	}
+	depth, err := parseInt(r, "max_depth", -1)
+	if err != nil {
+		return nil, 0, err
+	}
+	sq.maxDepth = int(depth)
+	limit, err := parseInt(r, "limit", searchDefaultLimit)
+	if err != nil {
+		return nil, 0, err
+	}
+	if limit <= 0 || limit > searchMaxLimit {
+		limit = searchMaxLimit
+	}
+	sq.limit = int(limit)
+
+	timeout := searchDefaultTimeout
+	if v := q.Get("timeout"); v != "" {
+		sec, err := strconv.ParseFloat(v, 64)
+		if err != nil {
+			return nil, 0, err
+		}
+		timeout = time.Duration(sec * float64(time.Second))
+	}
+	if timeout <= 0 || timeout > searchMaxTimeout {
+		timeout = searchMaxTimeout
+	}
+	return sq, timeout, nil
+}
+
+// 名前だけで判定できる条件（stat が不要なので先に評価する）
+func (sq *searchQuery) matchName(rel string, isDir bool) bool {
+	if sq.kind == "f" && isDir || sq.kind == "d" && !isDir {
+		return false
+	}
+	base := filepath.Base(rel)
+	if sq.exts != nil && !sq.exts[strings.ToLower(filepath.Ext(base))] {
+		return false
+	}
+	if sq.name != "" && !strings.Contains(strings.ToLower(base), sq.name) {
+		return false
+	}
+	if sq.glob != "" {
+		target := base
+		if strings.Contains(sq.glob, "/") {
+			target = filepath.ToSlash(rel)
+		}
+		if ok, _ := filepath.Match(sq.glob, target); !ok {
+			return false
+		}
+	}
+	if sq.re != nil && !sq.re.MatchString(filepath.ToSlash(rel)) {
+		return false
+	}
+	return true
+}
+
+func (sq *searchQuery) matchInfo(info fs.FileInfo) bool {
+	size := info.Size()
+	if size < sq.minSize || sq.maxSize >= 0 && size > sq.maxSize {
+		return false
+	}
+	mtime := info.ModTime().Unix()
+	if sq.newer > 0 && mtime < sq.newer || sq.older > 0 && mtime > sq.older {
+		return false
+	}
+	return true
+}
+
+// サブツリーをサーバー側で走査し、一致したエントリを NDJSON で逐次送る
+// （最後の行は SearchSummary）。クライアントが切断するか制限時間を過ぎると打ち切る
+func searchHandler(w http.ResponseWriter, r *http.Request) {
+	full, err := safePath(r.URL.Query().Get("path"))
+	if err != nil {
+		http.Error(w, "invalid path", http.StatusBadRequest)
+		return
+	}
+	sq, timeout, err := parseSearchQuery(r)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	if info, err := os.Stat(full); err != nil || !info.IsDir() {
+		http.Error(w, "not a directory", http.StatusNotFound)
+		return
+	}
+
+	ctx, cancel := context.WithTimeout(r.Context(), timeout)
+	defer cancel()
+
+	w.Header().Set("Content-Type", "application/x-ndjson")
+	flusher, _ := w.(http.Flusher)
+	enc := json.NewEncoder(w)
+	summary := SearchSummary{Done: true}
+	unflushed := 0
+	lastFlush := time.Now()
+	flush := func() {
+		if flusher != nil && unflushed > 0 {
+			flusher.Flush()
+		}
+		unflushed = 0
+		lastFlush = time.Now()
+	}
+
+	walkErr := filepath.WalkDir(full, func(p string, d fs.DirEntry, err error) error {
+		if ctx.Err() != nil {
+			return errSearchStop
+		}
+		if err != nil {
+			// 読めないディレクトリは飛ばして続ける
+			if p == full {
+				return err
+			}
+			return nil
+		}
+		if p == full {
+			return nil
+		}
+		rel, err := filepath.Rel(full, p)
+		if err != nil {
+			return nil
+		}
+		summary.Scanned++
+
+		isDir := d.IsDir()
+		if sq.matchName(rel, isDir) {
+			if info, err := d.Info(); err == nil && sq.matchInfo(info) {
+				match := SearchMatch{
+					Name:  filepath.ToSlash(rel),
+					IsDir: isDir,
+					Size:  info.Size(),
+					Mtime: info.ModTime().Unix(),
+				}
+				if err := enc.Encode(match); err != nil {
+					return errSearchStop
+				}
+				summary.Matched++
+				unflushed++
+				if summary.Matched >= sq.limit {
+					summary.Truncated = true
+					return errSearchStop
+				}
+			}
+		}
+		if unflushed >= searchFlushCount || time.Since(lastFlush) >= searchFlushInterval {
+			flush()
+		}
+
+		if isDir && sq.maxDepth >= 0 && strings.Count(rel, string(filepath.Separator)) >= sq.maxDepth {
+			return filepath.SkipDir
+		}
+		return nil
+	})
+	if walkErr != nil && !errors.Is(walkErr, errSearchStop) {
+		log.Println("search:", walkErr)
+	}
+	if errors.Is(ctx.Err(), context.DeadlineExceeded) {
+		summary.TimedOut = true
+	}
+	if r.Context().Err() != nil {
+		// クライアントが切断した
+		return
+	}
+	enc.Encode(summary)
+	flush()
+}
+
+// 変更通知の1件（op が "overflow" の場合は取りこぼしがあったので全体を読み直す）
+type WatchEvent struct {
+	Op       string `json:"op"`  // "ready", "create", "write", "remove", "overflow"
+	Dir      string `json:"dir"` // 変更のあったディレクトリ（絶対パス）
+	Name     string `json:"name"`
+	IsDir    bool   `json:"is_dir"`
+	Size     int64  `json:"size"`
+	Watching int    `json:"watching,omitempty"` // ready のときの監視ディレクトリ数
+}
+
+const (
+	watchMaxDirs = 512
+	// 途中の経路で切断されていないことを確かめるための空行の間隔
+	watchHeartbeat = 15 * time.Second
+	// 書き込みは閉じたときだけ通知する（書き込み途中のファイルを読まないように）
+	watchMask = syscall.IN_CLOSE_WRITE | syscall.IN_CREATE | syscall.IN_DELETE |
+		syscall.IN_MOVED_FROM | syscall.IN_MOVED_TO
+)
+
+// inotify の読み込み結果をイベントに変換する
+func parseInotify(buf []byte, dirs map[int32]string) []WatchEvent {
+	var out []WatchEvent
+	offset := 0
+	for offset+syscall.SizeofInotifyEvent <= len(buf) {
+		raw := (*syscall.InotifyEvent)(unsafe.Pointer(&buf[offset]))
+		start := offset + syscall.SizeofInotifyEvent
+		end := start + int(raw.Len)
+		if end > len(buf) {
+			break
+		}
+		name := strings.TrimRight(string(buf[start:end]), "\x00")
+		offset = end
+
+		if raw.Mask&syscall.IN_Q_OVERFLOW != 0 {
+			out = append(out, WatchEvent{Op: "overflow"})
+			continue
+		}
+		dir, ok := dirs[raw.Wd]
+		if !ok || name == "" {
+			continue
+		}
+		ev := WatchEvent{Dir: dir, Name: name, IsDir: raw.Mask&syscall.IN_ISDIR != 0}
+		switch {
+		case raw.Mask&(syscall.IN_DELETE|syscall.IN_MOVED_FROM) != 0:
+			ev.Op = "remove"
+		case raw.Mask&(syscall.IN_CLOSE_WRITE|syscall.IN_MOVED_TO) != 0:
+			ev.Op = "write"
+		case raw.Mask&syscall.IN_CREATE != 0:
+			ev.Op = "create"
+		default:
+			continue
+		}
+		if ev.Op != "remove" {
+			info, err := os.Stat(filepath.Join(dir, name))
+			if err != nil {
+				// 通知を読む前に消えた
+				continue
+			}
+			ev.Size = info.Size()
+		}
+		out = append(out, ev)
+	}
+	return out
+}
+
+// 指定ディレクトリを inotify で監視し、変更を Server-Sent Events で送り続ける
+// 監視対象はボディの {"paths": [...]}（ルートからの相対パス）。クライアントが切断するまで返らない
+func watchHandler(w http.ResponseWriter, r *http.Request) {
+	if r.Method != http.MethodPost {
+		http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
+		return
+	}
+	var req struct {
+		Paths []string `json:"paths"`
+	}
+	if err := json.NewDecoder(io.LimitReader(r.Body, 1<<20)).Decode(&req); err != nil {
+		http.Error(w, err.Error(), http.StatusBadRequest)
+		return
+	}
+	if len(req.Paths) > watchMaxDirs {
+		req.Paths = req.Paths[:watchMaxDirs]
+	}
+	flusher, ok := w.(http.Flusher)
+	if !ok {
+		http.Error(w, "streaming unsupported", http.StatusInternalServerError)
+		return
+	}
+
+	// 非ブロッキングにしておくと os.File の読み込みがランタイムのポーラーに載り、Close で中断できる
+	fd, err := syscall.InotifyInit1(syscall.IN_CLOEXEC | syscall.IN_NONBLOCK)
+	if err != nil {
+		http.Error(w, err.Error(), http.StatusInternalServerError)
+		return
+	}
+	file := os.NewFile(uintptr(fd), "inotify")
+	defer file.Close()
+
+	dirs := make(map[int32]string)
+	for _, rel := range req.Paths {
+		full, err := safePath(rel)
+		if err != nil {
+			continue
+		}
+		wd, err := syscall.InotifyAddWatch(fd, full, watchMask)
+		if err != nil {
+			continue
+		}
+		dirs[int32(wd)] = full
+	}
+
+	w.Header().Set("Content-Type", "text/event-stream")
+	w.Header().Set("Cache-Control", "no-cache")
+	writeEvent := func(ev WatchEvent) {
+		data, _ := json.Marshal(ev)
+		fmt.Fprintf(w, "data: %s\n\n", data)
+	}
+	// 監視の開始を知らせる（これ以降の変更は取りこぼさない）
+	writeEvent(WatchEvent{Op: "ready", Watching: len(dirs)})
+	flusher.Flush()
+
+	events := make(chan []WatchEvent)
+	go func() {
+		defer close(events)
+		buf := make([]byte, 64*1024)
+		for {
+			n, err := file.Read(buf)
+			if err != nil {
+				return
+			}
+			if batch := parseInotify(buf[:n], dirs); len(batch) > 0 {
+				select {
+				case events <- batch:
+				case <-r.Context().Done():
+					return
+				}
+			}
+		}
+	}()
+
+	ticker := time.NewTicker(watchHeartbeat)
+	defer ticker.Stop()
+	for {
+		select {
+		case <-r.Context().Done():
+			// 読み込み中のゴルーチンを終わらせる
+			file.Close()
+			return
+		case batch, ok := <-events:
+			if !ok {
+				return
+			}
+			for _, ev := range batch {
+				writeEvent(ev)
+			}
+			flusher.Flush()
+		case <-ticker.C:
+			fmt.Fprint(w, ": ping\n\n")
+			flusher.Flush()
+		}
+	}
+}
+
+// ファイルの大きさと更新日時（ナノ秒）から ETag を付ける
+// http.FileServer は設定済みの ETag で If-None-Match を判定し、一致すれば 304 を返す
+func withETag(next http.Handler) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		if full, err := safePath(r.URL.Path); err == nil {
+			if info, err := os.Stat(full); err == nil && info.Mode().IsRegular() {
+				w.Header().Set("ETag", fmt.Sprintf("\"%x-%x\"", info.Size(), info.ModTime().UnixNano()))
+			}
+		}
+		next.ServeHTTP(w, r)
+	})
+}
+
 func main() {
 	root = "/"
 
 	http.HandleFunc("/api/list", listHandler)
+	http.HandleFunc("/api/search", searchHandler)
+	http.HandleFunc("/api/watch", watchHandler)
 	http.Handle("/file/",
 		http.StripPrefix("/file/",
-			http.FileServer(http.Dir(root)),
+			withETag(http.FileServer(http.Dir(root))),
 		),
 	)
 